@@ -52,6 +52,11 @@ nvidia-docker run --rm -it -d \
   # Give container time to boot
   sleep 1
 
+  # Build the app's Cython modules, iff changed since last built
+  echo "INFO: Building Cython modules..."
+  docker exec -w /opt/app/src $container_name \
+    python setup.py -q build_ext --inplace
+
   # Exec into the detached container
   docker exec -it $container_name bash
 
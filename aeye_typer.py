@@ -4,14 +4,17 @@
 
 __author__ = 'Dustin Fast <dustin.fast@outlook.com>'
 
+from time import perf_counter
+T_LAUNCH = perf_counter()  # Precedes all other imports, for --profile-startup
+
 import argparse
 from subprocess import Popen
 
-from lib.py.hud import HUD
-import lib.py.hud_learn as hud_learn
+from lib.py.app import startup_profile_enable, startup_phase_add, \
+    startup_phase, startup_profile_report, pyx_install
 
-import pyximport; pyximport.install()
-from lib.py.eyetracker_gaze import EyeTrackerGaze
+# Note: Each mode's modules are imported by that mode only, below, as some
+# (e.g. tkinter, Xlib, pynput, and sklearn) are slow to import
 
 CMD_CALIBRATE = 'tobiiproeyetrackermanager'
 
@@ -38,6 +41,18 @@ if __name__ == "__main__":
                         help=arg_help_str)
     arg_flags = ('-t', '--train_ml')
     arg_help_str = 'Runs training of the application\'s ML models.'
+    parser.add_argument(*arg_flags,
+                        action='store_true',
+                        default=False,
+                        help=arg_help_str)
+    arg_flags = ('-s', '--search_ml')
+    arg_help_str = 'Runs a hyperparameter search for the application\'s ML models.'
+    parser.add_argument(*arg_flags,
+                        action='store_true',
+                        default=False,
+                        help=arg_help_str)
+    arg_flags = ('--profile-startup',)
+    arg_help_str = 'Prints a breakdown of the application\'s startup time.'
     parser.add_argument(*arg_flags,
                         action='store_true',
                         default=False,
@@ -45,12 +60,22 @@ if __name__ == "__main__":
     # TODO: Screen res/sz option
     args = parser.parse_args()
 
+    # Iff profiling startup, denote the time spent importing thus far
+    if args.profile_startup:
+        startup_profile_enable()
+        startup_phase_add('imports', perf_counter() - T_LAUNCH)
+
     # Some CLI args are mutually exclusive -- ensure they were given that way
-    if sum([args.calibrate, args.data_collect, args.infer, args.train_ml]) > 1:
+    if sum([args.calibrate, args.data_collect, args.infer, args.train_ml,
+            args.search_ml]) > 1:
         raise Exception('Invalid use of mutually exclusive cmd line args.')
 
     # Run the application in the specified mode
     if args.calibrate:
+        with startup_phase('imports'):
+            pyx_install()
+            from lib.py.eyetracker_gaze import EyeTrackerGaze
+
         # Run the external calibration tool and wait for quit
         e = EyeTrackerGaze()
         proc = Popen([CMD_CALIBRATE])
@@ -58,15 +83,29 @@ if __name__ == "__main__":
 
         # Write the calibration to file
         e.open()
+        startup_profile_report()
         e.write_calibration()
         e.close()
 
     elif args.data_collect:
-        hud_learn.HUDDataGazeAccAssist().collect()
-    elif args.infer:
-        HUD(mode='infer').run()
-    elif args.train_ml:
-        hud_learn.HUDTrainGazeAccAssist().run()
+        with startup_phase('imports'):
+            from lib.py.hud_learn import HUDDataGazeAccAssist
+
+        HUDDataGazeAccAssist().collect()
+    elif args.train_ml or args.search_ml:
+        with startup_phase('imports'):
+            from lib.py.hud_learn import HUDTrainGazeAccAssist
+
+        if args.train_ml:
+            HUDTrainGazeAccAssist().run()
+        else:
+            HUDTrainGazeAccAssist().search()
     else:
-        HUD(mode='basic').run()
+        with startup_phase('imports'):
+            from lib.py.hud import HUD
+
+        HUD(mode='infer' if args.infer else 'basic').run()
+
+    # Iff not yet reported by the mode, report startup times at exit
+    startup_profile_report()
 
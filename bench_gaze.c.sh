@@ -0,0 +1,33 @@
+#! /usr/bin/env bash
+
+# A script for benchmarking the gaze pipeline's cpp hot path, without an
+# eyetracker device, by running EyeTrackerGaze on the replay backend. All cmd
+# line args are passed to the benchmark -- e.g.
+# ./bench_gaze.c.sh -l gaze.glog -x model_x.rbf -y model_y.rbf -o bench.json
+# See lib/cpp/eyetracker_bench.cpp for details.
+
+SRC_DIR=lib/cpp
+OUT_DIR=lib/so
+BIN_PATH=${OUT_DIR}/eyetracker_bench.out
+HASH_PATH=${OUT_DIR}/eyetracker_bench.hash
+
+# Note: Built with the same flags as the eyetracker .so (see
+# lib/sh/prep_eyetracker_gaze.sh), plus any given by CFLAGS
+BUILD_FLAGS="-std=gnu++14 ${CFLAGS}"
+LIBS="-lstdc++ -lm -lX11 -lyaml-cpp -lboost_chrono -lboost_system -lboost_thread -pthread"
+
+# Compile the benchmark binary iff its sources or build flags have changed
+HASH="$( (cat ${SRC_DIR}/eyetracker_bench.cpp ${SRC_DIR}/*.h;     \
+          echo "${BUILD_FLAGS} ${LIBS}";                          \
+          gcc --version) | sha256sum | cut -d ' ' -f 1)"
+
+mkdir -p ${OUT_DIR}
+
+if [ ! -f ${BIN_PATH} ] || [ "$(cat ${HASH_PATH} 2>/dev/null)" != "${HASH}" ]; then
+    gcc ${BUILD_FLAGS} ${SRC_DIR}/eyetracker_bench.cpp -o ${BIN_PATH} ${LIBS} \
+        || exit 1
+    echo "${HASH}" > ${HASH_PATH}
+fi
+
+# Run the benchmark
+./${BIN_PATH} "$@"
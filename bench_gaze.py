@@ -0,0 +1,297 @@
+#! /usr/bin/env python
+""" A script for benchmarking the gaze pipeline and the gaze accuracy-assist
+    models, without an eyetracker device. Gaze samples are read from a
+    recorded gaze log, or are the replay eyetracker backend's synthetic
+    samples. The native pipeline is benchmarked by bench_gaze.c.sh, which is
+    also used to generate the synthetic samples. Results are written as JSON,
+    so that they may be compared across builds.
+
+    Usage: ./bench_gaze.py [--log GAZE_LOG] [--sizes N [N ...]] [--out JSON]
+"""
+
+__author__ = 'Dustin Fast <dustin.fast@outlook.com>'
+
+import os
+import json
+import pickle
+import platform
+import argparse
+import tempfile
+from time import perf_counter
+from datetime import datetime
+from subprocess import Popen, PIPE
+
+import numpy as np
+from sklearn.preprocessing import MinMaxScaler
+
+from lib.py.app import app_config, info, warn, error, pyx_install
+pyx_install()  # Required for EyeTrackerCoordPredict
+from lib.py.eyetracker_structdef import gaze_features
+from lib.py.gaze_log import GAZE_LOG_EXT, read_gaze_log, gaze_csv_to_log
+from lib.py.eyetracker_coord_predict import EyeTrackerCoordPredict, \
+    EyeTrackerCoordPredictXY
+from lib.py.hud_learn import HUDTrainGazeAccAssist, _fit_model, \
+    NATIVE_MODEL_EXT
+
+
+DISP_WIDTH = app_config('DISP_WIDTH_PX')
+DISP_HEIGHT = app_config('DISP_HEIGHT_PX')
+MODEL_TYPE = app_config('GAZE_ACC_MODEL_TYPE')
+
+NATIVE_BENCH_PATH = './bench_gaze.c.sh'
+TRAIN_SIZES = [1000, 2000, 4000, 8000]
+LATENCY_ROWS = 500
+RAND_SEED = 1234
+
+
+def synthetic_labels(records, rng):
+    """ Returns click coord labels for the given gaze records, as [N, 2], as
+        the device-given coords plus a smooth, position-dependent error, as
+        the accuracy-assist models are trained to correct.
+    """
+    x = records['combined_gazepoint_x'].astype(np.float64)
+    y = records['combined_gazepoint_y'].astype(np.float64)
+
+    err_x = 40 * np.sin(x / DISP_WIDTH * np.pi) + rng.normal(0, 10, len(x))
+    err_y = 30 * np.cos(y / DISP_HEIGHT * np.pi) + rng.normal(0, 10, len(y))
+
+    return np.column_stack((x + err_x, y + err_y))
+
+
+def latency_summary(times):
+    """ Returns a summary of the given latencies, in seconds, as a dict in us.
+    """
+    times = np.asarray(times) * 1e6
+
+    return {'n': len(times),
+            'mean_us': float(times.mean()),
+            'p50_us': float(np.percentile(times, 50)),
+            'p99_us': float(np.percentile(times, 99)),
+            'max_us': float(times.max())}
+
+
+def time_calls(fn, rows):
+    """ Returns the latency summary of calling fn once for each given row.
+    """
+    times = []
+
+    for row in rows:
+        t_start = perf_counter()
+        fn(row)
+        times.append(perf_counter() - t_start)
+
+    return latency_summary(times)
+
+
+def bench_train(X, y, model_type, size):
+    """ Fits the x and y models of the given type to the first size rows of
+        the given training data, then returns a dict of their fit wall time
+        and inference costs, and the fit (models, scaler).
+    """
+    X_train = X[:size]
+    scaler = MinMaxScaler().fit(X_train)
+    X_train = scaler.transform(X_train)
+    X_test = scaler.transform(X[-LATENCY_ROWS:])
+
+    result = {'size': len(X_train)}
+    models = []
+
+    for coord, y_coord in (('x', y[:size, 0]), ('y', y[:size, 1])):
+        t_start = perf_counter()
+        model = _fit_model(model_type, X_train, y_coord)
+        result[f'fit_s_{coord}'] = perf_counter() - t_start
+
+        result[f'n_vectors_{coord}'] = len(
+            HUDTrainGazeAccAssist._rbf_expansion(model)[1])
+        result[f'predict_{coord}'] = time_calls(
+            lambda row: model.predict(row.reshape(1, -1)), X_test)
+
+        t_start = perf_counter()
+        model.predict(X_test)
+        result[f'predict_batched_us_{coord}'] = \
+            (perf_counter() - t_start) / len(X_test) * 1e6
+
+        model.scaler = scaler
+        models.append(model)
+
+    return result, models, scaler
+
+
+def bench_predictors(records, models, scaler, tmp_dir):
+    """ Returns a dict of the per-sample latencies of the python gaze-coord
+        predictors (as used by the HUD), for the given fit models.
+    """
+    paths = []
+
+    for coord, model in zip(('x', 'y'), models):
+        paths.append(os.path.join(tmp_dir, f'bench_{coord}.pkl'))
+        with open(paths[-1], 'wb') as f:
+            pickle.dump(model, f)
+
+    rows = records[-LATENCY_ROWS:]
+    features = gaze_features(rows)
+    predictor = EyeTrackerCoordPredict(paths[0])
+    predictor_xy = EyeTrackerCoordPredictXY(*paths)
+
+    t_start = perf_counter()
+    predictor_xy.predict_batch(rows)
+    t_batch = perf_counter() - t_start
+
+    return {
+        'predict': time_calls(lambda row: predictor.predict(*row), features),
+        'predict_xy_batched_us': t_batch / len(rows) * 1e6}
+
+
+def run_native_bench(args):
+    """ Runs the native (cpp) benchmark with the given cmd line args, and
+        returns True iff it succeeded.
+    """
+    proc = Popen([NATIVE_BENCH_PATH] + args, stdout=PIPE, stderr=PIPE)
+    stderr = proc.communicate()[1]
+
+    if proc.returncode != 0:
+        error(f'Native benchmark failed with:\n {stderr.decode()}')
+        return False
+
+    return True
+
+
+def write_synthetic_log(log_path, n):
+    """ Writes n synthetic gaze samples to a binary gaze log at the given path,
+        as generated by the replay eyetracker backend, and returns True iff
+        written.
+    """
+    return run_native_bench(['-w', log_path, '-n', str(n)])
+
+
+def bench_native(log_path, models, scaler, tmp_dir, seconds):
+    """ Runs the native (cpp) gaze pipeline benchmark, replaying the gaze log
+        at the given path through the replay eyetracker backend, with and
+        without the given fit models, and returns its results.
+    """
+    out_path = os.path.join(tmp_dir, 'bench_native.json')
+    args = ['-l', log_path, '-t', str(seconds), '-d', tmp_dir, '-o', out_path]
+
+    for coord, model in zip(('x', 'y'), models):
+        path = os.path.join(tmp_dir, f'bench_{coord}.{NATIVE_MODEL_EXT}')
+        HUDTrainGazeAccAssist._export_native_model(model, scaler, path)
+        args += [f'-{coord}', path]
+
+    if not run_native_bench(args):
+        return None
+
+    with open(out_path) as f:
+        return json.load(f)
+
+
+def git_revision():
+    """ Returns the current git revision, or None if unavailable.
+    """
+    proc = Popen(['git', 'rev-parse', '--short', 'HEAD'],
+                 stdout=PIPE, stderr=PIPE)
+    stdout = proc.communicate()[0]
+
+    return stdout.decode().strip() if proc.returncode == 0 else None
+
+
+if __name__ == "__main__":
+    # Setup CLI args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-l', '--log',
+                        default=None,
+                        help='A recorded gaze log (binary or csv) to replay. '
+                             'If not given, synthetic samples are used.')
+    parser.add_argument('-n', '--samples',
+                        type=int,
+                        default=100000,
+                        help='Max gaze samples to train from (and to '
+                             'generate, if synthetic).')
+    parser.add_argument('-s', '--sizes',
+                        type=int,
+                        nargs='+',
+                        default=TRAIN_SIZES,
+                        help='Training corpus sizes to benchmark.')
+    parser.add_argument('-m', '--model_type',
+                        default=MODEL_TYPE,
+                        help='The accuracy-assist model type to benchmark.')
+    parser.add_argument('-o', '--out',
+                        default=None,
+                        help='The JSON results path. Defaults to stdout.')
+    parser.add_argument('--no_native',
+                        action='store_true',
+                        default=False,
+                        help='Skip the native (cpp) pipeline benchmark.')
+    parser.add_argument('-t', '--seconds',
+                        type=float,
+                        default=2,
+                        help='Duration of each native pipeline run.')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(RAND_SEED)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Get the gaze samples to replay, as a binary gaze log
+        log_path = os.path.join(tmp_dir, f'bench.{GAZE_LOG_EXT}')
+
+        if args.log is None:
+            if not write_synthetic_log(log_path, args.samples):
+                exit()
+        elif args.log.endswith(f'.{GAZE_LOG_EXT}'):
+            log_path = args.log
+        else:
+            gaze_csv_to_log(args.log, log_path, verbose=False)
+
+        records = np.array(read_gaze_log(log_path)[:args.samples])
+        if len(records) <= LATENCY_ROWS:
+            error(f'Too few gaze samples to benchmark: {len(records)}')
+            exit()
+
+        X = gaze_features(records).astype(np.float64)
+        y = synthetic_labels(records, rng)
+
+        # Shuffle the training rows, as a training corpus would be
+        order = rng.permutation(len(X))
+        X, y = X[order], y[order]
+
+        results = {
+            'meta': {
+                'time': datetime.now().isoformat(),
+                'git_revision': git_revision(),
+                'host': platform.node(),
+                'python': platform.python_version(),
+                'source': args.log or 'synthetic',
+                'n_samples': len(records),
+                'model_type': args.model_type},
+            'train': []}
+
+        # Benchmark training wall time and inference cost vs corpus size
+        models, scaler = None, None
+
+        for size in sorted(args.sizes):
+            if size > len(X) - LATENCY_ROWS:
+                warn(f'Skipping training size {size}: Too few samples.')
+                continue
+
+            info(f'Benchmarking training on {size} samples...')
+            result, models, scaler = bench_train(
+                X, y, args.model_type, size)
+            results['train'].append(result)
+
+        # Benchmark the predictors and pipeline with the largest models fit
+        if models is not None:
+            info('Benchmarking python predictors...')
+            results['predictors'] = bench_predictors(
+                records, models, scaler, tmp_dir)
+
+        if not args.no_native:
+            info('Benchmarking native pipeline...')
+            results['native'] = bench_native(
+                log_path, models or [], scaler, tmp_dir, args.seconds)
+
+    # Write results
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        info(f'Benchmark results written to {args.out}.')
+    else:
+        print(json.dumps(results, indent=2))
@@ -31,6 +31,8 @@ using namespace std::chrono;
 #define CALIB_FILE_MAX_BYTES 400000
 #define NO_ERROR TOBII_ERROR_NO_ERROR
 
+typedef tobii_device_t eyetracker_device_t;
+
 string CALIB_PATH = APP_CFG["EYETRACKER_CALIB_PATH"].Scalar().c_str();
 string LIC_PATH = APP_CFG["EYETRACKER_LICENSE_PATH"].Scalar().c_str();
 
@@ -57,6 +59,7 @@ class EyeTracker {
 
     protected:
         int64_t m_device_time_offset;
+        double m_calib_load_s;
         tobii_device_t *m_device;
         tobii_api_t *m_api;
         bool m_is_elevated;
@@ -119,7 +122,9 @@ EyeTracker::EyeTracker() {
     }
 
     // Load calibration from file -- if no exist, will warn
+    steady_clock::time_point t_calib = steady_clock::now();
     calibration_load();
+    m_calib_load_s = duration<double>(steady_clock::now() - t_calib).count();
     
     // Set default states
     m_async_time_syncer = NULL;
@@ -0,0 +1,312 @@
+/////////////////////////////////////////////////////////////////////////////
+// Benchmarks the gaze pipeline, without an eyetracker device, by running
+// EyeTrackerGaze on the replay backend (see eyetracker_replay.h) through its
+// extern "C" interface, as the application does, with and without the
+// gaze-coord models. Samples are replayed from a binary gaze log, or are
+// synthetic. Results are written as JSON, for comparison across builds.
+//
+// Usage: See usage() or bench_gaze.c.sh
+//
+// Author: Dustin Fast <dustin.fast@hotmail.com>
+/////////////////////////////////////////////////////////////////////////////
+
+// The benchmark always runs against the replay backend
+#define EYETRACKER_REPLAY
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <unistd.h>
+#include <sys/stat.h>
+#include <string>
+#include <vector>
+#include <chrono>
+#include <cstdint>
+#include <sstream>
+#include <algorithm>
+
+#include "app.h"
+#include "eyetracker_gaze.h"
+
+using namespace std;
+using namespace std::chrono;
+
+
+#define BENCH_SECONDS 2                 // Default duration of each run
+#define BENCH_READ_INTERVAL_US 100      // Interval between gaze point reads
+#define BENCH_REFINE_INTERVAL_MS 50     // Interval between refine clicks
+#define BENCH_REFINE_OFFSET_PX 10       // Click target's offset from the gaze
+#define BENCH_EXPORT_REPS 10            // Full gaze buffers exported, per fmt
+
+
+// Returns the microseconds elapsed since the given time.
+double us_since(steady_clock::time_point t_start) {
+    return duration<double, micro>(steady_clock::now() - t_start).count();
+}
+
+// Returns the given latencies' summary (in us) as a JSON object.
+string latency_json(vector<double> &times) {
+    ostringstream json;
+
+    if (times.empty())
+        return "null";
+
+    sort(times.begin(), times.end());
+
+    double sum = 0;
+    for (double t : times)
+        sum += t;
+
+    json << "{\"n\": " << times.size()
+         << ", \"mean_us\": " << sum / times.size()
+         << ", \"p50_us\": " << times[times.size() / 2]
+         << ", \"p99_us\": " << times[times.size() * 99 / 100]
+         << ", \"max_us\": " << times.back() << "}";
+
+    return json.str();
+}
+
+// Returns a new EyeTrackerGaze, on the replay backend at the given rate (see
+// GazeReplaySource), using the gaze-coord models at the given paths iff given.
+EyeTrackerGaze* bench_gaze_new(double rate,
+                               const char *ml_x_path,
+                               const char *ml_y_path) {
+    APP_CFG["EYETRACKER_REPLAY_RATE"] = rate;
+
+    return eye_gaze_new(
+        APP_CFG["EYETRACKER_MOUNT_OFFSET_MM"].as<float>(),
+        APP_CFG["DISP_WIDTH_MM"].as<float>(),
+        APP_CFG["DISP_HEIGHT_MM"].as<float>(),
+        APP_CFG["DISP_WIDTH_PX"].as<int>(),
+        APP_CFG["DISP_HEIGHT_PX"].as<int>(),
+        APP_CFG["EYETRACKER_MARK_INTERVAL"].as<int>(),
+        APP_CFG["EYETRACKER_BUFF_SZ"].as<int>(),
+        APP_CFG["EYETRACKER_SMOOTH_OVER"].as<int>(),
+        ml_x_path,
+        ml_y_path);
+}
+
+// Benchmarks the gaze stream for the given number of seconds, replayed at the
+// given rate, using the gaze-coord models iff given. Measures the stream's
+// sample rate (i.e. the rate of EyeTrackerGaze::on_gaze_data, iff rate <= 0)
+// and the latency of reading the smoothed gaze point meanwhile, as by the HUD.
+// Iff refine, also measures the online refinement's per-click update latency.
+string bench_stream(double rate,
+                    double seconds,
+                    bool refine,
+                    const char *ml_x_path,
+                    const char *ml_y_path) {
+    EyeTrackerGaze *gaze = bench_gaze_new(rate, ml_x_path, ml_y_path);
+    double refine_after_us =
+        APP_CFG["GAZE_REFINE_WINDOW_MS"].as<double>() * 1000;
+    double next_refine_us = refine_after_us;
+    vector<double> point_times, refine_times;
+    ostringstream json;
+
+    eye_gaze_start(gaze);
+    steady_clock::time_point t_start = steady_clock::now();
+
+    while (us_since(t_start) < seconds * 1e6) {
+        steady_clock::time_point t_point = steady_clock::now();
+        gaze_point_t *gp = eye_gaze_point(gaze);
+        eye_gaze_point_free(gp);
+        point_times.push_back(us_since(t_point));
+
+        // Click near the gaze point, once the refine window has filled
+        if (refine && us_since(t_start) >= next_refine_us) {
+            gp = eye_gaze_point(gaze);
+
+            steady_clock::time_point t_refine = steady_clock::now();
+            eye_gaze_refine(gaze,
+                            gp->x_coord + BENCH_REFINE_OFFSET_PX,
+                            gp->y_coord - BENCH_REFINE_OFFSET_PX);
+            refine_times.push_back(us_since(t_refine));
+
+            eye_gaze_point_free(gp);
+            next_refine_us += BENCH_REFINE_INTERVAL_MS * 1000;
+        }
+
+        boost::this_thread::sleep_for(
+            boost::chrono::microseconds{BENCH_READ_INTERVAL_US});
+    }
+
+    // Note: The buffer position following the newest sample is the count
+    uint64_t n = eye_gaze_data_pos(gaze, INT64_MAX);
+    double elapsed_s = us_since(t_start) / 1e6;
+
+    eye_gaze_stop(gaze);
+    eye_gaze_destructor(gaze);
+
+    json << "{\"samples_per_s\": " << n / elapsed_s
+         << ", \"gazepoint_smoothed\": " << latency_json(point_times);
+
+    if (refine)
+        json << ", \"refine_update\": " << latency_json(refine_times);
+
+    json << "}";
+
+    return json.str();
+}
+
+// Benchmarks writing the gaze data buffer to the given path, as a binary gaze
+// log iff binary else as csv, as done during data collection. The buffer is
+// filled by the stream, replayed as fast as possible, before each write.
+string bench_export(string path, bool binary) {
+    EyeTrackerGaze *gaze = bench_gaze_new(0, NULL, NULL);
+    int buff_sz = APP_CFG["EYETRACKER_BUFF_SZ"].as<int>();
+    double elapsed_s = 0;
+    size_t n = 0;
+    struct stat st;
+    ostringstream json;
+
+    unlink(path.c_str());
+
+    for (int i = 0; i < BENCH_EXPORT_REPS; i++) {
+        eye_gaze_start(gaze);
+        while (eye_gaze_data_sz(gaze) < buff_sz)
+            boost::this_thread::sleep_for(boost::chrono::milliseconds{1});
+        eye_gaze_stop(gaze);
+
+        // Note: Writes are async, so stopping again awaits the write
+        steady_clock::time_point t_start = steady_clock::now();
+
+        if (binary)
+            n += eye_gaze_data_tolog(gaze, path.c_str(), 0);
+        else
+            n += eye_gaze_data_tocsv(gaze, path.c_str(), 0, "");
+
+        eye_gaze_stop(gaze);
+        elapsed_s += us_since(t_start) / 1e6;
+    }
+
+    eye_gaze_destructor(gaze);
+
+    double file_mb = stat(path.c_str(), &st) == 0 ? st.st_size / 1e6 : 0;
+    unlink(path.c_str());
+
+    json << "{\"samples_per_s\": " << n / elapsed_s
+         << ", \"mb_per_s\": " << file_mb / elapsed_s
+         << ", \"file_mb\": " << file_mb << "}";
+
+    return json.str();
+}
+
+// Writes n synthetic gaze samples, as replayed by the replay backend iff not
+// given a gaze log, to a binary gaze log at the given path. Returns true iff
+// written.
+bool write_synthetic_log(const char *path, int n) {
+    vector<gaze_data_t> samples = gaze_samples_synthetic(
+        n,
+        APP_CFG["DISP_WIDTH_PX"].as<int>(),
+        APP_CFG["DISP_HEIGHT_PX"].as<int>(),
+        1000000 / APP_CFG["EYETRACKER_SAMPLE_HZ"].as<int>());
+
+    FILE *f = fopen(path, "wb");
+    if (!f)
+        return false;
+
+    gazelog_write_header(f);
+    size_t n_written = fwrite(
+        samples.data(), sizeof(gaze_data_t), samples.size(), f);
+    fclose(f);
+
+    return n_written == samples.size();
+}
+
+void usage(const char *prog) {
+    printf("Usage: %s [-l gaze_log] [-x model_x -y model_y] [-t seconds] "
+           "[-d out_dir] [-o out_json]\n"
+           "       %s -w gaze_log [-n samples]\n", prog, prog);
+}
+
+
+int main(int argc, char **argv) {
+    const char *log_path = NULL;
+    const char *ml_x_path = NULL;
+    const char *ml_y_path = NULL;
+    const char *out_path = NULL;
+    const char *synthetic_path = NULL;
+    string out_dir = "/tmp";
+    double seconds = BENCH_SECONDS;
+    int n = REPLAY_SYNTHETIC_SAMPLES;
+    int opt;
+
+    while ((opt = getopt(argc, argv, "l:x:y:t:d:o:w:n:h")) != -1) {
+        switch (opt) {
+            case 'l': log_path = optarg; break;
+            case 'x': ml_x_path = optarg; break;
+            case 'y': ml_y_path = optarg; break;
+            case 't': seconds = atof(optarg); break;
+            case 'd': out_dir = optarg; break;
+            case 'o': out_path = optarg; break;
+            case 'w': synthetic_path = optarg; break;
+            case 'n': n = atoi(optarg); break;
+            default: usage(argv[0]); return 1;
+        }
+    }
+
+    // Iff requested, write the synthetic samples for others to use, and quit
+    if (synthetic_path) {
+        if (!write_synthetic_log(synthetic_path, n)) {
+            error("Failed to write synthetic gaze log.\n");
+            return 1;
+        }
+
+        return 0;
+    }
+
+    // Replay the given log, or synthetic samples, headless
+    REPLAY_LOG_PATH = log_path ? log_path : "";
+    unsetenv("DISPLAY");
+
+    size_t n_samples = log_path ?
+        gaze_samples_from_log(log_path).size() : REPLAY_SYNTHETIC_SAMPLES;
+
+    if (n_samples == 0) {
+        error("No gaze samples to benchmark.\n");
+        return 1;
+    }
+
+    // Run each benchmark, building the JSON results as we go
+    ostringstream json;
+
+    json << "{\"n_samples\": " << n_samples
+         << ", \"source\": \"" << (log_path ? "log" : "synthetic") << "\""
+         << ", \"stream_no_ml\": "
+         << bench_stream(0, seconds, false, NULL, NULL)
+         << ", \"realtime_no_ml\": "
+         << bench_stream(1, seconds, true, NULL, NULL);
+
+    if (ml_x_path && ml_y_path) {
+        // Fail, rather than silently benchmark the device coords in their place
+        if (!EyeTrackerCoordPredict(ml_x_path).is_loaded() ||
+            !EyeTrackerCoordPredict(ml_y_path).is_loaded())
+                return 1;
+
+        json << ", \"stream_ml\": "
+             << bench_stream(0, seconds, false, ml_x_path, ml_y_path)
+             << ", \"realtime_ml\": "
+             << bench_stream(1, seconds, true, ml_x_path, ml_y_path);
+    }
+
+    json << ", \"export_csv\": "
+         << bench_export(out_dir + "/bench_gaze.csv", false)
+         << ", \"export_log\": "
+         << bench_export(out_dir + "/bench_gaze" GAZELOG_EXT, true)
+         << "}\n";
+
+    // Write the results to file iff given, else to stdout
+    if (out_path) {
+        FILE *f = fopen(out_path, "w");
+        if (!f) {
+            error("Failed to open benchmark output file.\n");
+            return 1;
+        }
+
+        fputs(json.str().c_str(), f);
+        fclose(f);
+    } else {
+        fputs(json.str().c_str(), stdout);
+    }
+
+    return 0;
+}
@@ -0,0 +1,155 @@
+/////////////////////////////////////////////////////////////////////////////
+// A native evaluator for the gaze-coord accuracy-assist models. Models are
+// loaded from the flat model files exported by HUDTrainGazeAccAssist and
+// evaluated directly on gaze_data_t structs, with no Python involved.
+//
+// Author: Dustin Fast <dustin.fast@hotmail.com>
+//
+/////////////////////////////////////////////////////////////////////////////
+
+#ifndef EYETRACKER_COORD_PREDICT_H
+#define EYETRACKER_COORD_PREDICT_H
+
+#include <cmath>
+#include <vector>
+#include <cstring>
+#include <cstddef>
+#include <fstream>
+
+#include "app.h"
+#include "eyetracker_structdef.h"
+
+using namespace std;
+
+/////////////////////////////////////////////////////////////////////////////
+// Defs
+
+#define COORD_PREDICT_MAGIC "AEYERBF"
+#define COORD_PREDICT_MAGIC_SZ 8
+#define COORD_PREDICT_VERSION 1
+#define COORD_PREDICT_N_FEATURES 30
+
+// The model features are the gaze_data_t members from left_pupildiameter_mm
+// through right_gazepoint_normed_y, which are laid out contiguously.
+static_assert(
+    offsetof(gaze_data_t, right_gazepoint_normed_y) -
+    offsetof(gaze_data_t, left_pupildiameter_mm) ==
+        (COORD_PREDICT_N_FEATURES - 1) * sizeof(float),
+    "gaze_data_t feature members must be contiguous floats");
+
+/////////////////////////////////////////////////////////////////////////////
+// Class
+
+// Evaluates a single gaze-coord model of the form
+//      f(x) = intercept + sum_i(coef_i * exp(-gamma * ||v_i - scale(x)||^2))
+// where scale(x) is the min-max scaling the model was trained with. Note that
+// each instance predicts only a single coordinate.
+class EyeTrackerCoordPredict {
+    public:
+        long int predict(gaze_data_t*);
+        bool is_loaded();
+
+        EyeTrackerCoordPredict(const char*);
+
+    protected:
+        int m_n_features;
+        int m_n_vectors;
+        double m_gamma;
+        double m_intercept;
+        vector<double> m_scaler_min;
+        vector<double> m_scaler_scale;
+        vector<double> m_coefs;
+        vector<double> m_vectors;
+        bool m_loaded;
+
+    private:
+        bool load(const char*);
+};
+
+// Default constructor
+EyeTrackerCoordPredict::EyeTrackerCoordPredict(const char *model_path) {
+    m_loaded = load(model_path);
+
+    if (!m_loaded) {
+        error("Failed to load gaze-coord model ");
+        printf("'%s'. Predictions will be zero.\n", model_path);
+    }
+}
+
+// Loads the flat model file at the given path. Returns true on success.
+bool EyeTrackerCoordPredict::load(const char *model_path) {
+    char magic[COORD_PREDICT_MAGIC_SZ];
+    int32_t header[3];
+    double params[2];
+
+    ifstream f(model_path, ios::in | ios::binary);
+    if (!f)
+        return false;
+
+    // Validate the file header, as (magic, version, n_features, n_vectors)
+    f.read(magic, COORD_PREDICT_MAGIC_SZ);
+    f.read((char*)header, sizeof(header));
+
+    if (!f || strncmp(magic, COORD_PREDICT_MAGIC, COORD_PREDICT_MAGIC_SZ) ||
+        header[0] != COORD_PREDICT_VERSION ||
+        header[1] != COORD_PREDICT_N_FEATURES ||
+        header[2] <= 0)
+        return false;
+
+    m_n_features = header[1];
+    m_n_vectors = header[2];
+
+    // Read the kernel params, as (gamma, intercept)
+    f.read((char*)params, sizeof(params));
+    m_gamma = params[0];
+    m_intercept = params[1];
+
+    // Read the scaler, coefs, and kernel vectors
+    m_scaler_min.resize(m_n_features);
+    m_scaler_scale.resize(m_n_features);
+    m_coefs.resize(m_n_vectors);
+    m_vectors.resize(m_n_vectors * m_n_features);
+
+    f.read((char*)m_scaler_min.data(), m_n_features * sizeof(double));
+    f.read((char*)m_scaler_scale.data(), m_n_features * sizeof(double));
+    f.read((char*)m_coefs.data(), m_n_vectors * sizeof(double));
+    f.read((char*)m_vectors.data(), m_vectors.size() * sizeof(double));
+
+    return bool(f);
+}
+
+// Returns true iff the model was loaded successfully.
+bool EyeTrackerCoordPredict::is_loaded() {
+    return m_loaded;
+}
+
+// Returns the coordinate prediction from the given gaze data.
+long int EyeTrackerCoordPredict::predict(gaze_data_t *gaze_data) {
+    if (!m_loaded)
+        return 0;
+
+    double x[COORD_PREDICT_N_FEATURES];
+    const float *features = &gaze_data->left_pupildiameter_mm;
+
+    // Scale the features exactly as sklearn's MinMaxScaler.transform does
+    for (int j = 0; j < m_n_features; j++)
+        x[j] = features[j] * m_scaler_scale[j] + m_scaler_min[j];
+
+    // Evaluate the rbf decision function
+    double pred = m_intercept;
+    const double *v = m_vectors.data();
+
+    for (int i = 0; i < m_n_vectors; i++, v += m_n_features) {
+        double dist = 0;
+        for (int j = 0; j < m_n_features; j++) {
+            double d = v[j] - x[j];
+            dist += d * d;
+        }
+        pred += m_coefs[i] * exp(-m_gamma * dist);
+    }
+
+    return lround(pred);
+}
+
+
+#endif // Top-level include guard
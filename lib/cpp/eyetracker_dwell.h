@@ -0,0 +1,186 @@
+/////////////////////////////////////////////////////////////////////////////
+// A streaming fixation (dwell) detector for gaze coords, for gaze-driven
+// clicking.
+//
+// Author: Dustin Fast <dustin.fast@hotmail.com>
+//
+/////////////////////////////////////////////////////////////////////////////
+
+#ifndef EYETRACKER_DWELL_H
+#define EYETRACKER_DWELL_H
+
+#include <atomic>
+
+#include <boost/thread.hpp>
+#include <boost/circular_buffer.hpp>
+
+#include "eyetracker_structdef.h"
+
+using namespace std;
+
+/////////////////////////////////////////////////////////////////////////////
+// Defs
+
+#define DWELL_QUEUE_SZ 8            // Max dwells pending, before oldest dropped
+#define DWELL_MAX_GAP_US 100000     // Max sample gap within a fixation
+
+/////////////////////////////////////////////////////////////////////////////
+// Class
+
+// Detects fixations by dispersion (I-DT), incrementally: samples within
+// radius_px of the running centroid of the current fixation extend it, and
+// any other sample (or a gap in the stream) starts a new one. Once a fixation
+// has lasted dwell_ms it's emitted as a dwell, at most once per fixation and
+// at most once per refractory_ms. Each push() is O(1), as the centroid's
+// running sums are maintained on push. Dwells are queued for wait(), which
+// blocks until one is emitted, so consumers need not poll.
+// Note: push() must only be called from a single (producer) thread.
+class GazeDwellDetector {
+    public:
+        void push(int64_t, int, int);
+        bool wait(dwell_event_t*, int);
+        void set_enabled(bool);
+
+        GazeDwellDetector(int, int, int);
+
+    protected:
+        int64_t m_dwell_us;
+        double m_radius_sq;
+        int64_t m_refractory_us;
+
+    private:
+        // Current fixation state, owned by the producer thread
+        int64_t m_sum_x;
+        int64_t m_sum_y;
+        int m_n_samples;
+        int64_t m_start_us;
+        int64_t m_last_us;
+        int64_t m_refractory_end_us;
+        bool m_emitted;
+
+        atomic<bool> m_enabled;
+        atomic<bool> m_reset_pending;
+        boost::circular_buffer<dwell_event_t> m_queue;
+        boost::mutex m_queue_mutex;
+        boost::condition_variable m_queue_cond;
+
+        void emit(int64_t);
+};
+
+// Default constructor. Detection is disabled until set_enabled(true).
+GazeDwellDetector::GazeDwellDetector(
+    int dwell_ms, int radius_px, int refractory_ms) :
+    m_queue(DWELL_QUEUE_SZ) {
+        m_dwell_us = (int64_t)dwell_ms * 1000;
+        m_radius_sq = (double)radius_px * radius_px;
+        m_refractory_us = (int64_t)refractory_ms * 1000;
+
+        m_sum_x = 0;
+        m_sum_y = 0;
+        m_n_samples = 0;
+        m_start_us = 0;
+        m_last_us = 0;
+        m_refractory_end_us = 0;
+        m_emitted = false;
+
+        m_enabled.store(false);
+        m_reset_pending.store(false);
+}
+
+// Extends the current fixation with the given sample's coords, or starts a
+// new fixation from it, then emits the fixation as a dwell iff it's now
+// lasted the dwell time.
+void GazeDwellDetector::push(int64_t t_us, int x, int y) {
+    if (!m_enabled.load(memory_order_relaxed))
+        return;
+
+    // Iff (re)enabled since the last push, forget any prior fixation
+    if (m_reset_pending.exchange(false)) {
+        m_n_samples = 0;
+        m_refractory_end_us = 0;
+    }
+
+    // A gap in the stream ends the current fixation
+    if (m_n_samples > 0 && t_us - m_last_us > DWELL_MAX_GAP_US)
+        m_n_samples = 0;
+
+    // As does a sample outside the radius about its centroid
+    if (m_n_samples > 0) {
+        double dx = x - (double)m_sum_x / m_n_samples;
+        double dy = y - (double)m_sum_y / m_n_samples;
+
+        if (dx * dx + dy * dy > m_radius_sq)
+            m_n_samples = 0;
+    }
+
+    // Start a new fixation at this sample iff the last ended
+    if (m_n_samples == 0) {
+        m_sum_x = 0;
+        m_sum_y = 0;
+        m_start_us = t_us;
+        m_emitted = false;
+    }
+
+    m_sum_x += x;
+    m_sum_y += y;
+    m_n_samples++;
+    m_last_us = t_us;
+
+    // Emit the fixation as a dwell, once, iff it's lasted the dwell time
+    if (!m_emitted &&
+        t_us - m_start_us >= m_dwell_us &&
+        t_us >= m_refractory_end_us) {
+            emit(t_us);
+            m_emitted = true;
+            m_refractory_end_us = t_us + m_refractory_us;
+    }
+}
+
+// Queues the current fixation as a dwell, ending at the given time, and wakes
+// any waiter. If the queue is full, the oldest dwell is dropped.
+void GazeDwellDetector::emit(int64_t t_us) {
+    dwell_event_t dwell;
+    dwell.start_us = m_start_us;
+    dwell.end_us = t_us;
+    dwell.n_samples = m_n_samples;
+    dwell.x_coord = m_sum_x / m_n_samples;
+    dwell.y_coord = m_sum_y / m_n_samples;
+
+    {
+        boost::lock_guard<boost::mutex> lock(m_queue_mutex);
+        m_queue.push_back(dwell);
+    }
+
+    m_queue_cond.notify_one();
+}
+
+// Blocks until a dwell is queued, or for at most timeout_ms, then pops the
+// oldest dwell queued to the given dwell. Returns true iff a dwell was popped.
+bool GazeDwellDetector::wait(dwell_event_t *dwell, int timeout_ms) {
+    boost::unique_lock<boost::mutex> lock(m_queue_mutex);
+
+    if (!m_queue_cond.wait_for(lock,
+                               boost::chrono::milliseconds(timeout_ms),
+                               [this] { return !m_queue.empty(); }))
+        return false;
+
+    *dwell = m_queue.front();
+    m_queue.pop_front();
+
+    return true;
+}
+
+// Enables/disables detection. Any dwells queued are discarded, and on enable
+// detection starts afresh from the next sample.
+void GazeDwellDetector::set_enabled(bool enabled) {
+    {
+        boost::lock_guard<boost::mutex> lock(m_queue_mutex);
+        m_queue.clear();
+    }
+
+    m_reset_pending.store(true);
+    m_enabled.store(enabled);
+}
+
+
+#endif // Top-level include guard
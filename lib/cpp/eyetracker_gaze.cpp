@@ -19,7 +19,8 @@ using namespace std;
 
 
 int main() {
-    EyeTrackerGaze gaze = EyeTrackerGaze(
+    // Note: Direct-initialized, as EyeTrackerGaze is not copyable
+    EyeTrackerGaze gaze(
         APP_CFG["EYETRACKER_MOUNT_OFFSET_MM"].as<float>(),
         APP_CFG["DISP_WIDTH_MM"].as<float>(),
         APP_CFG["DISP_HEIGHT_MM"].as<float>(),
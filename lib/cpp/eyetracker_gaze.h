@@ -9,11 +9,11 @@
 //
 /////////////////////////////////////////////////////////////////////////////
 
-#include <fstream>
+#include <atomic>
+#include <vector>
+#include <string>
 
 #include <boost/thread.hpp>
-#include <boost/thread/mutex.hpp>
-#include <boost/circular_buffer.hpp>
 
 #include "app.h"  // FIXME: App.h must be before X.h, for yaml-cpp name conflict
 
@@ -21,9 +21,19 @@
 #include <X11/Xlib.h>
 #include <X11/Xutil.h>
 
+#ifdef EYETRACKER_REPLAY
+#include "eyetracker_replay.h"
+#else
 #include "eyetracker.h"
+#endif
 #include "eyetracker_structdef.h"
-#include "py_objs.cpp"
+#include "eyetracker_coord_predict.h"
+#include "eyetracker_smoother.h"
+#include "eyetracker_ringbuff.h"
+#include "eyetracker_gazelog.h"
+#include "eyetracker_logwriter.h"
+#include "eyetracker_refine.h"
+#include "eyetracker_dwell.h"
 
 using namespace std;
 
@@ -35,10 +45,22 @@ using namespace std;
 #define GAZE_MARKER_BORDER 0
 #define GAZE_MARKER_BORDER 0
 
-typedef boost::circular_buffer<shared_ptr<gaze_data_t>> circ_buff;
+#define GAZE_POINT_BUFF_SZ 4
 
-void do_gazestream_subscribe(tobii_device_t*, void*);
+typedef SeqRingBuff<gaze_data_t> gaze_buff_t;
+typedef SeqRingBuff<gaze_point_t> gaze_point_buff_t;
+
+// The x and y gaze coord acc-assist models, which are only ever swapped in
+// (and out) together
+typedef struct gaze_ml {
+    shared_ptr<EyeTrackerCoordPredict> x;
+    shared_ptr<EyeTrackerCoordPredict> y;
+} gaze_ml_t;
+
+void do_gazestream_subscribe(eyetracker_device_t*, void*);
+#ifndef EYETRACKER_REPLAY
 static void cb_gaze_data(tobii_gaze_data_t const*, void*);
+#endif
 XColor createXColorFromRGBA(void*, short, short, short, short);
 
 /////////////////////////////////////////////////////////////////////////////
@@ -58,14 +80,26 @@ class EyeTrackerGaze : public EyeTracker {
         void start();
         void stop();
         int gaze_data_tocsv(const char*, int, boost::shared_ptr<char>);
+        int gaze_data_tolog(const char*, int);
+        int gaze_data_snapshot(gaze_data_t*, int);
+        uint64_t gaze_data_pos(int64_t);
+        int gaze_data_export_range(int64_t, int64_t, const char*);
+        int gaze_data_export_since(uint64_t, const char*, uint64_t*);
         bool is_gaze_valid();
-        void enque_gaze_data(shared_ptr<gaze_data_t>);
+        void enque_gaze_data(gaze_data_t*);
+        int refine(int, int);
+        void refine_reset();
+        bool reload_models(const char*, const char*);
+        void startup_seconds(double*, double*);
+        bool dwell_wait(dwell_event_t*, int);
+        void dwell_enable(bool);
         void print_gaze_data();
         int gaze_data_sz();
         int disp_x_from_normed_x(float);
         int disp_y_from_normed_y(float);
         gaze_point_t* get_gazepoint_smoothed(gaze_point_t *gp);
-        void set_gaze_marker(shared_ptr<gaze_data_t>);
+        void on_gaze_data(gaze_data_t*);
+        void set_gaze_marker();
         void set_cursor_capture(bool);
 
         EyeTrackerGaze(
@@ -77,15 +111,30 @@ class EyeTrackerGaze : public EyeTracker {
         int m_disp_width;
         int m_disp_height;
         int m_smooth_over;
-        bool m_use_ml;
         bool m_capture_cursor;
-        shared_ptr<circ_buff> m_gaze_buff;
+        shared_ptr<gaze_buff_t> m_gaze_buff;
+        shared_ptr<gaze_point_buff_t> m_gaze_point_buff;
+        atomic<uint64_t> m_gaze_buff_start;
 
     private:
-        EyeTrackerCoordPredict *m_x_ml, *m_y_ml;
+        shared_ptr<const gaze_ml_t> m_ml;
         shared_ptr<boost::thread> m_async_streamer;
-        shared_ptr<boost::thread> m_async_writer;
-        shared_ptr<boost::mutex> m_async_mutex;
+        shared_ptr<GazeLogWriter> m_log_writer;
+        shared_ptr<GazePointSmoother> m_smoother;
+        shared_ptr<GazeCoordRefiner> m_refiner;
+        shared_ptr<GazeDwellDetector> m_dwell;
+        int64_t m_refine_window_us;
+        double m_model_load_s;
+
+        void create_gaze_marker();
+        void gaze_coords(gaze_data_t*, int*, int*);
+        shared_ptr<vector<gaze_data_t>> gaze_data_unwritten(int);
+        int gaze_data_export(uint64_t, uint64_t, const char*);
+        bool write_async(string,
+                         shared_ptr<vector<gaze_data_t>>,
+                         bool,
+                         boost::shared_ptr<char>,
+                         bool);
 };
 
 // Default constructor
@@ -112,9 +161,32 @@ EyeTrackerGaze::EyeTrackerGaze(float eyetracker_mnt_offset,
         // Since we care about device timestamps, start time synchronization
         sync_device_time();
 
-        // Init circular gaze data buffer and mutex 
-        m_gaze_buff = make_shared<circ_buff>(buff_sz); 
-        m_async_mutex = make_shared<boost::mutex>();
+        // Init the preallocated gaze data/point ring buffers and smoother
+        m_gaze_buff = make_shared<gaze_buff_t>(buff_sz);
+        m_gaze_point_buff = make_shared<gaze_point_buff_t>(GAZE_POINT_BUFF_SZ);
+        m_gaze_buff_start.store(0);
+        m_smoother = make_shared<GazePointSmoother>(smooth_over);
+
+        // Start the persistent gaze log writer
+        m_log_writer = make_shared<GazeLogWriter>(
+            APP_CFG["EYETRACKER_LOG_QUEUE_SZ"].as<int>(),
+            APP_CFG["EYETRACKER_LOG_FSYNC_MS"].as<int>());
+
+        // Init the online gaze coord correction, which is learned from clicks
+        m_refiner = make_shared<GazeCoordRefiner>(
+            disp_width_px,
+            disp_height_px,
+            APP_CFG["GAZE_REFINE_FORGET"].as<double>(),
+            APP_CFG["GAZE_REFINE_PRIOR"].as<double>(),
+            APP_CFG["GAZE_REFINE_MAX_PX"].as<int>());
+        m_refine_window_us = 
+            APP_CFG["GAZE_REFINE_WINDOW_MS"].as<int64_t>() * 1000;
+
+        // Init the dwell detector, for gaze clicking (disabled until enabled)
+        m_dwell = make_shared<GazeDwellDetector>(
+            APP_CFG["GAZE_DWELL_MS"].as<int>(),
+            APP_CFG["GAZE_DWELL_RADIUS_PX"].as<int>(),
+            APP_CFG["GAZE_DWELL_REFRACTORY_MS"].as<int>());
 
         // Set default tracker states
         m_mark_count = 0;
@@ -122,70 +194,94 @@ EyeTrackerGaze::EyeTrackerGaze(float eyetracker_mnt_offset,
         m_pos_guide_y = 0.0;
         m_pos_guide_z = 0.0;
         m_capture_cursor = False;
-        m_async_writer = NULL;
         m_async_streamer = NULL;
 
-        // Init X11 display
+        // Init X11 display and gaze marker, iff a display is available
         m_disp = XOpenDisplay(NULL);
-        Window root_win = DefaultRootWindow(m_disp);
-
-        XVisualInfo vinfo;
-        XMatchVisualInfo(
-            m_disp,
-            DefaultScreen(m_disp),
-            32,
-            TrueColor,
-            &vinfo
-        );
-
-        // Create the gaze marker (as an X11 window)
-        XSetWindowAttributes attrs;
-        attrs.save_under= true;
-        attrs.override_redirect = true;
-        attrs.border_pixel = 0;
-        attrs.background_pixel = createXColorFromRGBA(
-            this, 255, 100, 0, 175).pixel;
-        attrs.colormap = XCreateColormap(
-            m_disp, root_win, vinfo.visual, AllocNone);
-
-        m_overlay = XCreateWindow(
-            m_disp,
-            root_win,
-            0, 0, 
-            GAZE_MARKER_WIDTH, 
-            GAZE_MARKER_HEIGHT,
-            GAZE_MARKER_BORDER,
-            vinfo.depth,
-            InputOutput, 
-            vinfo.visual,
-            CWSaveUnder | 
-            CWOverrideRedirect | 
-            CWBackPixel | 
-            CWBorderPixel | 
-            CWColormap, 
-            &attrs
-        );
 
-        XMapWindow(m_disp, m_overlay);
+        if (m_disp == NULL)
+            warn("No X display available. Gaze marking is disabled.\n");
+        else
+            create_gaze_marker();
 
         // Instantiate the gaze coord acc improvement models iff given
+        steady_clock::time_point t_models = steady_clock::now();
+
         if (ml_x_path != NULL && ml_y_path != NULL) {
-            m_x_ml = new EyeTrackerCoordPredict(ml_x_path);
-            m_y_ml = new EyeTrackerCoordPredict(ml_y_path);
-            m_use_ml = True;
-            info("Using ML gaze accuracy-assist.\n");
+            shared_ptr<gaze_ml_t> ml = make_shared<gaze_ml_t>();
+            ml->x = make_shared<EyeTrackerCoordPredict>(ml_x_path);
+            ml->y = make_shared<EyeTrackerCoordPredict>(ml_y_path);
+
+            // Iff either failed to load, use the device's coords instead
+            if (ml->x->is_loaded() && ml->y->is_loaded()) {
+                m_ml = ml;
+                info("Using ML gaze accuracy-assist.\n");
+            } else {
+                m_ml = NULL;
+                warn("Gaze-coord models not loaded. Using device coords.\n");
+            }
         } else {
-            m_use_ml = False;
+            m_ml = NULL;
         }
+
+        m_model_load_s =
+            duration<double>(steady_clock::now() - t_models).count();
 }
 
 // Destructor
 EyeTrackerGaze::~EyeTrackerGaze() {
+    if (m_disp == NULL)
+        return;
+
     XUnmapWindow(m_disp, m_overlay);
     XFlush(m_disp);
     XCloseDisplay(m_disp);
 }
 
+// Creates the on-screen gaze marker, as an X11 overlay window.
+void EyeTrackerGaze::create_gaze_marker() {
+    Window root_win = DefaultRootWindow(m_disp);
+
+    XVisualInfo vinfo;
+    XMatchVisualInfo(
+        m_disp,
+        DefaultScreen(m_disp),
+        32,
+        TrueColor,
+        &vinfo
+    );
+
+    // Create the gaze marker (as an X11 window)
+    XSetWindowAttributes attrs;
+    attrs.save_under= true;
+    attrs.override_redirect = true;
+    attrs.border_pixel = 0;
+    attrs.background_pixel = createXColorFromRGBA(
+        this, 255, 100, 0, 175).pixel;
+    attrs.colormap = XCreateColormap(
+        m_disp, root_win, vinfo.visual, AllocNone);
+
+    m_overlay = XCreateWindow(
+        m_disp,
+        root_win,
+        0, 0, 
+        GAZE_MARKER_WIDTH, 
+        GAZE_MARKER_HEIGHT,
+        GAZE_MARKER_BORDER,
+        vinfo.depth,
+        InputOutput, 
+        vinfo.visual,
+        CWSaveUnder | 
+        CWOverrideRedirect | 
+        CWBackPixel | 
+        CWBorderPixel | 
+        CWColormap, 
+        &attrs
+    );
+
+    XMapWindow(m_disp, m_overlay);
+}
+
 // Starts the async gaze threads
 void EyeTrackerGaze::start() {
     if (m_async_streamer) {
@@ -206,11 +302,8 @@ void EyeTrackerGaze::stop() {
         m_async_streamer = NULL;
     }
 
-    // Wait for writer thread to finish its current write
-    if (m_async_writer) {
-        m_async_writer->join();
-        m_async_writer = NULL;
-    }
+    // Wait for the log writer to finish any queued writes
+    m_log_writer->flush();
 }
 
 // Writes the gaze data to the given csv file path, creating it if exists 
@@ -219,92 +312,184 @@ void EyeTrackerGaze::stop() {
 // appends the given cstring to each csv row written.
 int EyeTrackerGaze::gaze_data_tocsv(
     const char *file_path, int n=0, boost::shared_ptr<char> label=NULL) {
-    // Copy circ buff contents then (effectively) clear it
-    m_async_mutex->lock();
-    shared_ptr<circ_buff> gaze_buff = m_gaze_buff;
-    m_gaze_buff = make_shared<circ_buff>(m_buff_sz);
-    m_async_mutex->unlock();
-
-    // Get buff content count and return if empty
-    int sample_count = gaze_buff->size();
+    shared_ptr<vector<gaze_data_t>> gaze_data = gaze_data_unwritten(n);
+    int sample_count = gaze_data->size();
+
+    // Return if no samples to write
     if (sample_count <= 0)
         return 0;
-    
-    // n == 0 denotes write entire buff contents
-    if (n == 0)
-        n = sample_count;
-
-    // Ensure any previous async write job has finished
-    if (m_async_writer) {
-        m_async_writer->join();
-    }
-
-    // Write the gaze data to file asynchronously
-    m_async_writer = make_shared<boost::thread>(
-        [file_path, gaze_buff, n, label]() {
-            ofstream f, f2;
-            f.open(file_path, fstream::in | fstream::out | fstream::app);
-
-            // Write (at most) the n latest samples to csv in ascending order
-            int sz = gaze_buff->size();
-            int n_capped = min(sz, n);
-
-            for (int j = sz - n_capped; j < sz; j++)  {
-                auto cgd = *gaze_buff->at(j); 
-                f << 
-                    cgd.unixtime_us << ", " <<
-                    cgd.left_pupildiameter_mm << ", " <<
-                    cgd.right_pupildiameter_mm << ", " <<
-                    cgd.left_eyeposition_normed_x << ", " <<
-                    cgd.left_eyeposition_normed_y << ", " <<
-                    cgd.left_eyeposition_normed_z << ", " <<
-                    cgd.right_eyeposition_normed_x << ", " <<
-                    cgd.right_eyeposition_normed_y << ", " <<
-                    cgd.right_eyeposition_normed_z << ", " <<
-                    cgd.left_eyecenter_mm_x << ", " <<
-                    cgd.left_eyecenter_mm_y << ", " <<
-                    cgd.left_eyecenter_mm_z << ", " <<
-                    cgd.right_eyecenter_mm_x << ", " <<
-                    cgd.right_eyecenter_mm_y << ", " <<
-                    cgd.right_eyecenter_mm_z << ", " <<
-                    cgd.left_gazeorigin_mm_x << ", " <<
-                    cgd.left_gazeorigin_mm_y << ", " <<
-                    cgd.left_gazeorigin_mm_z << ", " <<
-                    cgd.right_gazeorigin_mm_x << ", " <<
-                    cgd.right_gazeorigin_mm_y << ", " <<
-                    cgd.right_gazeorigin_mm_z << ", " <<
-                    cgd.left_gazepoint_mm_x << ", " <<
-                    cgd.left_gazepoint_mm_y << ", " <<
-                    cgd.left_gazepoint_mm_z << ", " <<
-                    cgd.right_gazepoint_mm_x << ", " <<
-                    cgd.right_gazepoint_mm_y << ", " <<
-                    cgd.right_gazepoint_mm_z << ", " <<
-                    cgd.left_gazepoint_normed_x << ", " <<
-                    cgd.left_gazepoint_normed_y << ", " <<
-                    cgd.right_gazepoint_normed_x << ", " <<
-                    cgd.right_gazepoint_normed_y << ", " <<
-                    cgd.combined_gazepoint_x << ", " <<
-                    cgd.combined_gazepoint_y;
-                    
-                if (label != NULL)
-                    f << ", " << label;
-                
-                f << "\n";
-            }
 
-            f.close();
-        }
-    );
+    write_async(file_path, gaze_data, false, label, true);
+
+    return sample_count;
+}
+
+// Writes the gaze data to the given binary gaze log path (see
+// eyetracker_gazelog.h), creating it if not exists else appending to it. If n
+// is given, writes only the most recent n samples. Returns an int representing
+// the number of samples written.
+int EyeTrackerGaze::gaze_data_tolog(const char *file_path, int n=0) {
+    shared_ptr<vector<gaze_data_t>> gaze_data = gaze_data_unwritten(n);
+    int sample_count = gaze_data->size();
+
+    // Return if no samples to write
+    if (sample_count <= 0)
+        return 0;
+
+    write_async(file_path, gaze_data, true, NULL, true);
+
+    return sample_count;
+}
+
+// Returns the buffer position of the oldest sample in the gaze data buffer
+// having a timestamp >= t_us, found by binary search over the buffer's
+// (ascending) sample timestamps. If there is no such sample, the position
+// following the newest sample is returned.
+uint64_t EyeTrackerGaze::gaze_data_pos(int64_t t_us) {
+    uint64_t lo = m_gaze_buff->tail();
+    uint64_t hi = m_gaze_buff->head();
+    gaze_data_t cgd;
+
+    while (lo < hi) {
+        uint64_t mid = lo + (hi - lo) / 2;
+
+        // Samples overwritten since the search began are older than all others
+        if (!m_gaze_buff->read(mid, &cgd) || cgd.unixtime_us < t_us)
+            lo = mid + 1;
+        else
+            hi = mid;
+    }
+
+    return lo;
+}
+
+// Writes the samples in the gaze data buffer having timestamps in
+// [t_start_us, t_end_us) to the given file path, as a binary gaze log iff the
+// path has the GAZELOG_EXT extension else as csv. Returns the number of
+// samples written, or -1 if the log writer's queue is full (in which case
+// nothing is written). Unlike gaze_data_tocsv, the buffer is unaffected.
+int EyeTrackerGaze::gaze_data_export_range(
+    int64_t t_start_us, int64_t t_end_us, const char *file_path) {
+    return gaze_data_export(
+        gaze_data_pos(t_start_us), gaze_data_pos(t_end_us), file_path);
+}
+
+// Writes the samples in the gaze data buffer at or after the given buffer
+// position (e.g. as given by gaze_data_pos) to the given file path, as with
+// gaze_data_export_range, and returns the number of samples written, or -1.
+// Iff next_watermark is given, it is set to the position following the newest
+// sample written, such that exporting since it in a subsequent call writes
+// each sample exactly once. The buffer is unaffected.
+int EyeTrackerGaze::gaze_data_export_since(
+    uint64_t watermark, const char *file_path, uint64_t *next_watermark=NULL) {
+    uint64_t head = m_gaze_buff->head();
+    int sample_count = gaze_data_export(watermark, head, file_path);
+
+    // On backpressure, leave the watermark as is so the samples are retried
+    if (next_watermark != NULL)
+        *next_watermark = sample_count < 0 ? watermark : head;
 
     return sample_count;
 }
 
-// Enques gaze data into the circular buffer as well as updates user pos members
-void EyeTrackerGaze::enque_gaze_data(shared_ptr<gaze_data_t> cgd) {
-    // Engue the given gaze data
-    m_async_mutex->lock();
-    m_gaze_buff->push_back(cgd);
-    m_async_mutex->unlock();
+// Writes the samples at buffer positions [from, to) still in the buffer to
+// the given file path, by extension, and returns the number of samples written
+// or -1 if the log writer's queue is full.
+int EyeTrackerGaze::gaze_data_export(
+    uint64_t from, uint64_t to, const char *file_path) {
+    if (to <= from)
+        return 0;
+
+    shared_ptr<vector<gaze_data_t>> gaze_data = 
+        make_shared<vector<gaze_data_t>>(min(to - from, (uint64_t)m_buff_sz));
+    int sample_count = m_gaze_buff->range(gaze_data->data(), from, to);
+
+    // Return if no samples to write
+    if (sample_count <= 0)
+        return 0;
+
+    gaze_data->resize(sample_count);
+
+    if (!write_async(
+        file_path, gaze_data, gazelog_is_log_path(file_path), NULL, false))
+            return -1;
+
+    return sample_count;
+}
+
+// Queues the given gaze data to be written to the given file path by the log
+// writer, creating it if not exists else appending to it -- as a binary gaze
+// log iff binary, else as csv. If label given, appends the given cstring to
+// each csv row. If the writer's queue is full, blocks until it is not iff
+// block, else returns false without queueing. Returns true iff queued.
+bool EyeTrackerGaze::write_async(string file_path,
+                                 shared_ptr<vector<gaze_data_t>> gaze_data,
+                                 bool binary,
+                                 boost::shared_ptr<char> label,
+                                 bool block) {
+    gaze_log_batch_t batch = {file_path, gaze_data, binary, label};
+
+    return m_log_writer->enqueue(batch, block);
+}
+
+// Returns a copy of (at most) the n latest samples not yet written, in
+// ascending order, then (effectively) clears the buff by advancing its start
+// past them. Note that n == 0 denotes all unwritten buff contents.
+shared_ptr<vector<gaze_data_t>> EyeTrackerGaze::gaze_data_unwritten(int n) {
+    uint64_t end;
+    shared_ptr<vector<gaze_data_t>> gaze_data = 
+        make_shared<vector<gaze_data_t>>(m_buff_sz);
+    int sample_count = m_gaze_buff->snapshot(
+        gaze_data->data(), n, m_gaze_buff_start.load(), &end);
+    m_gaze_buff_start.store(end);
+
+    gaze_data->resize(sample_count);
+
+    return gaze_data;
+}
+
+// Copies (at most) the n most recent samples in the gaze data buffer to out,
+// in ascending order, and returns the number copied. If n == 0, all samples
+// in the buffer are copied. Unlike gaze_data_tocsv, the buffer is unaffected.
+// Out must have room for n samples, or for m_buff_sz samples if n == 0.
+int EyeTrackerGaze::gaze_data_snapshot(gaze_data_t *out, int n=0) {
+    return m_gaze_buff->snapshot(out, n);
+}
+
+// Sets x_coord and y_coord to the given sample's gaze coords -- ml-assisted
+// iff using ml, else as given by the device -- before any online correction.
+void EyeTrackerGaze::gaze_coords(gaze_data_t *cgd, int *x_coord, int *y_coord) {
+    shared_ptr<const gaze_ml_t> ml = atomic_load(&m_ml);
+
+    // Iff using ml acc assist, use ml assisted-coords
+    if (ml) {
+        *x_coord = ml->x->predict(cgd);
+        *y_coord = ml->y->predict(cgd);
+    }
+    // Else use device-given coords
+    else {
+        *x_coord = cgd->combined_gazepoint_x;
+        *y_coord = cgd->combined_gazepoint_y;
+    }
+}
+
+// Enques gaze data into the circular buffer as well as updates user pos members.
+// The sample's gaze coords, ml-assisted iff using ml and corrected by any
+// online refinement, are determined here once and pushed to the smoother and
+// the dwell detector.
+// Note: Must only be called from the gaze stream thread (the single producer).
+void EyeTrackerGaze::enque_gaze_data(gaze_data_t *cgd) {
+    int x_coord, y_coord;
+    gaze_point_t gp;
+
+    gaze_coords(cgd, &x_coord, &y_coord);
+    m_refiner->correct(cgd, &x_coord, &y_coord);
+
+    // Engue the given gaze data, then publish the new smoothed gaze point
+    m_gaze_buff->push(*cgd);
+    m_smoother->push(x_coord, y_coord);
+    m_gaze_point_buff->push(*m_smoother->get(&gp));
+    m_dwell->push(cgd->unixtime_us, x_coord, y_coord);
 
     // Update user position guide from given gaze data
     m_pos_guide_x = (
@@ -318,26 +503,121 @@ void EyeTrackerGaze::enque_gaze_data(shared_ptr<gaze_data_t> cgd) {
     m_pos_guide_x = abs(1 - m_pos_guide_x);
 }
 
+// Refines the online gaze coord correction from the samples in the gaze data
+// buffer from the last m_refine_window_us, given that the user was looking at
+// the given on-screen target over that time (e.g. a HUD button they just
+// clicked). The new correction applies to all subsequent samples. Returns the
+// number of samples learned from, or 0 if they were rejected as outliers.
+// Note: The samples' coords are recomputed here, off the gaze stream thread.
+int EyeTrackerGaze::refine(int target_x, int target_y) {
+    int64_t now_us = time_point_cast<microseconds>(
+        system_clock::now()).time_since_epoch().count();
+    uint64_t from = gaze_data_pos(now_us - m_refine_window_us);
+    uint64_t to = m_gaze_buff->head();
+
+    if (to <= from)
+        return 0;
+
+    vector<gaze_data_t> samples(min(to - from, (uint64_t)m_buff_sz));
+    int sample_count = m_gaze_buff->range(samples.data(), from, to);
+
+    vector<int> x_coords(sample_count);
+    vector<int> y_coords(sample_count);
+
+    for (int j = 0; j < sample_count; j++)
+        gaze_coords(&samples[j], &x_coords[j], &y_coords[j]);
+
+    return m_refiner->update(samples.data(),
+                             x_coords.data(),
+                             y_coords.data(),
+                             sample_count,
+                             target_x,
+                             target_y);
+}
+
+// Discards the online gaze coord correction learned so far.
+void EyeTrackerGaze::refine_reset() {
+    m_refiner->reset();
+}
+
+// Loads the gaze coord acc-assist models at the given paths, on the caller's
+// thread, then swaps them in for the current models (if any) atomically, such
+// that each sample is predicted wholly by either the old or new models and
+// the gaze stream is never paused. As the online correction was learned
+// against the old models' errors, it is discarded. If either model fails to
+// load, the current models are kept. Returns true iff the models were swapped.
+bool EyeTrackerGaze::reload_models(const char *ml_x_path, const char *ml_y_path) {
+    shared_ptr<gaze_ml_t> ml = make_shared<gaze_ml_t>();
+    ml->x = make_shared<EyeTrackerCoordPredict>(ml_x_path);
+    ml->y = make_shared<EyeTrackerCoordPredict>(ml_y_path);
+
+    if (!ml->x->is_loaded() || !ml->y->is_loaded()) {
+        warn("Gaze-coord model reload failed. Keeping current models.\n");
+        return false;
+    }
+
+    atomic_store(&m_ml, shared_ptr<const gaze_ml_t>(ml));
+    m_refiner->reset();
+    info("Reloaded ML gaze accuracy-assist models.\n");
+
+    return true;
+}
+
+// Sets the given args to the seconds spent, at construction, loading the
+// device calibration and the gaze coord models, respectively.
+void EyeTrackerGaze::startup_seconds(double *calib_load_s, double *model_load_s) {
+    *calib_load_s = m_calib_load_s;
+    *model_load_s = m_model_load_s;
+}
+
+// Blocks until the dwell detector emits a dwell, or for at most timeout_ms,
+// and sets the given dwell to it. Returns true iff a dwell was emitted.
+bool EyeTrackerGaze::dwell_wait(dwell_event_t *dwell, int timeout_ms) {
+    return m_dwell->wait(dwell, timeout_ms);
+}
+
+// Enables/disables dwell detection. Dwells are only detected, and queued for
+// dwell_wait, while enabled.
+void EyeTrackerGaze::dwell_enable(bool enabled) {
+    m_dwell->set_enabled(enabled);
+}
+
+// Handles a (valid) gaze sample from the device -- Enques it, then annotates
+// the gaze point on the screen every m_mark_freq samples.
+void EyeTrackerGaze::on_gaze_data(gaze_data_t *cgd) {
+    enque_gaze_data(cgd);
+
+    // Annotate (x, y) on the screen every m_mark_freq samples
+    m_mark_count++;
+    if (m_mark_count % m_mark_freq != 0)
+        return;
+
+    set_gaze_marker();
+    m_mark_count = 0;
+}
+
 // Prints the coord contents of the circular buffer. For debug convenience.
 void EyeTrackerGaze::print_gaze_data() {
-    circ_buff::iterator i; 
+    vector<gaze_data_t> gaze_data(m_buff_sz);
+    int sample_count = m_gaze_buff->snapshot(
+        gaze_data.data(), 0, m_gaze_buff_start.load());
 
-    m_async_mutex->lock();
-    for (i = m_gaze_buff->begin(); i < m_gaze_buff->end(); i++)  {
+    for (int j = 0; j < sample_count; j++)  {
         printf("(%d, %d)\n",
-        i->get()->combined_gazepoint_x,
-        i->get()->combined_gazepoint_y); 
+        gaze_data[j].combined_gazepoint_x,
+        gaze_data[j].combined_gazepoint_y); 
     }
-    m_async_mutex->unlock();
 
     info("");
-    printf("Gaze sample count = %li\n", m_gaze_buff->size());
+    printf("Gaze sample count = %d\n", sample_count);
 }
 
 // Returns the current number of gaze points in the gaze data buffer.
-// Note: The caller of this func is responsible for calling mutex lock/unlock.
 int EyeTrackerGaze::gaze_data_sz() {
-    return m_gaze_buff->size();
+    uint64_t head = m_gaze_buff->head();
+    uint64_t start = max(m_gaze_buff_start.load(), m_gaze_buff->tail());
+
+    return head > start ? head - start : 0;
 }
 
 // Given a normalized gaze point's x coord, returns the x in display coords.
@@ -350,53 +630,26 @@ int EyeTrackerGaze::disp_y_from_normed_y(float y_normed) {
     return y_normed * m_disp_height;
 }
 
-// Returns the current gazepoint, smoothed over some number of samples,
-// possibly predicted from ml.
+// Returns the current gazepoint, smoothed over (at most) the m_smooth_over
+// latest samples, possibly predicted from ml. Runs in constant time, as each
+// sample's coords were determined on enque. Never blocks the gaze stream.
 gaze_point_t* EyeTrackerGaze::get_gazepoint_smoothed(gaze_point_t *gp) {
-    int avg_x = 0;
-    int avg_y = 0;
-    int buff_sz = 0;
-    int n_samples = 0;
-
-    // Average the gaze pt from (at most) the m_smooth_over latest samples
-    m_async_mutex->lock();
-    buff_sz = gaze_data_sz();
-    n_samples = min(buff_sz, m_smooth_over);
-    
-    for (int j = buff_sz - n_samples; j < buff_sz; j++)  {
-        auto cgd = *m_gaze_buff->at(j); 
-
-        // Iff using ml acc assist, smooth over ml assisted-cords
-        if (m_use_ml) {
-            avg_x += m_x_ml->predict(&cgd);
-            avg_y += m_y_ml->predict(&cgd);
-        }
-        // Else smooth from device-given coords
-        else {
-            avg_x += cgd.combined_gazepoint_x;
-            avg_y += cgd.combined_gazepoint_y;
-        }
-    }
-
-    m_async_mutex->unlock();
-
-    if (n_samples > 0) {
-        avg_x = avg_x / n_samples;
-        avg_y = avg_y / n_samples; 
+    if (!m_gaze_point_buff->latest(gp)) {
+        gp->n_samples = 0;
+        gp->x_coord = 0;
+        gp->y_coord = 0;
     }
 
-    // Update the user provided struct
-    gp->n_samples = n_samples;
-    gp->x_coord = avg_x;
-    gp->y_coord = avg_y;
-
     return gp;
 }
 
 // Sets or updates the on-screen gaze marker (or cursor) position.
-void EyeTrackerGaze::set_gaze_marker(shared_ptr<gaze_data_t> cgd) {
-    gaze_point_t *gp = new(gaze_point_t);
-    get_gazepoint_smoothed(gp);
+void EyeTrackerGaze::set_gaze_marker() {
+    if (m_disp == NULL)
+        return;
+
+    gaze_point_t gp;
+    get_gazepoint_smoothed(&gp);
 
     // Update gaze marker, either with w/ cursor cap or xwin overlay
     if (m_capture_cursor) {
@@ -404,16 +657,14 @@ void EyeTrackerGaze::set_gaze_marker(shared_ptr<gaze_data_t> cgd) {
                      None,
                      m_overlay,
                      0, 0, 0, 0,
-                     gp->x_coord,
-                     gp->y_coord);
+                     gp.x_coord,
+                     gp.y_coord);
     } else {
         XMoveWindow(m_disp,
                     m_overlay,
-                    gp->x_coord,
-                    gp->y_coord); 
+                    gp.x_coord,
+                    gp.y_coord); 
     }
-    
-    delete gp;
 
     XFlush(m_disp);
 }
@@ -423,6 +674,9 @@ void EyeTrackerGaze::set_cursor_capture(bool enabled) {
     // Enable/Disabled
     m_capture_cursor = enabled;
 
+    if (m_disp == NULL)
+        return;
+
     // Hide any active markers
     XMoveWindow(m_disp, m_overlay, -10, -10);
 }
@@ -467,6 +721,57 @@ extern "C" {
             return gaze->gaze_data_tocsv(file_path, n, p_label);
     }
 
+    int eye_gaze_data_tolog(
+        EyeTrackerGaze* gaze, const char *file_path, int n) {
+            return gaze->gaze_data_tolog(file_path, n);
+    }
+
+    uint64_t eye_gaze_data_pos(EyeTrackerGaze* gaze, int64_t t_us) {
+        return gaze->gaze_data_pos(t_us);
+    }
+
+    int eye_gaze_data_export_range(EyeTrackerGaze* gaze,
+                                   int64_t t_start_us,
+                                   int64_t t_end_us,
+                                   const char *file_path) {
+        return gaze->gaze_data_export_range(t_start_us, t_end_us, file_path);
+    }
+
+    int eye_gaze_data_export_since(EyeTrackerGaze* gaze,
+                                   uint64_t watermark,
+                                   const char *file_path,
+                                   uint64_t *next_watermark) {
+        return gaze->gaze_data_export_since(
+            watermark, file_path, next_watermark);
+    }
+
+    int eye_gaze_refine(EyeTrackerGaze* gaze, int target_x, int target_y) {
+        return gaze->refine(target_x, target_y);
+    }
+
+    void eye_gaze_refine_reset(EyeTrackerGaze* gaze) {
+        gaze->refine_reset();
+    }
+
+    bool eye_gaze_reload_models(
+        EyeTrackerGaze* gaze, const char *ml_x_path, const char *ml_y_path) {
+            return gaze->reload_models(ml_x_path, ml_y_path);
+    }
+
+    void eye_gaze_startup_seconds(
+        EyeTrackerGaze* gaze, double *calib_load_s, double *model_load_s) {
+            gaze->startup_seconds(calib_load_s, model_load_s);
+    }
+
+    bool eye_gaze_dwell_wait(
+        EyeTrackerGaze* gaze, dwell_event_t *dwell, int timeout_ms) {
+            return gaze->dwell_wait(dwell, timeout_ms);
+    }
+
+    void eye_gaze_dwell_enable(EyeTrackerGaze* gaze, bool enabled) {
+        gaze->dwell_enable(enabled);
+    }
+
     void eye_gaze_start(EyeTrackerGaze* gaze) {
         gaze->start();
     }
@@ -479,6 +784,10 @@ extern "C" {
         return gaze->gaze_data_sz();
     }
 
+    int eye_gaze_data_snapshot(EyeTrackerGaze* gaze, gaze_data_t *out, int n) {
+        return gaze->gaze_data_snapshot(out, n);
+    }
+
     float eye_user_pos_guide_x(EyeTrackerGaze* gaze) {
         // printf("%f", gaze->m_pos_guide_x);
         return gaze->m_pos_guide_x;
@@ -515,8 +824,23 @@ extern "C" {
 /////////////////////////////////////////////////////////////////////////////
 // Gaze subscriber and callback functions
 
+#ifdef EYETRACKER_REPLAY
+
+// Starts the replayed gaze data stream, which runs until interrupted (or
+// immediately ends iff the replay source has no samples).
+void do_gazestream_subscribe(eyetracker_device_t *device, void *gaze) {
+    gaze_data_t cgd;
+
+    try {
+        while (device->next(&cgd))
+            static_cast<EyeTrackerGaze*>(gaze)->on_gaze_data(&cgd);
+    } catch (boost::thread_interrupted&) {}
+}
+
+#else
+
 // Starts the gaze point and user position guide data streams
-void do_gazestream_subscribe(tobii_device_t *device, void *gaze) {
+void do_gazestream_subscribe(eyetracker_device_t *device, void *gaze) {
 
     // Subscribe to gaze point
     assert(tobii_gaze_data_subscribe(device, cb_gaze_data, gaze
@@ -564,79 +888,71 @@ static void cb_gaze_data(tobii_gaze_data_t const *data, void *obj) {
             data->timestamp_system_us);
 
         // Copy gaze data then enque it in the EyeTrackerGaze buff
-        shared_ptr<gaze_data_t> cgd = make_shared<gaze_data_t>();
+        gaze_data_t cgd;
 
-        cgd->unixtime_us = timestamp_us;
-        cgd->left_pupildiameter_mm = data->left.pupil_diameter_mm;
-        cgd->right_pupildiameter_mm = data->right.pupil_diameter_mm;
-        cgd->left_eyeposition_normed_x = 
+        cgd.unixtime_us = timestamp_us;
+        cgd.left_pupildiameter_mm = data->left.pupil_diameter_mm;
+        cgd.right_pupildiameter_mm = data->right.pupil_diameter_mm;
+        cgd.left_eyeposition_normed_x = 
             data->left.eye_position_in_track_box_normalized_xyz[0];
-		cgd->left_eyeposition_normed_y = 
+		cgd.left_eyeposition_normed_y = 
             data->left.eye_position_in_track_box_normalized_xyz[1];
-		cgd->left_eyeposition_normed_z = 
+		cgd.left_eyeposition_normed_z = 
             data->left.eye_position_in_track_box_normalized_xyz[2];
-		cgd->right_eyeposition_normed_x = 
+		cgd.right_eyeposition_normed_x = 
             data->right.eye_position_in_track_box_normalized_xyz[0];
-		cgd->right_eyeposition_normed_y = 
+		cgd.right_eyeposition_normed_y = 
             data->right.eye_position_in_track_box_normalized_xyz[1];
-		cgd->right_eyeposition_normed_z = 
+		cgd.right_eyeposition_normed_z = 
             data->right.eye_position_in_track_box_normalized_xyz[2];
-        cgd->left_eyecenter_mm_x = 
+        cgd.left_eyecenter_mm_x = 
             data->left.eyeball_center_from_eye_tracker_mm_xyz[0];
-		cgd->left_eyecenter_mm_y = 
+		cgd.left_eyecenter_mm_y = 
             data->left.eyeball_center_from_eye_tracker_mm_xyz[1];
-		cgd->left_eyecenter_mm_z = 
+		cgd.left_eyecenter_mm_z = 
             data->left.eyeball_center_from_eye_tracker_mm_xyz[2];
-		cgd->right_eyecenter_mm_x = 
+		cgd.right_eyecenter_mm_x = 
             data->right.eyeball_center_from_eye_tracker_mm_xyz[0];
-		cgd->right_eyecenter_mm_y = 
+		cgd.right_eyecenter_mm_y = 
             data->right.eyeball_center_from_eye_tracker_mm_xyz[1];
-		cgd->right_eyecenter_mm_z = 
+		cgd.right_eyecenter_mm_z = 
             data->right.eyeball_center_from_eye_tracker_mm_xyz[2];
-        cgd->left_gazeorigin_mm_x = 
+        cgd.left_gazeorigin_mm_x = 
             data->left.gaze_origin_from_eye_tracker_mm_xyz[0];
-		cgd->left_gazeorigin_mm_y = 
+		cgd.left_gazeorigin_mm_y = 
             data->left.gaze_origin_from_eye_tracker_mm_xyz[1];
-		cgd->left_gazeorigin_mm_z = 
+		cgd.left_gazeorigin_mm_z = 
             data->left.gaze_origin_from_eye_tracker_mm_xyz[2];
-		cgd->right_gazeorigin_mm_x = 
+		cgd.right_gazeorigin_mm_x = 
             data->right.gaze_origin_from_eye_tracker_mm_xyz[0];
-		cgd->right_gazeorigin_mm_y = 
+		cgd.right_gazeorigin_mm_y = 
             data->right.gaze_origin_from_eye_tracker_mm_xyz[1];
-		cgd->right_gazeorigin_mm_z = 
+		cgd.right_gazeorigin_mm_z = 
             data->right.gaze_origin_from_eye_tracker_mm_xyz[2];
-        cgd->left_gazepoint_mm_x = 
+        cgd.left_gazepoint_mm_x = 
             data->left.gaze_point_from_eye_tracker_mm_xyz[0];
-		cgd->left_gazepoint_mm_y = 
+		cgd.left_gazepoint_mm_y = 
             data->left.gaze_point_from_eye_tracker_mm_xyz[1];
-		cgd->left_gazepoint_mm_z = 
+		cgd.left_gazepoint_mm_z = 
             data->left.gaze_point_from_eye_tracker_mm_xyz[2];
-		cgd->right_gazepoint_mm_x = 
+		cgd.right_gazepoint_mm_x = 
             data->right.gaze_point_from_eye_tracker_mm_xyz[0];
-		cgd->right_gazepoint_mm_y = 
+		cgd.right_gazepoint_mm_y = 
             data->right.gaze_point_from_eye_tracker_mm_xyz[1];
-		cgd->right_gazepoint_mm_z = 
+		cgd.right_gazepoint_mm_z = 
             data->right.gaze_point_from_eye_tracker_mm_xyz[2];
-        cgd->left_gazepoint_normed_x = 
+        cgd.left_gazepoint_normed_x = 
             data->left.gaze_point_on_display_normalized_xy[0];
-		cgd->left_gazepoint_normed_y = 
+		cgd.left_gazepoint_normed_y = 
             data->left.gaze_point_on_display_normalized_xy[1];
-		cgd->right_gazepoint_normed_x = 
+		cgd.right_gazepoint_normed_x = 
             data->right.gaze_point_on_display_normalized_xy[0];
-		cgd->right_gazepoint_normed_y = 
+		cgd.right_gazepoint_normed_y = 
             data->right.gaze_point_on_display_normalized_xy[1];
-        cgd->combined_gazepoint_x = x_gazepoint;
-        cgd->combined_gazepoint_y = y_gazepoint;
+        cgd.combined_gazepoint_x = x_gazepoint;
+        cgd.combined_gazepoint_y = y_gazepoint;
 
-        gaze->enque_gaze_data(cgd);
-
-        // Annotate (x, y) on the screen every m_mark_freq callbacks
-        gaze->m_mark_count++;
-        if (gaze->m_mark_count % gaze->m_mark_freq != 0)
-            return;
-
-        gaze->set_gaze_marker(cgd);
-        gaze->m_mark_count = 0;
+        gaze->on_gaze_data(&cgd);
     }
     else {
         // Gaze point invalid. Is user present?
@@ -644,6 +960,8 @@ static void cb_gaze_data(tobii_gaze_data_t const *data, void *obj) {
     }
 }
 
+#endif
+
 
 // Helper for creating an XColor for the gaze display
 // Adapted from gist.github.com/ericek111/774a1661be69387de846f5f5a5977a46
@@ -0,0 +1,126 @@
+/////////////////////////////////////////////////////////////////////////////
+// The binary gaze log format -- An append-only file of fixed-size gaze_data_t
+// records, preceded by a header describing the schema version and field
+// layout. See lib/py/gaze_log.py for the corresponding reader.
+//
+// Author: Dustin Fast <dustin.fast@hotmail.com>
+//
+/////////////////////////////////////////////////////////////////////////////
+
+#ifndef EYETRACKER_GAZELOG_H
+#define EYETRACKER_GAZELOG_H
+
+#include <stdio.h>
+#include <stdint.h>
+#include <cstring>
+#include <cstddef>
+
+#include "eyetracker_structdef.h"
+
+/////////////////////////////////////////////////////////////////////////////
+// Defs
+
+// Header layout (little-endian) --
+//      magic (8 bytes), version, header_sz, record_sz, n_fields (uint32),
+//      then n_fields descriptors of name (32 bytes, nul-padded),
+//      offset (uint32), and numpy type code (4 bytes, nul-padded).
+#define GAZELOG_EXT ".glog"
+#define GAZELOG_MAGIC "AEYEGAZE"
+#define GAZELOG_MAGIC_SZ 8
+#define GAZELOG_VERSION 1
+#define GAZELOG_FIELD_NAME_SZ 32
+#define GAZELOG_FIELD_TYPE_SZ 4
+
+typedef struct gazelog_field {
+    const char *name;
+    uint32_t offset;
+    const char *type;
+} gazelog_field_t;
+
+#define GAZELOG_FIELD(member, type) {#member, offsetof(gaze_data_t, member), type}
+
+static const gazelog_field_t GAZELOG_FIELDS[] = {
+    GAZELOG_FIELD(unixtime_us, "<i8"),
+
+    GAZELOG_FIELD(left_pupildiameter_mm, "<f4"),
+    GAZELOG_FIELD(right_pupildiameter_mm, "<f4"),
+
+    GAZELOG_FIELD(left_eyeposition_normed_x, "<f4"),
+    GAZELOG_FIELD(left_eyeposition_normed_y, "<f4"),
+    GAZELOG_FIELD(left_eyeposition_normed_z, "<f4"),
+    GAZELOG_FIELD(right_eyeposition_normed_x, "<f4"),
+    GAZELOG_FIELD(right_eyeposition_normed_y, "<f4"),
+    GAZELOG_FIELD(right_eyeposition_normed_z, "<f4"),
+
+    GAZELOG_FIELD(left_eyecenter_mm_x, "<f4"),
+    GAZELOG_FIELD(left_eyecenter_mm_y, "<f4"),
+    GAZELOG_FIELD(left_eyecenter_mm_z, "<f4"),
+    GAZELOG_FIELD(right_eyecenter_mm_x, "<f4"),
+    GAZELOG_FIELD(right_eyecenter_mm_y, "<f4"),
+    GAZELOG_FIELD(right_eyecenter_mm_z, "<f4"),
+
+    GAZELOG_FIELD(left_gazeorigin_mm_x, "<f4"),
+    GAZELOG_FIELD(left_gazeorigin_mm_y, "<f4"),
+    GAZELOG_FIELD(left_gazeorigin_mm_z, "<f4"),
+    GAZELOG_FIELD(right_gazeorigin_mm_x, "<f4"),
+    GAZELOG_FIELD(right_gazeorigin_mm_y, "<f4"),
+    GAZELOG_FIELD(right_gazeorigin_mm_z, "<f4"),
+
+    GAZELOG_FIELD(left_gazepoint_mm_x, "<f4"),
+    GAZELOG_FIELD(left_gazepoint_mm_y, "<f4"),
+    GAZELOG_FIELD(left_gazepoint_mm_z, "<f4"),
+    GAZELOG_FIELD(right_gazepoint_mm_x, "<f4"),
+    GAZELOG_FIELD(right_gazepoint_mm_y, "<f4"),
+    GAZELOG_FIELD(right_gazepoint_mm_z, "<f4"),
+
+    GAZELOG_FIELD(left_gazepoint_normed_x, "<f4"),
+    GAZELOG_FIELD(left_gazepoint_normed_y, "<f4"),
+    GAZELOG_FIELD(right_gazepoint_normed_x, "<f4"),
+    GAZELOG_FIELD(right_gazepoint_normed_y, "<f4"),
+
+    GAZELOG_FIELD(combined_gazepoint_x, "<i4"),
+    GAZELOG_FIELD(combined_gazepoint_y, "<i4")
+};
+
+#define GAZELOG_N_FIELDS (sizeof(GAZELOG_FIELDS) / sizeof(gazelog_field_t))
+
+/////////////////////////////////////////////////////////////////////////////
+// Functions
+
+// Returns true iff the given file path has the binary gaze log extension.
+bool gazelog_is_log_path(const char *file_path) {
+    size_t path_len = strlen(file_path);
+    size_t ext_len = strlen(GAZELOG_EXT);
+
+    return path_len >= ext_len &&
+        strcmp(file_path + path_len - ext_len, GAZELOG_EXT) == 0;
+}
+
+// Writes the gaze log header to the given file, at its current position.
+void gazelog_write_header(FILE *f) {
+    uint32_t header[4] = {
+        GAZELOG_VERSION,
+        (uint32_t)(GAZELOG_MAGIC_SZ + 4 * sizeof(uint32_t) + GAZELOG_N_FIELDS *
+            (GAZELOG_FIELD_NAME_SZ + sizeof(uint32_t) + GAZELOG_FIELD_TYPE_SZ)),
+        (uint32_t)sizeof(gaze_data_t),
+        (uint32_t)GAZELOG_N_FIELDS
+    };
+
+    fwrite(GAZELOG_MAGIC, 1, GAZELOG_MAGIC_SZ, f);
+    fwrite(header, sizeof(uint32_t), 4, f);
+
+    for (size_t i = 0; i < GAZELOG_N_FIELDS; i++) {
+        char name[GAZELOG_FIELD_NAME_SZ] = {0};
+        char type[GAZELOG_FIELD_TYPE_SZ] = {0};
+
+        strncpy(name, GAZELOG_FIELDS[i].name, GAZELOG_FIELD_NAME_SZ - 1);
+        strncpy(type, GAZELOG_FIELDS[i].type, GAZELOG_FIELD_TYPE_SZ);
+
+        fwrite(name, 1, GAZELOG_FIELD_NAME_SZ, f);
+        fwrite(&GAZELOG_FIELDS[i].offset, sizeof(uint32_t), 1, f);
+        fwrite(type, 1, GAZELOG_FIELD_TYPE_SZ, f);
+    }
+}
+
+
+#endif // Top-level include guard
@@ -0,0 +1,310 @@
+/////////////////////////////////////////////////////////////////////////////
+// A long-lived gaze data log writer. Batches of gaze data are queued from
+// the caller's thread and written by a single writer thread that keeps its
+// log file open, behind a large write buffer.
+//
+// Author: Dustin Fast <dustin.fast@hotmail.com>
+//
+/////////////////////////////////////////////////////////////////////////////
+
+#ifndef EYETRACKER_LOGWRITER_H
+#define EYETRACKER_LOGWRITER_H
+
+#include <deque>
+#include <memory>
+#include <string>
+#include <vector>
+#include <stdio.h>
+#include <unistd.h>
+#include <cinttypes>
+
+#include <boost/thread.hpp>
+#include <boost/chrono.hpp>
+
+#include "app.h"
+#include "eyetracker_structdef.h"
+#include "eyetracker_gazelog.h"
+
+using namespace std;
+
+/////////////////////////////////////////////////////////////////////////////
+// Defs
+
+#define GAZE_LOG_WRITER_BUFF_SZ (1 << 20)
+
+// A batch of gaze data to be appended to the log at file_path, as a binary
+// gaze log iff binary, else as csv (with label appended to each row iff given)
+typedef struct gaze_log_batch {
+    string file_path;
+    shared_ptr<vector<gaze_data_t>> gaze_data;
+    bool binary;
+    boost::shared_ptr<char> label;
+} gaze_log_batch_t;
+
+/////////////////////////////////////////////////////////////////////////////
+// Class
+
+// A single writer thread fed by a bounded queue of gaze data batches. All
+// batches queued at the time the writer wakes are written back-to-back
+// through the open file's buffer, then flushed with (typically) a single
+// write. The file is fsync'd at most once every fsync_ms milliseconds, while
+// there is unsynced data. If fsync_ms < 0, fsync is left to the OS.
+class GazeLogWriter {
+    public:
+        bool enqueue(const gaze_log_batch_t&, bool);
+        void flush();
+
+        GazeLogWriter(size_t, int);
+        ~GazeLogWriter();
+
+    private:
+        size_t m_queue_sz;
+        int m_fsync_ms;
+        bool m_stop;
+        bool m_busy;
+        bool m_dirty;
+        deque<gaze_log_batch_t> m_queue;
+        boost::mutex m_mutex;
+        boost::condition_variable m_not_empty;
+        boost::condition_variable m_not_full;
+        boost::condition_variable m_idle;
+        boost::chrono::steady_clock::time_point m_last_sync;
+
+        FILE *m_file;
+        string m_file_path;
+        unique_ptr<char[]> m_file_buff;
+        boost::thread m_thread;
+
+        void run();
+        void write(const gaze_log_batch_t&);
+        void write_csv(const gaze_log_batch_t&);
+        void sync(bool);
+        void close();
+};
+
+// Default constructor. Starts the writer thread.
+GazeLogWriter::GazeLogWriter(size_t queue_sz, int fsync_ms) :
+    m_queue_sz(queue_sz),
+    m_fsync_ms(fsync_ms),
+    m_stop(false),
+    m_busy(false),
+    m_dirty(false),
+    m_last_sync(boost::chrono::steady_clock::now()),
+    m_file(NULL),
+    m_file_buff(new char[GAZE_LOG_WRITER_BUFF_SZ]) {
+        m_thread = boost::thread(&GazeLogWriter::run, this);
+}
+
+// Destructor. Writes any queued batches, then stops the writer thread.
+GazeLogWriter::~GazeLogWriter() {
+    {
+        boost::lock_guard<boost::mutex> lock(m_mutex);
+        m_stop = true;
+    }
+
+    m_not_empty.notify_all();
+    m_thread.join();
+}
+
+// Queues the given batch for writing. If the queue is full, blocks until it
+// is not iff block, else returns false without queueing (i.e. backpressure).
+// Returns true iff the batch was queued.
+bool GazeLogWriter::enqueue(const gaze_log_batch_t &batch, bool block=true) {
+    {
+        boost::unique_lock<boost::mutex> lock(m_mutex);
+
+        if (m_queue.size() >= m_queue_sz) {
+            if (!block)
+                return false;
+
+            while (m_queue.size() >= m_queue_sz)
+                m_not_full.wait(lock);
+        }
+
+        m_queue.push_back(batch);
+    }
+
+    m_not_empty.notify_one();
+
+    return true;
+}
+
+// Blocks until all queued batches have been written and flushed to the OS.
+void GazeLogWriter::flush() {
+    boost::unique_lock<boost::mutex> lock(m_mutex);
+
+    while (!m_queue.empty() || m_busy)
+        m_idle.wait(lock);
+}
+
+// The writer thread. Writes batches as they're queued until stopped.
+void GazeLogWriter::run() {
+    while (true) {
+        deque<gaze_log_batch_t> batches;
+
+        {
+            boost::unique_lock<boost::mutex> lock(m_mutex);
+
+            while (m_queue.empty() && !m_stop) {
+                // While data is unsynced, wake when its fsync is due
+                if (m_dirty && m_fsync_ms >= 0) {
+                    lock.unlock();
+                    sync(false);
+                    lock.lock();
+
+                    if (m_queue.empty() && !m_stop && m_dirty)
+                        m_not_empty.wait_for(
+                            lock, boost::chrono::milliseconds(m_fsync_ms));
+                } else {
+                    m_not_empty.wait(lock);
+                }
+            }
+
+            if (m_queue.empty() && m_stop)
+                break;
+
+            batches.swap(m_queue);
+            m_busy = true;
+        }
+
+        m_not_full.notify_all();
+
+        // Write all batches taken, then hand them to the OS together
+        for (auto &batch : batches)
+            write(batch);
+
+        if (m_file) {
+            fflush(m_file);
+            m_dirty = true;
+            sync(false);
+        }
+
+        {
+            boost::lock_guard<boost::mutex> lock(m_mutex);
+            m_busy = false;
+        }
+
+        m_idle.notify_all();
+    }
+
+    close();
+}
+
+// Appends the given batch to its log file, (re)opening the file iff needed.
+void GazeLogWriter::write(const gaze_log_batch_t &batch) {
+    if (!m_file || m_file_path != batch.file_path) {
+        close();
+
+        m_file = fopen(batch.file_path.c_str(), "ab");
+        if (!m_file) {
+            error("Failed to open gaze log for writing ");
+            printf("'%s'. Dropped %zu samples.\n",
+                   batch.file_path.c_str(), batch.gaze_data->size());
+            return;
+        }
+
+        m_file_path = batch.file_path;
+        setvbuf(m_file, m_file_buff.get(), _IOFBF, GAZE_LOG_WRITER_BUFF_SZ);
+
+        // Write the binary log header iff the file is new (or empty)
+        fseek(m_file, 0, SEEK_END);
+        if (batch.binary && ftell(m_file) == 0)
+            gazelog_write_header(m_file);
+    }
+
+    if (!batch.binary) {
+        write_csv(batch);
+        return;
+    }
+
+    fwrite(batch.gaze_data->data(),
+           sizeof(gaze_data_t),
+           batch.gaze_data->size(),
+           m_file);
+}
+
+// Appends the given batch to the open log file as csv rows, in ascending order.
+void GazeLogWriter::write_csv(const gaze_log_batch_t &batch) {
+    for (auto &cgd : *batch.gaze_data) {
+        fprintf(m_file,
+            "%" PRId64 ", "
+            "%g, %g, "
+            "%g, %g, %g, %g, %g, %g, "
+            "%g, %g, %g, %g, %g, %g, "
+            "%g, %g, %g, %g, %g, %g, "
+            "%g, %g, %g, %g, %g, %g, "
+            "%g, %g, %g, %g, "
+            "%d, %d",
+            cgd.unixtime_us,
+            cgd.left_pupildiameter_mm,
+            cgd.right_pupildiameter_mm,
+            cgd.left_eyeposition_normed_x,
+            cgd.left_eyeposition_normed_y,
+            cgd.left_eyeposition_normed_z,
+            cgd.right_eyeposition_normed_x,
+            cgd.right_eyeposition_normed_y,
+            cgd.right_eyeposition_normed_z,
+            cgd.left_eyecenter_mm_x,
+            cgd.left_eyecenter_mm_y,
+            cgd.left_eyecenter_mm_z,
+            cgd.right_eyecenter_mm_x,
+            cgd.right_eyecenter_mm_y,
+            cgd.right_eyecenter_mm_z,
+            cgd.left_gazeorigin_mm_x,
+            cgd.left_gazeorigin_mm_y,
+            cgd.left_gazeorigin_mm_z,
+            cgd.right_gazeorigin_mm_x,
+            cgd.right_gazeorigin_mm_y,
+            cgd.right_gazeorigin_mm_z,
+            cgd.left_gazepoint_mm_x,
+            cgd.left_gazepoint_mm_y,
+            cgd.left_gazepoint_mm_z,
+            cgd.right_gazepoint_mm_x,
+            cgd.right_gazepoint_mm_y,
+            cgd.right_gazepoint_mm_z,
+            cgd.left_gazepoint_normed_x,
+            cgd.left_gazepoint_normed_y,
+            cgd.right_gazepoint_normed_x,
+            cgd.right_gazepoint_normed_y,
+            cgd.combined_gazepoint_x,
+            cgd.combined_gazepoint_y);
+
+        if (batch.label != NULL)
+            fprintf(m_file, ", %s", batch.label.get());
+
+        fputc('\n', m_file);
+    }
+}
+
+// Fsyncs the open log file iff it has unsynced data and either its fsync is
+// due or force is given. Never fsyncs if fsync is left to the OS.
+void GazeLogWriter::sync(bool force) {
+    if (!m_file || !m_dirty || m_fsync_ms < 0)
+        return;
+
+    boost::chrono::steady_clock::time_point now =
+        boost::chrono::steady_clock::now();
+
+    if (!force && now - m_last_sync < boost::chrono::milliseconds(m_fsync_ms))
+        return;
+
+    fsync(fileno(m_file));
+    m_last_sync = now;
+    m_dirty = false;
+}
+
+// Flushes, fsyncs, and closes the open log file, if any.
+void GazeLogWriter::close() {
+    if (!m_file)
+        return;
+
+    fflush(m_file);
+    sync(true);
+    fclose(m_file);
+
+    m_file = NULL;
+    m_file_path.clear();
+}
+
+
+#endif // Top-level include guard
@@ -0,0 +1,228 @@
+/////////////////////////////////////////////////////////////////////////////
+// An online residual correction for gaze coords. Learns, by recursive least
+// squares, the offset between the gaze coords given (by the device or the
+// accuracy-assist models) and the on-screen targets the user confirms by
+// clicking, and applies it to each subsequent sample.
+//
+// Author: Dustin Fast <dustin.fast@hotmail.com>
+//
+/////////////////////////////////////////////////////////////////////////////
+
+#ifndef EYETRACKER_REFINE_H
+#define EYETRACKER_REFINE_H
+
+#include <cmath>
+#include <memory>
+#include <cstring>
+#include <algorithm>
+
+#include <boost/thread.hpp>
+
+#include "eyetracker_structdef.h"
+
+using namespace std;
+
+/////////////////////////////////////////////////////////////////////////////
+// Defs
+
+// Correction features, as (bias, gaze x, gaze y, eye pos x, eye pos y,
+// eye pos z), with all but the bias centered about zero.
+#define REFINE_N_FEATURES 6
+
+// A snapshot of the correction model's params. Snapshots are immutable once
+// published, so a reader's snapshot is always internally consistent.
+typedef struct refine_params {
+    double w_x[REFINE_N_FEATURES];              // x residual weights
+    double w_y[REFINE_N_FEATURES];              // y residual weights
+    double p[REFINE_N_FEATURES * REFINE_N_FEATURES];  // Inverse covariance
+    int n_updates;
+} refine_params_t;
+
+/////////////////////////////////////////////////////////////////////////////
+// Class
+
+// A residual-correction model, linear in the features above, fit to the
+// normalized residuals (target - coords) / disp size by exponentially-
+// weighted recursive least squares. Each update (i.e. click) costs
+// O(n_samples + REFINE_N_FEATURES^2) and each correction O(REFINE_N_FEATURES).
+// Updates are made to a copy of the current params, which is then swapped in
+// atomically, so correct() never waits on an update in progress.
+class GazeCoordRefiner {
+    public:
+        void correct(const gaze_data_t*, int*, int*);
+        int update(const gaze_data_t*, const int*, const int*, int, int, int);
+        void reset();
+        int n_updates();
+
+        GazeCoordRefiner(int, int, double, double, int);
+
+    protected:
+        int m_disp_width;
+        int m_disp_height;
+        double m_forget;
+        double m_prior;
+        int m_max_px;
+
+    private:
+        shared_ptr<const refine_params_t> m_params;
+        boost::mutex m_update_mutex;
+
+        void features(const gaze_data_t*, int, int, double*);
+        shared_ptr<const refine_params_t> params();
+};
+
+// Default constructor. Forget is the RLS forgetting factor, applied per
+// update, prior is the initial variance of each weight, and max_px bounds
+// both the residuals learned from and the corrections applied, per axis.
+GazeCoordRefiner::GazeCoordRefiner(
+    int disp_width, int disp_height, double forget, double prior, int max_px) :
+    m_disp_width(disp_width),
+    m_disp_height(disp_height),
+    m_forget(forget),
+    m_prior(prior),
+    m_max_px(max_px) {
+        reset();
+}
+
+// Discards all learned corrections.
+void GazeCoordRefiner::reset() {
+    shared_ptr<refine_params_t> params = make_shared<refine_params_t>();
+    memset(params.get(), 0, sizeof(refine_params_t));
+
+    for (int i = 0; i < REFINE_N_FEATURES; i++)
+        params->p[i * REFINE_N_FEATURES + i] = m_prior;
+
+    boost::lock_guard<boost::mutex> lock(m_update_mutex);
+    atomic_store(&m_params, shared_ptr<const refine_params_t>(params));
+}
+
+// Returns the number of updates learned from since construction (or reset).
+int GazeCoordRefiner::n_updates() {
+    return params()->n_updates;
+}
+
+// Returns the current params snapshot.
+shared_ptr<const refine_params_t> GazeCoordRefiner::params() {
+    return atomic_load(&m_params);
+}
+
+// Sets phi to the correction features of the given sample and its coords.
+void GazeCoordRefiner::features(
+    const gaze_data_t *cgd, int x_coord, int y_coord, double *phi) {
+    phi[0] = 1.0;
+    phi[1] = (double)x_coord / m_disp_width - 0.5;
+    phi[2] = (double)y_coord / m_disp_height - 0.5;
+    phi[3] = (cgd->left_eyeposition_normed_x +
+              cgd->right_eyeposition_normed_x) / 2 - 0.5;
+    phi[4] = (cgd->left_eyeposition_normed_y +
+              cgd->right_eyeposition_normed_y) / 2 - 0.5;
+    phi[5] = (cgd->left_eyeposition_normed_z +
+              cgd->right_eyeposition_normed_z) / 2 - 0.5;
+}
+
+// Applies the current correction to the given sample's coords, in place.
+void GazeCoordRefiner::correct(
+    const gaze_data_t *cgd, int *x_coord, int *y_coord) {
+    shared_ptr<const refine_params_t> params = this->params();
+
+    if (params->n_updates <= 0)
+        return;
+
+    double phi[REFINE_N_FEATURES];
+    double dx = 0, dy = 0;
+
+    features(cgd, *x_coord, *y_coord, phi);
+
+    for (int i = 0; i < REFINE_N_FEATURES; i++) {
+        dx += params->w_x[i] * phi[i];
+        dy += params->w_y[i] * phi[i];
+    }
+
+    dx = max(-1.0 * m_max_px, min(1.0 * m_max_px, dx * m_disp_width));
+    dy = max(-1.0 * m_max_px, min(1.0 * m_max_px, dy * m_disp_height));
+
+    *x_coord += lround(dx);
+    *y_coord += lround(dy);
+}
+
+// Learns from the given n samples, having the given (uncorrected) coords,
+// that the user was looking at the given on-screen target. The samples'
+// features and residuals are averaged into a single RLS update, as samples
+// in a fixation are highly correlated. Returns the number of samples learned
+// from, or 0 if none were given or their mean residual exceeds m_max_px on
+// either axis (e.g. the user clicked without looking at the target).
+int GazeCoordRefiner::update(const gaze_data_t *samples,
+                             const int *x_coords,
+                             const int *y_coords,
+                             int n,
+                             int target_x,
+                             int target_y) {
+    if (n <= 0)
+        return 0;
+
+    double phi[REFINE_N_FEATURES] = {0};
+    double sample_phi[REFINE_N_FEATURES];
+    double r_x = 0, r_y = 0;
+
+    for (int j = 0; j < n; j++) {
+        features(samples + j, x_coords[j], y_coords[j], sample_phi);
+
+        for (int i = 0; i < REFINE_N_FEATURES; i++)
+            phi[i] += sample_phi[i] / n;
+
+        r_x += (double)(target_x - x_coords[j]) / n;
+        r_y += (double)(target_y - y_coords[j]) / n;
+    }
+
+    if (fabs(r_x) > m_max_px || fabs(r_y) > m_max_px)
+        return 0;
+
+    r_x /= m_disp_width;
+    r_y /= m_disp_height;
+
+    // Updates are serialized, each on a copy of the latest params
+    boost::lock_guard<boost::mutex> lock(m_update_mutex);
+    shared_ptr<refine_params_t> params =
+        make_shared<refine_params_t>(*this->params());
+    double *p = params->p;
+
+    // Gain, k = P.phi / (forget + phi'.P.phi)
+    double p_phi[REFINE_N_FEATURES] = {0};
+    double denom = m_forget;
+
+    for (int i = 0; i < REFINE_N_FEATURES; i++) {
+        for (int j = 0; j < REFINE_N_FEATURES; j++)
+            p_phi[i] += p[i * REFINE_N_FEATURES + j] * phi[j];
+        denom += phi[i] * p_phi[i];
+    }
+
+    // A priori errors of the current weights
+    double e_x = r_x, e_y = r_y;
+
+    for (int i = 0; i < REFINE_N_FEATURES; i++) {
+        e_x -= params->w_x[i] * phi[i];
+        e_y -= params->w_y[i] * phi[i];
+    }
+
+    for (int i = 0; i < REFINE_N_FEATURES; i++) {
+        double k = p_phi[i] / denom;
+        params->w_x[i] += k * e_x;
+        params->w_y[i] += k * e_y;
+    }
+
+    // P = (P - k.phi'.P) / forget, where phi'.P == p_phi' as P is symmetric
+    for (int i = 0; i < REFINE_N_FEATURES; i++) {
+        for (int j = 0; j < REFINE_N_FEATURES; j++) {
+            p[i * REFINE_N_FEATURES + j] = (p[i * REFINE_N_FEATURES + j] -
+                p_phi[i] * p_phi[j] / denom) / m_forget;
+        }
+    }
+
+    params->n_updates++;
+    atomic_store(&m_params, shared_ptr<const refine_params_t>(params));
+
+    return n;
+}
+
+
+#endif // Top-level include guard
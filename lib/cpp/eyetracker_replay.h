@@ -0,0 +1,109 @@
+/////////////////////////////////////////////////////////////////////////////
+// A stand-in for the eyetracker abstraction of eyetracker.h, for use without
+// an eyetracker device, license, or runtime service. Gaze samples are
+// replayed from a gaze log, or generated, by a GazeReplaySource in place of
+// the device. Selected at build time by defining EYETRACKER_REPLAY.
+//
+// Author: Dustin Fast <dustin.fast@hotmail.com>
+//
+/////////////////////////////////////////////////////////////////////////////
+
+#include <stdio.h>
+#include <memory>
+#include <string>
+#include <chrono>
+
+#include "app.h"
+#include "eyetracker_replay_source.h"
+
+using namespace std;
+using namespace std::chrono;
+
+/////////////////////////////////////////////////////////////////////////////
+// Defs
+
+// The replay source stands in for the device throughout
+typedef GazeReplaySource eyetracker_device_t;
+
+string REPLAY_LOG_PATH = APP_CFG["EYETRACKER_REPLAY_LOG"].Scalar();
+
+/////////////////////////////////////////////////////////////////////////////
+// Class
+
+class EyeTracker {
+    public:
+        EyeTracker();
+        ~EyeTracker();
+        void sync_device_time();
+        void print_device_info();
+        void print_feature_group();
+        void calibration_write();
+        int64_t devicetime_to_systime(int64_t);
+
+    protected:
+        int64_t m_device_time_offset;
+        double m_calib_load_s;
+        eyetracker_device_t *m_device;
+        bool m_is_elevated;
+        void set_display(float, float, float);
+        void calibration_load();
+};
+
+// Default constructor
+EyeTracker::EyeTracker() {
+    m_device = new GazeReplaySource(
+        REPLAY_LOG_PATH.c_str(),
+        APP_CFG["EYETRACKER_REPLAY_RATE"].as<double>(),
+        APP_CFG["EYETRACKER_SAMPLE_HZ"].as<int>(),
+        APP_CFG["DISP_WIDTH_PX"].as<int>(),
+        APP_CFG["DISP_HEIGHT_PX"].as<int>());
+
+    info("Using replay eyetracker (");
+    printf("%zu samples, from %s).\n",
+           m_device->size(),
+           REPLAY_LOG_PATH.empty() ? "synthetic" : REPLAY_LOG_PATH.c_str());
+
+    // Set default states
+    m_is_elevated = False;
+    m_device_time_offset = 0;
+    m_calib_load_s = 0;
+}
+
+// Destructor
+EyeTracker::~EyeTracker() {
+    delete m_device;
+}
+
+// Replayed samples are stamped in system time, so there's nothing to sync.
+void EyeTracker::sync_device_time() {}
+
+// Given a (replayed) device timestamp, returns it in system time.
+int64_t EyeTracker::devicetime_to_systime(int64_t device_time) {
+    return device_time + m_device_time_offset;
+}
+
+// Prints eyetracker device info
+void EyeTracker::print_device_info() {
+    printf("Device Model: Replay\n");
+    printf("Device Replay Source: %s\n",
+           REPLAY_LOG_PATH.empty() ? "synthetic" : REPLAY_LOG_PATH.c_str());
+    printf("Device Replay Rate: %s\n",
+           APP_CFG["EYETRACKER_REPLAY_RATE"].Scalar().c_str());
+    print_feature_group();
+}
+
+// Prints the device's active feature group to stdout.
+void EyeTracker::print_feature_group() {
+    printf("Device Feature Group: Replay\n");
+}
+
+// The replay device has no display area to set.
+void EyeTracker::set_display(float width_mm, float height_mm, float offset_x_mm) {}
+
+// The replay device has no calibration to write.
+void EyeTracker::calibration_write() {
+    warn("Calibration write skipped (replay eyetracker).\n");
+}
+
+// The replay device has no calibration to load.
+void EyeTracker::calibration_load() {}
@@ -0,0 +1,234 @@
+/////////////////////////////////////////////////////////////////////////////
+// A source of gaze samples for use without an eyetracker device -- replayed
+// from a binary gaze log, or generated -- paced at a multiple of real time.
+//
+// Author: Dustin Fast <dustin.fast@hotmail.com>
+//
+/////////////////////////////////////////////////////////////////////////////
+
+#ifndef EYETRACKER_REPLAY_SOURCE_H
+#define EYETRACKER_REPLAY_SOURCE_H
+
+#include <stdio.h>
+#include <random>
+#include <vector>
+#include <cstring>
+#include <algorithm>
+
+#include <boost/thread.hpp>
+#include <boost/chrono.hpp>
+
+#include "app.h"
+#include "eyetracker_structdef.h"
+#include "eyetracker_gazelog.h"
+
+using namespace std;
+
+/////////////////////////////////////////////////////////////////////////////
+// Defs
+
+#define REPLAY_SYNTHETIC_SAMPLES 5400       // One minute, at 90hz
+#define REPLAY_FIXATION_SAMPLES 30          // Synthetic samples per fixation
+#define REPLAY_MAX_GAP_US 100000            // Max pause between log samples
+#define REPLAY_INTERRUPT_INTERVAL 1024      // Samples per interrupt check
+#define REPLAY_SEED 1234
+
+/////////////////////////////////////////////////////////////////////////////
+// Functions
+
+// Returns the current system time, in microseconds since the epoch.
+int64_t replay_systime_us() {
+    return boost::chrono::duration_cast<boost::chrono::microseconds>(
+        boost::chrono::system_clock::now().time_since_epoch()).count();
+}
+
+// Returns (at most) n gaze samples from the binary gaze log at the given path,
+// or an empty vector if it could not be read. If n == 0, all are returned.
+vector<gaze_data_t> gaze_samples_from_log(const char *log_path, size_t n=0) {
+    vector<gaze_data_t> samples;
+    char magic[GAZELOG_MAGIC_SZ];
+    uint32_t header[4];
+
+    FILE *f = fopen(log_path, "rb");
+    if (!f)
+        return samples;
+
+    // Validate the header as (magic, version, header_sz, record_sz, n_fields)
+    if (fread(magic, 1, GAZELOG_MAGIC_SZ, f) == GAZELOG_MAGIC_SZ &&
+        fread(header, sizeof(uint32_t), 4, f) == 4 &&
+        strncmp(magic, GAZELOG_MAGIC, GAZELOG_MAGIC_SZ) == 0 &&
+        header[0] == GAZELOG_VERSION &&
+        header[2] == sizeof(gaze_data_t)) {
+            fseek(f, 0, SEEK_END);
+            size_t n_records = (ftell(f) - header[1]) / sizeof(gaze_data_t);
+
+            samples.resize(n > 0 ? min(n, n_records) : n_records);
+            fseek(f, header[1], SEEK_SET);
+            samples.resize(fread(samples.data(),
+                                 sizeof(gaze_data_t),
+                                 samples.size(),
+                                 f));
+    }
+
+    fclose(f);
+
+    return samples;
+}
+
+// Returns n synthetic gaze samples, spaced interval_us apart, as a sequence
+// of noisy fixations at random on-screen points on a display of the given
+// size, in pixels.
+vector<gaze_data_t> gaze_samples_synthetic(
+    size_t n, int disp_width, int disp_height, int64_t interval_us) {
+    vector<gaze_data_t> samples(n);
+    mt19937 rng(REPLAY_SEED);
+    normal_distribution<float> noise(0, 1);
+    uniform_real_distribution<float> unit(0, 1);
+    int64_t t_us = replay_systime_us();
+
+    float gaze_x = 0.5, gaze_y = 0.5;
+
+    for (size_t i = 0; i < n; i++) {
+        gaze_data_t &cgd = samples[i];
+
+        if (i % REPLAY_FIXATION_SAMPLES == 0) {
+            gaze_x = unit(rng);
+            gaze_y = unit(rng);
+        }
+
+        cgd.unixtime_us = t_us + (int64_t)i * interval_us;
+        cgd.left_pupildiameter_mm = 3.0 + 0.1 * noise(rng);
+        cgd.right_pupildiameter_mm = 3.0 + 0.1 * noise(rng);
+        cgd.left_eyeposition_normed_x = 0.45 + 0.01 * noise(rng);
+        cgd.left_eyeposition_normed_y = 0.5 + 0.01 * noise(rng);
+        cgd.left_eyeposition_normed_z = 0.5 + 0.01 * noise(rng);
+        cgd.right_eyeposition_normed_x = 0.55 + 0.01 * noise(rng);
+        cgd.right_eyeposition_normed_y = 0.5 + 0.01 * noise(rng);
+        cgd.right_eyeposition_normed_z = 0.5 + 0.01 * noise(rng);
+        cgd.left_eyecenter_mm_x = -30 + noise(rng);
+        cgd.left_eyecenter_mm_y = 0 + noise(rng);
+        cgd.left_eyecenter_mm_z = 600 + noise(rng);
+        cgd.right_eyecenter_mm_x = 30 + noise(rng);
+        cgd.right_eyecenter_mm_y = 0 + noise(rng);
+        cgd.right_eyecenter_mm_z = 600 + noise(rng);
+        cgd.left_gazeorigin_mm_x = cgd.left_eyecenter_mm_x;
+        cgd.left_gazeorigin_mm_y = cgd.left_eyecenter_mm_y;
+        cgd.left_gazeorigin_mm_z = cgd.left_eyecenter_mm_z - 5;
+        cgd.right_gazeorigin_mm_x = cgd.right_eyecenter_mm_x;
+        cgd.right_gazeorigin_mm_y = cgd.right_eyecenter_mm_y;
+        cgd.right_gazeorigin_mm_z = cgd.right_eyecenter_mm_z - 5;
+        cgd.left_gazepoint_normed_x = gaze_x + 0.005 * noise(rng);
+        cgd.left_gazepoint_normed_y = gaze_y + 0.005 * noise(rng);
+        cgd.right_gazepoint_normed_x = gaze_x + 0.005 * noise(rng);
+        cgd.right_gazepoint_normed_y = gaze_y + 0.005 * noise(rng);
+        cgd.left_gazepoint_mm_x = (cgd.left_gazepoint_normed_x - 0.5) * 600;
+        cgd.left_gazepoint_mm_y = (0.5 - cgd.left_gazepoint_normed_y) * 335;
+        cgd.left_gazepoint_mm_z = 0;
+        cgd.right_gazepoint_mm_x = (cgd.right_gazepoint_normed_x - 0.5) * 600;
+        cgd.right_gazepoint_mm_y = (0.5 - cgd.right_gazepoint_normed_y) * 335;
+        cgd.right_gazepoint_mm_z = 0;
+        cgd.combined_gazepoint_x = disp_width * (
+            cgd.left_gazepoint_normed_x + cgd.right_gazepoint_normed_x) / 2;
+        cgd.combined_gazepoint_y = disp_height * (
+            cgd.left_gazepoint_normed_y + cgd.right_gazepoint_normed_y) / 2;
+    }
+
+    return samples;
+}
+
+/////////////////////////////////////////////////////////////////////////////
+// Class
+
+// Emits the samples of a gaze log, or synthetic samples, in a loop. Samples
+// are paced by their recorded intervals (with gaps in the log capped at
+// REPLAY_MAX_GAP_US) divided by rate, or emitted as fast as possible iff
+// rate <= 0. Each emitted sample is stamped with the system time at which
+// it was emitted, as a device's samples are.
+class GazeReplaySource {
+    public:
+        bool next(gaze_data_t*);
+        size_t size();
+
+        GazeReplaySource(const char*, double, int, int, int);
+
+    protected:
+        vector<gaze_data_t> m_samples;
+        double m_rate;
+        int64_t m_interval_us;
+
+    private:
+        size_t m_pos;
+        int64_t m_elapsed_us;
+        int64_t m_last_emit_us;
+        boost::chrono::steady_clock::time_point m_t_start;
+};
+
+// Default constructor. Replays the gaze log at the given path, or iff NULL or
+// empty, synthetic samples at the given sample rate, for a display of the
+// given size.
+GazeReplaySource::GazeReplaySource(const char *log_path,
+                                   double rate,
+                                   int sample_hz,
+                                   int disp_width,
+                                   int disp_height) :
+    m_rate(rate),
+    m_interval_us(1000000 / sample_hz),
+    m_pos(0),
+    m_elapsed_us(0),
+    m_last_emit_us(0) {
+        if (log_path != NULL && *log_path != '\0') {
+            m_samples = gaze_samples_from_log(log_path);
+
+            if (m_samples.empty())
+                error("Gaze replay log is missing, invalid, or empty.\n");
+        } else {
+            m_samples = gaze_samples_synthetic(
+                REPLAY_SYNTHETIC_SAMPLES, disp_width, disp_height, m_interval_us);
+        }
+}
+
+// Returns the number of distinct samples replayed per loop.
+size_t GazeReplaySource::size() {
+    return m_samples.size();
+}
+
+// Blocks until the next sample is due, then copies it to out. Returns false
+// iff there are no samples to replay. This is an interruption point.
+bool GazeReplaySource::next(gaze_data_t *out) {
+    if (m_samples.empty())
+        return false;
+
+    size_t i = m_pos % m_samples.size();
+
+    if (m_pos == 0) {
+        m_t_start = boost::chrono::steady_clock::now();
+    } else {
+        // The sample's offset from the previous, as recorded
+        const gaze_data_t &prev = m_samples[(m_pos - 1) % m_samples.size()];
+        int64_t dt_us = m_samples[i].unixtime_us - prev.unixtime_us;
+
+        if (dt_us <= 0 || dt_us > REPLAY_MAX_GAP_US)
+            dt_us = m_interval_us;
+
+        m_elapsed_us += dt_us;
+    }
+
+    // Wait until the sample is due, or just check for interrupts iff unpaced
+    if (m_rate > 0) {
+        boost::this_thread::sleep_until(
+            m_t_start + boost::chrono::microseconds(
+                (int64_t)(m_elapsed_us / m_rate)));
+    } else if (m_pos % REPLAY_INTERRUPT_INTERVAL == 0) {
+        boost::this_thread::interruption_point();
+    }
+
+    *out = m_samples[i];
+    out->unixtime_us = max(replay_systime_us(), m_last_emit_us + 1);
+    m_last_emit_us = out->unixtime_us;
+    m_pos++;
+
+    return true;
+}
+
+
+#endif // Top-level include guard
@@ -0,0 +1,181 @@
+/////////////////////////////////////////////////////////////////////////////
+// A lock-free, allocation-free ring buffer for the eyetracker's hot path.
+//
+// Author: Dustin Fast <dustin.fast@hotmail.com>
+//
+/////////////////////////////////////////////////////////////////////////////
+
+#ifndef EYETRACKER_RINGBUFF_H
+#define EYETRACKER_RINGBUFF_H
+
+#include <atomic>
+#include <memory>
+#include <cstring>
+#include <stdint.h>
+#include <type_traits>
+
+using namespace std;
+
+/////////////////////////////////////////////////////////////////////////////
+// Class
+
+// A fixed-capacity, single-producer/multi-reader ring of plain records. All
+// slots are preallocated on construction. Each record pushed is assigned a
+// position (0, 1, 2, ...) and each slot is guarded by its own sequence
+// number, a per-slot seqlock, so that readers take consistent copies of
+// records without ever blocking the producer. A reader racing the producer
+// for the oldest slot(s) simply finds them overwritten and skips them.
+// Note: push() must only ever be called from a single thread.
+template <typename T>
+class SeqRingBuff {
+    static_assert(is_trivially_copyable<T>::value,
+                  "SeqRingBuff records must be trivially copyable");
+
+    public:
+        void push(const T&);
+        bool read(uint64_t, T*);
+        bool latest(T*);
+        int snapshot(T*, int, uint64_t=0, uint64_t* =NULL);
+        int range(T*, uint64_t, uint64_t);
+        uint64_t head();
+        uint64_t tail();
+        size_t capacity();
+
+        SeqRingBuff(size_t);
+
+    private:
+        struct slot_t {
+            atomic<uint64_t> seq;
+            T data;
+        };
+
+        size_t m_capacity;
+        unique_ptr<slot_t[]> m_slots;
+        atomic<uint64_t> m_head;
+};
+
+// Default constructor
+template <typename T>
+SeqRingBuff<T>::SeqRingBuff(size_t capacity) :
+    m_capacity(capacity), m_slots(new slot_t[capacity]) {
+        for (size_t i = 0; i < m_capacity; i++)
+            m_slots[i].seq.store(0, memory_order_relaxed);
+
+        m_head.store(0, memory_order_release);
+}
+
+// Pushes a copy of the given record, overwriting the oldest iff full.
+// A slot's seq is odd while its record at pos is being written and is
+// 2 * (pos + 1) once written.
+template <typename T>
+void SeqRingBuff<T>::push(const T &record) {
+    uint64_t pos = m_head.load(memory_order_relaxed);
+    slot_t &slot = m_slots[pos % m_capacity];
+
+    slot.seq.store(2 * pos + 1, memory_order_relaxed);
+    atomic_thread_fence(memory_order_release);
+
+    memcpy(&slot.data, &record, sizeof(T));
+
+    slot.seq.store(2 * (pos + 1), memory_order_release);
+    m_head.store(pos + 1, memory_order_release);
+}
+
+// Copies the record at the given position to out. Returns false, leaving out
+// in an unspecified state, if that record is not (or no longer) in the ring.
+template <typename T>
+bool SeqRingBuff<T>::read(uint64_t pos, T *out) {
+    slot_t &slot = m_slots[pos % m_capacity];
+    uint64_t expected = 2 * (pos + 1);
+
+    if (slot.seq.load(memory_order_acquire) != expected)
+        return false;
+
+    memcpy(out, &slot.data, sizeof(T));
+    atomic_thread_fence(memory_order_acquire);
+
+    return slot.seq.load(memory_order_relaxed) == expected;
+}
+
+// Copies the most recently pushed record to out. Returns false iff empty.
+template <typename T>
+bool SeqRingBuff<T>::latest(T *out) {
+    uint64_t head;
+
+    while ((head = m_head.load(memory_order_acquire)) > 0) {
+        if (read(head - 1, out))
+            return true;
+    }
+
+    return false;
+}
+
+// Copies (at most) the n most recent records having a position >= from to
+// out, in ascending order, and returns the number copied. If n == 0, all
+// such records in the ring are copied. Out must have room for n records, or
+// for capacity() records if n == 0. Iff end is given, it is set to the
+// position following the last record considered.
+template <typename T>
+int SeqRingBuff<T>::snapshot(T *out, int n, uint64_t from, uint64_t *end) {
+    uint64_t head = m_head.load(memory_order_acquire);
+
+    if (end != NULL)
+        *end = head;
+
+    uint64_t start = head > m_capacity ? head - m_capacity : 0;
+
+    start = min(max(start, from), head);
+    if (n > 0 && head - start > (uint64_t)n)
+        start = head - n;
+
+    int count = 0;
+    for (uint64_t pos = start; pos < head; pos++) {
+        if (read(pos, out + count))
+            count++;
+    }
+
+    return count;
+}
+
+// Copies the records having positions in [from, to) that are still in the
+// ring to out, in ascending order, and returns the number copied. Out must
+// have room for min(to - from, capacity()) records.
+template <typename T>
+int SeqRingBuff<T>::range(T *out, uint64_t from, uint64_t to) {
+    uint64_t head = m_head.load(memory_order_acquire);
+    uint64_t start = head > m_capacity ? head - m_capacity : 0;
+
+    to = min(to, head);
+    from = max(from, start);
+
+    int count = 0;
+    for (uint64_t pos = from; pos < to; pos++) {
+        if (read(pos, out + count))
+            count++;
+    }
+
+    return count;
+}
+
+// Returns the position the next record pushed will be assigned, i.e. the
+// total number of records ever pushed.
+template <typename T>
+uint64_t SeqRingBuff<T>::head() {
+    return m_head.load(memory_order_acquire);
+}
+
+// Returns the position of the oldest record in the ring.
+template <typename T>
+uint64_t SeqRingBuff<T>::tail() {
+    uint64_t head = m_head.load(memory_order_acquire);
+    return head > m_capacity ? head - m_capacity : 0;
+}
+
+// Returns the max number of records the ring holds.
+template <typename T>
+size_t SeqRingBuff<T>::capacity() {
+    return m_capacity;
+}
+
+
+#endif // Top-level include guard
@@ -0,0 +1,78 @@
+/////////////////////////////////////////////////////////////////////////////
+// A sliding-window smoother for gaze points.
+//
+// Author: Dustin Fast <dustin.fast@hotmail.com>
+//
+/////////////////////////////////////////////////////////////////////////////
+
+#ifndef EYETRACKER_SMOOTHER_H
+#define EYETRACKER_SMOOTHER_H
+
+#include <boost/circular_buffer.hpp>
+
+#include "eyetracker_structdef.h"
+
+using namespace std;
+
+/////////////////////////////////////////////////////////////////////////////
+// Class
+
+// Averages gaze coords over (at most) the smooth_over most recent samples.
+// Each sample's coords are pushed exactly once and the window's running sums
+// are maintained on push, so both push() and get() are O(1) regardless of
+// the window size or how often the smoothed point is queried.
+// Note: The caller is responsible for any needed synchronization.
+class GazePointSmoother {
+    public:
+        void push(int, int);
+        void clear();
+        gaze_point_t* get(gaze_point_t*);
+
+        GazePointSmoother(int);
+
+    protected:
+        boost::circular_buffer<pair<int, int>> m_window;
+        int64_t m_sum_x;
+        int64_t m_sum_y;
+};
+
+// Default constructor
+GazePointSmoother::GazePointSmoother(int smooth_over) :
+    m_window(smooth_over) {
+        m_sum_x = 0;
+        m_sum_y = 0;
+}
+
+// Pushes the given coords to the window, evicting the oldest iff full.
+void GazePointSmoother::push(int x, int y) {
+    if (m_window.full()) {
+        m_sum_x -= m_window.front().first;
+        m_sum_y -= m_window.front().second;
+    }
+
+    m_window.push_back(make_pair(x, y));
+    m_sum_x += x;
+    m_sum_y += y;
+}
+
+// Empties the window.
+void GazePointSmoother::clear() {
+    m_window.clear();
+    m_sum_x = 0;
+    m_sum_y = 0;
+}
+
+// Populates the given gaze point with the window's average coords and
+// returns it. If the window is empty, coords are set to zero.
+gaze_point_t* GazePointSmoother::get(gaze_point_t *gp) {
+    int n_samples = m_window.size();
+
+    gp->n_samples = n_samples;
+    gp->x_coord = n_samples > 0 ? m_sum_x / n_samples : 0;
+    gp->y_coord = n_samples > 0 ? m_sum_y / n_samples : 0;
+
+    return gp;
+}
+
+
+#endif // Top-level include guard
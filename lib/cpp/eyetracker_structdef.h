@@ -5,6 +5,11 @@
 //
 /////////////////////////////////////////////////////////////////////////////
 
+#ifndef EYETRACKER_STRUCTDEF_H
+#define EYETRACKER_STRUCTDEF_H
+
+#include <stdint.h>
+
 typedef struct gaze_data {
         int64_t unixtime_us;
 
@@ -53,3 +58,16 @@ typedef struct gaze_point {
         int x_coord;
         int y_coord;
 	    } gaze_point_t;
+
+// A dwell (i.e. a fixation held for the dwell time), as detected by the
+// GazeDwellDetector. Coords are the fixation's centroid.
+typedef struct dwell_event {
+        int64_t start_us;
+        int64_t end_us;
+        int n_samples;
+        int x_coord;
+        int y_coord;
+	    } dwell_event_t;
+
+
+#endif // Top-level include guard
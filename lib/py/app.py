@@ -3,13 +3,23 @@
 
 __author__ = 'Dustin Fast <dustin.fast@outlook.com>'
 
+import os
+import sys
 import yaml
 import random
+import importlib.util
 import numpy as np
+from time import perf_counter
 from functools import lru_cache
+from contextlib import contextmanager
 
 CONFIG_FILE_PATH = '/opt/app/src/config.yaml'
 
+# The application's Cython modules. Note: Built ahead of time by setup.py
+PYX_MODULES = ['lib.py.eyetracker_gaze',
+               'lib.py.event_logger',
+               'lib.py.eyetracker_coord_predict']
+
 
 # Load the application's config file (as a dict) or die
 try:
@@ -19,6 +29,10 @@ except FileNotFoundError:
     print(f'FATAL: Failed to open config file \'{CONFIG_FILE_PATH}\'\n')
     exit()
 
+# Startup phase timings, as {phase: seconds}, iff startup profiling is enabled
+_startup_profile = None
+_startup_profile_t0 = None
+
 
 @lru_cache(maxsize=100)
 def app_config(s):
@@ -37,6 +51,98 @@ def seed_rand(seed=None):
         random.seed(seed)
         np.random.seed(seed)
 
+def lazy_import(name):
+    """ Returns the named module, deferring its import until one of its
+        attributes is first accessed. For heavy modules not needed by every
+        application mode.
+    """
+    try:
+        return sys.modules[name]
+    except KeyError:
+        pass
+
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+
+    return module
+
+def pyx_install():
+    """ Ensures the application's Cython modules are importable -- As compiled
+        extension modules iff built ahead of time, with
+        'python setup.py build_ext --inplace', else by installing pyximport to
+        compile them on import. Warns of any built module that is older than
+        its source.
+    """
+    use_pyximport = False
+
+    for name in PYX_MODULES:
+        spec = importlib.util.find_spec(name)
+
+        if spec is None:
+            use_pyximport = True
+            continue
+
+        pyx_path = os.path.join(
+            os.path.dirname(spec.origin), name.split('.')[-1] + '.pyx')
+
+        if os.path.getmtime(pyx_path) > os.path.getmtime(spec.origin):
+            warn(f'{name} has changed since it was built. Rebuild it with '
+                 '\'python setup.py build_ext --inplace\'.')
+
+    if use_pyximport:
+        import pyximport; pyximport.install()
+
+def startup_profile_enable():
+    """ Enables timing of the application's startup phases, from now, as
+        reported by startup_profile_report().
+    """
+    global _startup_profile, _startup_profile_t0
+
+    _startup_profile = {}
+    _startup_profile_t0 = perf_counter()
+
+def startup_phase_add(phase, seconds):
+    """ Adds the given seconds to the given startup phase's time, iff startup
+        profiling is enabled.
+    """
+    if _startup_profile is not None:
+        _startup_profile[phase] = _startup_profile.get(phase, 0) + seconds
+
+@contextmanager
+def startup_phase(phase):
+    """ A context manager adding the time spent in its context to the given
+        startup phase's time, iff startup profiling is enabled.
+    """
+    t_start = perf_counter()
+
+    try:
+        yield
+    finally:
+        startup_phase_add(phase, perf_counter() - t_start)
+
+def startup_profile_report():
+    """ Prints the startup phases' times, iff startup profiling is enabled.
+        The report is printed once, at the first call.
+    """
+    global _startup_profile
+
+    if not _startup_profile:
+        return
+
+    t_total = perf_counter() - _startup_profile_t0
+    t_other = t_total - sum(_startup_profile.values())
+
+    bold('Startup profile:')
+    for phase, seconds in _startup_profile.items():
+        print(f'  {phase:<20}{seconds:>8.3f}s')
+    print(f'  {"other":<20}{t_other:>8.3f}s')
+    print(f'  {"total":<20}{t_total:>8.3f}s')
+
+    _startup_profile = None
+
 def key_to_id(key):
     """ Returns the key ID of the given Key obj.
     """
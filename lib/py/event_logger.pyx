@@ -1,5 +1,5 @@
 #cython: language_level=3
-""" A module for logging Gaze, and Keyboard/Mouse Events to CSV file.
+""" A module for logging Gaze, and Keyboard/Mouse Events to file.
 """
 __author__ = 'Dustin Fast [dustin.fast@outlook.com], 2020'
 
@@ -30,12 +30,21 @@ GAZE_BUFF_SZ = app_config('EYETRACKER_BUFF_SZ')
 SIGNAL_EVENT = True
 SIGNAL_STOP = False
 
+# A mouse-click log row. Mirrors AsyncMouseClkEventLogger._LOG_MOUSE_COLS
+cdef packed struct mouselog_row_t:
+    double time
+    int keycode
+    int x
+    int y
+
 
 class AsyncGazeEventLogger(object):
     def __init__(self, logpath, verbose=False):
-        """ A class for performing asynchronous logging of gaze data to CSV.
+        """ A class for performing asynchronous logging of gaze data to CSV,
+            or to a binary gaze log iff logpath has the GAZE_LOG_EXT extension.
             The logging occurs GAZE_WRITEBACK/GAZE_WRITEAFTER seconds before/
-            after receipt of an event signal.
+            after receipt of an event signal. Each gaze sample is logged at
+            most once, even when the windows of successive events overlap.
         """
         # Validate writeback/after elements
         if GAZE_WRITEBACK <= 0 or GAZE_WRITEAFTER <= 0:
@@ -48,9 +57,12 @@ class AsyncGazeEventLogger(object):
         self._logpath = str(logpath)
         self._verbose = verbose
         
-        self._writeback_samples = GAZE_WRITEBACK * GAZE_SAMPLE_RATE
+        self._writeback_us = GAZE_WRITEBACK * 1000000
         self._writeafter_seconds = GAZE_WRITEAFTER
 
+        # Buff position of the next gaze sample to log
+        self._watermark = 0
+
         self._async_proc = None
         self._async_queue = None
 
@@ -78,15 +90,28 @@ class AsyncGazeEventLogger(object):
                 return time.time() + self._writeafter_seconds
             return time.time()
             
-        def _do_write():
+        def _do_write(writeback=False):
             if self.eyetracker.gaze_data_sz() <= 0:
                 error('Attempted Gaze watcher log write but no data available.')
                 return
 
-            self.eyetracker.to_csv(self._logpath, self._writeback_samples)
+            # Iff writing back, start no earlier than the writeback window,
+            # but never before the samples not yet logged
+            if writeback:
+                self._watermark = max(self._watermark,
+                                      self.eyetracker.gaze_data_pos(
+                                          time.time() * 1000000 -
+                                            self._writeback_us))
 
-            if self._verbose:
-                print(f'Wrote to gaze log at {self._logpath}')
+            count, self._watermark = self.eyetracker.export_since(
+                self._watermark, self._logpath)
+
+            # On writer backpressure the watermark is unchanged, so the
+            # samples are written on the next attempt
+            if count < 0:
+                warn('Gaze log writer is backlogged. Deferring log write.')
+            elif self._verbose:
+                print(f'Wrote {count} samples to gaze log at {self._logpath}')
 
         # Start the eyetrackers asynchronous data stream
         self.eyetracker.open()
@@ -114,7 +139,7 @@ class AsyncGazeEventLogger(object):
             write_until = _event(signal)
 
             if self.eyetracker.gaze_data_sz() >= 0:
-                _do_write()
+                _do_write(writeback=True)
             else:
                 error('Gaze watcher has no prev data to write. Is it connected?')
 
@@ -206,7 +231,7 @@ class AsyncGazeEventLogger(object):
 
 
 class AsyncMouseClkEventLogger(object):
-    _DF_MAXROWS = 2500
+    _LOG_MAXROWS = 2500
 
     _LOG_MOUSE_COLS = [('time', np.float64),
                        ('keycode', np.int32),
@@ -229,32 +254,41 @@ class AsyncMouseClkEventLogger(object):
         self._async_keywatcher_proc = None
         self._async_mousewatcher_proc = None
         
-        self._df_mouselog_idx = 0
-        self._df_mouselog = pd.DataFrame(
-            np.zeros(self._DF_MAXROWS, dtype=np.dtype(self._LOG_MOUSE_COLS)))
+        self._mouselog_idx = 0
+        self._mouselog = np.zeros(
+            self._LOG_MAXROWS, dtype=np.dtype(self._LOG_MOUSE_COLS))
 
     def _do_callbacks(self):
         """ Calls the user-defined on_event callbacks, if any.
         """
         [f() for f in self._callbacks if callable(f)]
 
-    def _append_df_row(self, df, idx, row):
-        """ Appends the given row to the given df at the row denoted by idx
-            and returns the next row's insertion idx.
+    def _append_row(self,
+                    mouselog_row_t[:] rows,
+                    int idx,
+                    double t_stamp,
+                    int keycode,
+                    int x,
+                    int y):
+        """ Sets the row of the given log rows denoted by idx to the given
+            click and returns the next row's insertion idx.
         """
-        df.iloc[idx, :] = row
-        idx += 1
+        rows[idx].time = t_stamp
+        rows[idx].keycode = keycode
+        rows[idx].x = x
+        rows[idx].y = y
 
-        return idx
+        return idx + 1
 
-    def _write_log(self, df, idx):
-        """ Returns the idx of the next row to write. If the df's capacity
-            has been reached, also writes the contents to file and resets
-            the df's contents.
+    def _write_log(self, rows, idx):
+        """ Returns the idx of the next row to write. If the log rows'
+            capacity has been reached, also writes them to file and resets
+            their contents.
         """
-        # Write df to file and then re-create it
-        if idx >= self._DF_MAXROWS:
+        # Write rows to file and then re-create them
+        if idx >= self._LOG_MAXROWS:
             path = self._logpath
+            df = pd.DataFrame(rows)
 
             # Write to new file with no col headers
             if not os.path.exists(path):
@@ -264,9 +298,8 @@ class AsyncMouseClkEventLogger(object):
             else:
                 df.to_csv(path, index=False, mode='a', header=False)
             
-            # Zero-fill df, effectively re-creating
-            for col in df.columns:
-                df[col].values[:] = 0
+            # Zero-fill rows, effectively re-creating
+            rows[:] = 0
             idx = 0
 
             if self._verbose:
@@ -281,11 +314,14 @@ class AsyncMouseClkEventLogger(object):
             t_stamp = time.time()
             self._do_callbacks()
             
-            # Update the log/df and (iff needed) write to file
-            idx = self._append_df_row(self._df_mouselog,
-                                      self._df_mouselog_idx,
-                                      [t_stamp, button.value, x, y])
-            self._df_mouselog_idx = self._write_log(self._df_mouselog, idx)
+            # Update the log rows and (iff needed) write to file
+            idx = self._append_row(self._mouselog,
+                                   self._mouselog_idx,
+                                   t_stamp,
+                                   button.value,
+                                   x,
+                                   y)
+            self._mouselog_idx = self._write_log(self._mouselog, idx)
         
     def _on_keypress(self, key):
         """ Keyboard key-press callback, for use by the async listener."""
@@ -307,8 +343,8 @@ class AsyncMouseClkEventLogger(object):
                 info(f'Input watcher received STOP at {time.time()}s.')
 
             # Write contents of any existing data
-            self._write_log(self._df_mouselog.iloc[:self._df_mouselog_idx, :],
-                            self._DF_MAXROWS)
+            self._write_log(self._mouselog[:self._mouselog_idx],
+                            self._LOG_MAXROWS)
             return False
 
     def start(self) -> None:
@@ -6,9 +6,29 @@ __author__ = 'Dustin Fast <dustin.fast@outlook.com>'
 
 import pickle
 
+cimport cython
+from libc.math cimport exp
+
 import numpy as np
+from sklearn.svm import SVR
+from sklearn.linear_model import Ridge
+from sklearn.kernel_approximation import Nystroem
+from sklearn.metrics.pairwise import rbf_kernel
+
+from lib.py.app import error
+from lib.py.hud_learn import HUDTrainGazeAccAssist
+from lib.py.eyetracker_structdef import GAZE_FEATURE_NAMES, gaze_features
+
+
+# Max rows per kernel evaluation in predict_batch, bounding its memory use
+PREDICT_BATCH_CHUNK_SZ = 4096
+
+# Gaze features per prediction -- see predict()
+cdef enum:
+    N_FEATURES = 30
+
+assert len(GAZE_FEATURE_NAMES) == N_FEATURES
 
-from app import error
 
 class EyeTrackerCoordPredict():
     def __init__(self, model_path):
@@ -16,6 +36,7 @@ class EyeTrackerCoordPredict():
             each instance of EyeTrackerCoordrPredict predicts only a single
             coordinate. To predict, say, coords x and y, two objs must be
             instantiated with each passed the model trained for that coord.
+            For batched prediction of both coords, see EyeTrackerCoordPredictXY.
         """
         # Load the predictive model and feature scalar from file
         try:
@@ -26,86 +47,153 @@ class EyeTrackerCoordPredict():
             self._model = None
         else:
             self._scaler = self._model.scaler
+
+            # The (min-max) scaler's transform, as X * scale + min, applied
+            # by predict() as it packs the features
+            self._scale = np.asarray(self._scaler.scale_, dtype=np.float64)
+            self._min = np.asarray(self._scaler.min_, dtype=np.float64)
+
+        # Iff the model is an rbf kernel expansion, as are those trained by
+        # HUDTrainGazeAccAssist, predict() evaluates it directly -- for a
+        # single row, the model's own predict() costs far more than the kernel
+        self._vectors = None
+
+        if self._model is not None and self._is_rbf(self._model):
+            vectors, coefs, gamma, intercept = \
+                HUDTrainGazeAccAssist._rbf_expansion(self._model)
+
+            self._vectors = np.ascontiguousarray(vectors, dtype=np.float64)
+            self._coefs = np.ascontiguousarray(coefs, dtype=np.float64).ravel()
+            self._gamma = float(gamma)
+            self._intercept = float(np.ravel(intercept)[0])
+
+        # The feature row predict() packs, preallocated
+        self._features = np.zeros((1, N_FEATURES))
+
+    @staticmethod
+    def _is_rbf(model):
+        """ Returns True iff the given model's decision function is an rbf
+            kernel expansion. See HUDTrainGazeAccAssist._rbf_expansion.
+        """
+        if isinstance(model, SVR):
+            return model.kernel == 'rbf'
+
+        steps = [step for _, step in getattr(model, 'steps', [])]
+
+        return (len(steps) == 2 and
+                isinstance(steps[0], Nystroem) and
+                steps[0].kernel == 'rbf' and
+                isinstance(steps[1], Ridge))
     
-    def predict(self, 
-                left_pupildiameter_mm,
-                right_pupildiameter_mm,
-
-                left_eyeposition_normed_x,
-                left_eyeposition_normed_y,
-                left_eyeposition_normed_z,
-                right_eyeposition_normed_x,
-                right_eyeposition_normed_y,
-                right_eyeposition_normed_z,
-
-                left_eyecenter_mm_x,
-                left_eyecenter_mm_y,
-                left_eyecenter_mm_z,
-                right_eyecenter_mm_x,
-                right_eyecenter_mm_y,
-                right_eyecenter_mm_z,
-
-                left_gazeorigin_mm_x,
-                left_gazeorigin_mm_y,
-                left_gazeorigin_mm_z,
-                right_gazeorigin_mm_x,
-                right_gazeorigin_mm_y,
-                right_gazeorigin_mm_z,
-
-                left_gazepoint_mm_x,
-                left_gazepoint_mm_y,
-                left_gazepoint_mm_z,
-                right_gazepoint_mm_x,
-                right_gazepoint_mm_y,
-                right_gazepoint_mm_z,
-
-                left_gazepoint_normed_x,
-                left_gazepoint_normed_y,
-                right_gazepoint_normed_x,
-                right_gazepoint_normed_y):
+    def predict(self,
+                double left_pupildiameter_mm,
+                double right_pupildiameter_mm,
+
+                double left_eyeposition_normed_x,
+                double left_eyeposition_normed_y,
+                double left_eyeposition_normed_z,
+                double right_eyeposition_normed_x,
+                double right_eyeposition_normed_y,
+                double right_eyeposition_normed_z,
+
+                double left_eyecenter_mm_x,
+                double left_eyecenter_mm_y,
+                double left_eyecenter_mm_z,
+                double right_eyecenter_mm_x,
+                double right_eyecenter_mm_y,
+                double right_eyecenter_mm_z,
+
+                double left_gazeorigin_mm_x,
+                double left_gazeorigin_mm_y,
+                double left_gazeorigin_mm_z,
+                double right_gazeorigin_mm_x,
+                double right_gazeorigin_mm_y,
+                double right_gazeorigin_mm_z,
+
+                double left_gazepoint_mm_x,
+                double left_gazepoint_mm_y,
+                double left_gazepoint_mm_z,
+                double right_gazepoint_mm_x,
+                double right_gazepoint_mm_y,
+                double right_gazepoint_mm_z,
+
+                double left_gazepoint_normed_x,
+                double left_gazepoint_normed_y,
+                double right_gazepoint_normed_x,
+                double right_gazepoint_normed_y):
         """ Returns the coordinate prediction from the given gaze features.
         """
-        # TODO: Pass features as a c array?
+        cdef double[:, :] features
+        cdef double[:] scale, offset
+        cdef double[:, ::1] vectors
+        cdef double[::1] coefs
+        cdef double gamma, dist, diff, pred
+        cdef int i, j
+
         if self._model:
+            features, scale, offset = self._features, self._scale, self._min
+
+            # Pack the features into the preallocated feature row, then scale
+            # them in place
+            features[0, 0] = left_pupildiameter_mm
+            features[0, 1] = right_pupildiameter_mm
+
+            features[0, 2] = left_eyeposition_normed_x
+            features[0, 3] = left_eyeposition_normed_y
+            features[0, 4] = left_eyeposition_normed_z
+            features[0, 5] = right_eyeposition_normed_x
+            features[0, 6] = right_eyeposition_normed_y
+            features[0, 7] = right_eyeposition_normed_z
+
+            features[0, 8] = left_eyecenter_mm_x
+            features[0, 9] = left_eyecenter_mm_y
+            features[0, 10] = left_eyecenter_mm_z
+            features[0, 11] = right_eyecenter_mm_x
+            features[0, 12] = right_eyecenter_mm_y
+            features[0, 13] = right_eyecenter_mm_z
+
+            features[0, 14] = left_gazeorigin_mm_x
+            features[0, 15] = left_gazeorigin_mm_y
+            features[0, 16] = left_gazeorigin_mm_z
+            features[0, 17] = right_gazeorigin_mm_x
+            features[0, 18] = right_gazeorigin_mm_y
+            features[0, 19] = right_gazeorigin_mm_z
+
+            features[0, 20] = left_gazepoint_mm_x
+            features[0, 21] = left_gazepoint_mm_y
+            features[0, 22] = left_gazepoint_mm_z
+            features[0, 23] = right_gazepoint_mm_x
+            features[0, 24] = right_gazepoint_mm_y
+            features[0, 25] = right_gazepoint_mm_z
+
+            features[0, 26] = left_gazepoint_normed_x
+            features[0, 27] = left_gazepoint_normed_y
+            features[0, 28] = right_gazepoint_normed_x
+            features[0, 29] = right_gazepoint_normed_y
+
+            for i in range(N_FEATURES):
+                features[0, i] = features[0, i] * scale[i] + offset[i]
+
+            # Evaluate the rbf kernel expansion directly, iff available, as
+            # f(x) = intercept + sum_j(coefs_j * exp(-gamma * ||v_j - x||^2))
+            if self._vectors is not None:
+                vectors, coefs, gamma = self._vectors, self._coefs, self._gamma
+                pred = self._intercept
+
+                with cython.boundscheck(False), cython.wraparound(False):
+                    for j in range(vectors.shape[0]):
+                        dist = 0
+
+                        for i in range(N_FEATURES):
+                            diff = vectors[j, i] - features[0, i]
+                            dist += diff * diff
+
+                        pred += coefs[j] * exp(-gamma * dist)
+
+                return round(pred)
+
             try:
-                pred = self._model.predict(
-                    self._scaler.transform(
-                        np.array([[
-                            left_pupildiameter_mm,
-                            right_pupildiameter_mm,
-
-                            left_eyeposition_normed_x,
-                            left_eyeposition_normed_y,
-                            left_eyeposition_normed_z,
-                            right_eyeposition_normed_x,
-                            right_eyeposition_normed_y,
-                            right_eyeposition_normed_z,
-
-                            left_eyecenter_mm_x,
-                            left_eyecenter_mm_y,
-                            left_eyecenter_mm_z,
-                            right_eyecenter_mm_x,
-                            right_eyecenter_mm_y,
-                            right_eyecenter_mm_z,
-
-                            left_gazeorigin_mm_x,
-                            left_gazeorigin_mm_y,
-                            left_gazeorigin_mm_z,
-                            right_gazeorigin_mm_x,
-                            right_gazeorigin_mm_y,
-                            right_gazeorigin_mm_z,
-
-                            left_gazepoint_mm_x,
-                            left_gazepoint_mm_y,
-                            left_gazepoint_mm_z,
-                            right_gazepoint_mm_x,
-                            right_gazepoint_mm_y,
-                            right_gazepoint_mm_z,
-                            
-                            left_gazepoint_normed_x,
-                            left_gazepoint_normed_y,
-                            right_gazepoint_normed_x,
-                            right_gazepoint_normed_y]])))
+                pred = self._model.predict(self._features)
             except Exception as e:
                 error(f'Coord prediction failed with\n{repr(e)}')
                 return 0
@@ -113,3 +201,79 @@ class EyeTrackerCoordPredict():
                 return round(pred.item())
         else:
             return 0
+
+
+class EyeTrackerCoordPredictXY(object):
+    def __init__(self, model_x_path, model_y_path):
+        """ An abstraction of a trained pair of gaze-coord prediction models,
+            one for each of the x and y coords, for batched prediction.
+            The models are assumed to share a feature scaler, as is the case
+            for models trained by HUDTrainGazeAccAssist.
+        """
+        self._model_x = EyeTrackerCoordPredict(model_x_path)._model
+        self._model_y = EyeTrackerCoordPredict(model_y_path)._model
+        self._scaler = None
+        self._vectors = None
+        self._coefs = None
+
+        if self._model_x is None or self._model_y is None:
+            return
+
+        self._scaler = self._model_x.scaler
+
+        # If both models are rbf SVRs w/ a common gamma, merge their support
+        # vectors so that each kernel value is computed once for both models
+        if self._is_joint_rbf(self._model_x, self._model_y):
+            self._gamma = self._model_x._gamma
+            self._intercepts = np.array(
+                [self._model_x.intercept_[0], self._model_y.intercept_[0]])
+
+            idxs = np.union1d(self._model_x.support_, self._model_y.support_)
+            self._vectors = np.empty(
+                (len(idxs), self._model_x.support_vectors_.shape[1]))
+            self._coefs = np.zeros((len(idxs), 2))
+
+            for i, model in enumerate((self._model_x, self._model_y)):
+                pos = np.searchsorted(idxs, model.support_)
+                self._vectors[pos] = model.support_vectors_
+                self._coefs[pos, i] = model.dual_coef_.ravel()
+
+    @staticmethod
+    def _is_joint_rbf(model_x, model_y):
+        """ Returns True iff the given models may be evaluated jointly.
+        """
+        return (isinstance(model_x, SVR) and isinstance(model_y, SVR) and
+                model_x.kernel == model_y.kernel == 'rbf' and
+                model_x._gamma == model_y._gamma)
+
+    def predict_batch(self, features):
+        """ Returns the (x, y) coord predictions for each of the given gaze
+            feature rows, as a float ndarray of shape [N, 2].
+
+            :param features: Either an array-like of shape [N, 30] or a
+            structured array of gaze records (e.g., of dtype
+            eyetracker_structdef.GAZE_DATA_DTYPE), in which case the features
+            are read from a view of the records rather than a copy.
+        """
+        X = gaze_features(features)
+
+        if self._scaler is None:
+            return np.zeros((X.shape[0], 2))
+
+        # Scale once for both models
+        X = self._scaler.transform(X)
+
+        # If joint evaluation not possible, evaluate each model on the scaled X
+        if self._vectors is None:
+            return np.column_stack(
+                (self._model_x.predict(X), self._model_y.predict(X)))
+
+        # Else, evaluate the merged rbf decision functions in bounded chunks
+        preds = np.empty((X.shape[0], 2))
+
+        for i in range(0, X.shape[0], PREDICT_BATCH_CHUNK_SZ):
+            chunk = X[i:i + PREDICT_BATCH_CHUNK_SZ]
+            preds[i:i + PREDICT_BATCH_CHUNK_SZ] = rbf_kernel(
+                chunk, self._vectors, gamma=self._gamma) @ self._coefs
+
+        return preds + self._intercepts
@@ -4,14 +4,23 @@
 
 __author__ = 'Dustin Fast <dustin.fast@outlook.com>'
 
+import os
 import ctypes
 from pathlib import Path
+from time import sleep, perf_counter
+from threading import Thread, Event
 from subprocess import Popen, PIPE
 
-from lib.py.app import app_config, info, warn, error
+import numpy as np
 
+from lib.py.app import app_config, info, warn, error, startup_phase, \
+    startup_phase_add
+from lib.py.eyetracker_structdef import GAZE_DATA_DTYPE, DWELL_EVENT_DTYPE
 
+
+BACKEND = app_config('EYETRACKER_BACKEND')
 LIB_PATH = app_config('EYETRACKER_EXTERN_LIB_PATH')
+REPLAY_LIB_PATH = app_config('EYETRACKER_REPLAY_LIB_PATH')
 DISP_WIDTH_MM = app_config('DISP_WIDTH_MM')
 DISP_HEIGHT_MM = app_config('DISP_HEIGHT_MM')
 DISP_WIDTH_PX = app_config('DISP_WIDTH_PX')
@@ -22,35 +31,55 @@ GAZE_PREP_PATH = app_config('EYETRACKER_PREP_SCRIPT_PATH')
 GAZE_SMOOTH_OVER = app_config('EYETRACKER_SMOOTH_OVER')
 EYETRACKER_CALIB_PATH = app_config('EYETRACKER_CALIB_PATH')
 EYETRACKER_MOUNT_OFFSET_MM = app_config('EYETRACKER_MOUNT_OFFSET_MM')
+MODEL_WATCH_SECONDS = app_config('GAZE_ACC_MODEL_WATCH_SECONDS')
+
+WAIT_POLL_SECONDS = .005
+
 
+# A gaze point, including the number of gaze samples it was smoothed over.
+# Mirrors gaze_point_t, as defined in lib/cpp/eyetracker_structdef.h
+cdef struct gaze_point_t:
+    int n_samples
+    int x
+    int y
 
-class gaze_point(ctypes.Structure):
-    """ An abstraction of a gaze point, including the number of samples gaze
-        samples it was smoothed over.
-    """
-    _fields_ = [
-        ('n_samples', ctypes.c_int), 
-        ('x', ctypes.c_int), 
-        ('y', ctypes.c_int)]
+# The gaze point getter/freer's signatures, for calling them directly rather
+# than via ctypes -- see gaze_coords()
+ctypedef gaze_point_t* (*gaze_point_fn_t)(void*) noexcept nogil
+ctypedef void (*gaze_point_free_fn_t)(gaze_point_t*) noexcept nogil
 
 
 class EyeTrackerGaze(object):
     def __init__(self, ml_x_path=None, ml_y_path=None):
-        # Build external .so file
-        prep_proc = Popen([GAZE_PREP_PATH], stderr=PIPE)
-        stderr = prep_proc.communicate()[1]
-        prep_proc.wait()
+        # Build external .so file iff its sources have changed, for the
+        # configured backend -- either the eyetracker device, or a replay of
+        # recorded (or synthetic) gaze data
+        if BACKEND not in ('device', 'replay'):
+            raise ValueError(f'Unsupported eyetracker backend: {BACKEND}')
+
+        with startup_phase('.so prep'):
+            prep_proc = Popen([GAZE_PREP_PATH, BACKEND], stderr=PIPE)
+            stderr = prep_proc.communicate()[1]
 
         # If there were build errors, quit
-        if stderr and not stderr.decode().startswith('Created symlink'):
-            error(f'Eyetracker .so build failed with:\n {stderr}')
+        if prep_proc.returncode != 0:
+            error(f'Eyetracker .so build failed with:\n {stderr.decode()}')
             exit()
 
-        self._lib = self._init_lib(LIB_PATH)
+        self._lib = self._init_lib(
+            REPLAY_LIB_PATH if BACKEND == 'replay' else LIB_PATH)
+        self._gaze_point_fn = ctypes.cast(
+            self._lib.eye_gaze_point, ctypes.c_void_p).value
+        self._gaze_point_free_fn = ctypes.cast(
+            self._lib.eye_gaze_point_free, ctypes.c_void_p).value
         self._obj = None  # Populated on open()
         self._ml_x_path = ml_x_path
         self._ml_y_path = ml_y_path
 
+        # Async (via threading) model file watcher attributes
+        self._model_watcher = None
+        self._model_watcher_stop = Event()
+
     @staticmethod
     def _init_lib(lib_path):
         """ Loads the external lib, inits callables, and returns a ctypes.cdll.
@@ -73,6 +102,41 @@ class EyeTrackerGaze(object):
             ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p]
         lib.eye_gaze_data_tocsv.restype = ctypes.c_int
 
+        # Data to binary gaze log
+        lib.eye_gaze_data_tolog.argtypes = [
+            ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        lib.eye_gaze_data_tolog.restype = ctypes.c_int
+
+        # Refine
+        lib.eye_gaze_refine.argtypes = [
+            ctypes.c_void_p, ctypes.c_int, ctypes.c_int]
+        lib.eye_gaze_refine.restype = ctypes.c_int
+
+        # Refine reset
+        lib.eye_gaze_refine_reset.argtypes = [ctypes.c_void_p]
+        lib.eye_gaze_refine_reset.restype = ctypes.c_void_p
+
+        # Model reload
+        lib.eye_gaze_reload_models.argtypes = [
+            ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
+        lib.eye_gaze_reload_models.restype = ctypes.c_bool
+
+        # Startup timings
+        lib.eye_gaze_startup_seconds.argtypes = [
+            ctypes.c_void_p,
+            ctypes.POINTER(ctypes.c_double),
+            ctypes.POINTER(ctypes.c_double)]
+        lib.eye_gaze_startup_seconds.restype = ctypes.c_void_p
+
+        # Dwell wait
+        lib.eye_gaze_dwell_wait.argtypes = [
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int]
+        lib.eye_gaze_dwell_wait.restype = ctypes.c_bool
+
+        # Dwell detection enable/disable
+        lib.eye_gaze_dwell_enable.argtypes = [ctypes.c_void_p, ctypes.c_bool]
+        lib.eye_gaze_dwell_enable.restype = ctypes.c_void_p
+
         # Start
         lib.eye_gaze_start.argtypes = [ctypes.c_void_p]
         lib.eye_gaze_start.restype = ctypes.c_void_p
@@ -85,6 +149,26 @@ class EyeTrackerGaze(object):
         lib.eye_gaze_data_sz.argtypes = [ctypes.c_void_p]
         lib.eye_gaze_data_sz.restype = ctypes.c_int
 
+        # Gaze data snapshot
+        lib.eye_gaze_data_snapshot.argtypes = [
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int]
+        lib.eye_gaze_data_snapshot.restype = ctypes.c_int
+
+        # Gaze data buffer position, by timestamp
+        lib.eye_gaze_data_pos.argtypes = [ctypes.c_void_p, ctypes.c_int64]
+        lib.eye_gaze_data_pos.restype = ctypes.c_uint64
+
+        # Gaze data export, by time range
+        lib.eye_gaze_data_export_range.argtypes = [
+            ctypes.c_void_p, ctypes.c_int64, ctypes.c_int64, ctypes.c_char_p]
+        lib.eye_gaze_data_export_range.restype = ctypes.c_int
+
+        # Gaze data export, since watermark
+        lib.eye_gaze_data_export_since.argtypes = [
+            ctypes.c_void_p, ctypes.c_uint64, ctypes.c_char_p,
+                ctypes.POINTER(ctypes.c_uint64)]
+        lib.eye_gaze_data_export_since.restype = ctypes.c_int
+
         # User position guide, x
         lib.eye_user_pos_guide_x.argtypes = [ctypes.c_void_p]
         lib.eye_user_pos_guide_x.restype = ctypes.c_float
@@ -136,11 +220,23 @@ class EyeTrackerGaze(object):
         except TypeError:
             ml_y_path = None
 
-
+        t_start = perf_counter()
         self._obj = self._lib.eye_gaze_new(EYETRACKER_MOUNT_OFFSET_MM,
                 DISP_WIDTH_MM, DISP_HEIGHT_MM, DISP_WIDTH_PX, DISP_HEIGHT_PX,
                 GAZE_MARK_INTERVAL, GAZE_BUFF_SZ, GAZE_SMOOTH_OVER,
                     ml_x_path, ml_y_path)
+        t_open = perf_counter() - t_start
+
+        # Denote the time spent opening the device, less that spent loading
+        # its calibration and the models, as the startup phase of each
+        calib_load_s, model_load_s = ctypes.c_double(), ctypes.c_double()
+        self._lib.eye_gaze_startup_seconds(
+            self._obj, ctypes.byref(calib_load_s), ctypes.byref(model_load_s))
+
+        startup_phase_add(
+            'device open', t_open - calib_load_s.value - model_load_s.value)
+        startup_phase_add('calibration load', calib_load_s.value)
+        startup_phase_add('model load', model_load_s.value)
 
     def close(self):
         """ Closes the device.
@@ -148,6 +244,7 @@ class EyeTrackerGaze(object):
         if self._obj is None:
             warn('Eyetracker.close attempted but device not open.')
 
+        self.stop_model_watcher()
         self._lib.eye_gaze_destructor(self._obj)
         self._obj = None
 
@@ -183,12 +280,242 @@ class EyeTrackerGaze(object):
                                       num_points,
                                       bytes(label, encoding="ascii"))
 
+    def to_log(self, file_path, num_points=0):
+        """ Writes up to the last n gaze data points to the given binary gaze
+            log path (see lib.py.gaze_log), creating it if not exists else
+            appending to it. If n == 0, all data points in the buffer are
+            written.
+            ASSUMES: After first call to this function, subsequent calls
+            are for the same file_path (for perf reasons)
+        """
+        # Decode and cache the file_path.
+        try:
+            log_path = self._log_path
+        except AttributeError:
+            self._log_path = bytes(file_path, encoding="ascii")
+            log_path = self._log_path
+
+        self._ensure_device_opened()
+        self._lib.eye_gaze_data_tolog(self._obj, log_path, num_points)
+
     def gaze_data_sz(self):
         """ Returns the number of gaze point samples in the eyetracker's buff.
         """
         self._ensure_device_opened()
         return self._lib.eye_gaze_data_sz(self._obj)
 
+    def wait_for_data(self, timeout=1):
+        """ Blocks until the first gaze sample is received, or for at most
+            timeout seconds. Returns True iff a sample was received.
+
+            :param timeout: (float) The max seconds to wait.
+        """
+        self._ensure_device_opened()
+        t_start = perf_counter()
+
+        with startup_phase('first frame'):
+            while self._lib.eye_gaze_data_sz(self._obj) == 0:
+                if perf_counter() - t_start >= timeout:
+                    return False
+                sleep(WAIT_POLL_SECONDS)
+
+        return True
+
+    def snapshot(self, n=0):
+        """ Returns (at most) the n most recent gaze data samples in the
+            eyetracker's buff, oldest first, as a numpy structured array of
+            dtype eyetracker_structdef.GAZE_DATA_DTYPE (mirroring gaze_data_t).
+            If n == 0, all samples in the buffer are returned. The samples are
+            copied directly into the array's memory and the buffer is
+            unaffected.
+        """
+        self._ensure_device_opened()
+
+        n = max(0, min(n, GAZE_BUFF_SZ))
+        samples = np.empty(n or GAZE_BUFF_SZ, dtype=GAZE_DATA_DTYPE)
+
+        count = self._lib.eye_gaze_data_snapshot(
+            self._obj, samples.ctypes.data, n)
+
+        return samples[:count]
+
+    def gaze_data_pos(self, unixtime_us):
+        """ Returns the buffer position (an ever-increasing sample index) of
+            the oldest gaze data sample in the eyetracker's buff having a
+            timestamp >= the given unix time, in microseconds. If there is no
+            such sample, the position following the newest sample is returned.
+        """
+        self._ensure_device_opened()
+        return self._lib.eye_gaze_data_pos(self._obj, int(unixtime_us))
+
+    def export_range(self, t_start_us, t_end_us, file_path):
+        """ Writes the gaze data samples in the eyetracker's buff having
+            timestamps in [t_start_us, t_end_us) to the given file path,
+            creating it if not exists else appending to it. The samples are
+            written as a binary gaze log iff the path has the
+            gaze_log.GAZE_LOG_EXT extension, else as csv. The buffer is
+            unaffected. Returns the number of samples written, or -1 if the
+            eyetracker's log writer is backlogged (in which case nothing is
+            written).
+        """
+        self._ensure_device_opened()
+        return self._lib.eye_gaze_data_export_range(
+            self._obj,
+            int(t_start_us),
+            int(t_end_us),
+            bytes(str(file_path), encoding="ascii"))
+
+    def export_since(self, watermark, file_path):
+        """ Writes the gaze data samples in the eyetracker's buff at or after
+            the given buffer position to the given file path, as with
+            export_range. Returns a tuple of the number of samples written (or
+            -1) and the watermark to give the next call, such that each sample
+            is written exactly once across calls. The buffer is unaffected.
+        """
+        self._ensure_device_opened()
+        next_watermark = ctypes.c_uint64(0)
+
+        count = self._lib.eye_gaze_data_export_since(
+            self._obj,
+            watermark,
+            bytes(str(file_path), encoding="ascii"),
+            ctypes.byref(next_watermark))
+
+        return count, next_watermark.value
+
+    def refine(self, target_x, target_y):
+        """ Refines the online gaze coord correction from the most recent
+            gaze samples, given that the user was looking at the given
+            on-screen target (e.g. a button they just clicked). The update
+            takes effect without interrupting the gaze stream. Returns the
+            number of samples learned from, or 0 if they were rejected.
+        """
+        self._ensure_device_opened()
+        return self._lib.eye_gaze_refine(
+            self._obj, int(target_x), int(target_y))
+
+    def refine_reset(self):
+        """ Discards the online gaze coord correction learned so far.
+        """
+        self._ensure_device_opened()
+        self._lib.eye_gaze_refine_reset(self._obj)
+
+    def dwell_enable(self, enabled=True):
+        """ Enables/disables dwell (i.e. held fixation) detection. Dwells
+            are only detected while enabled, and any pending are discarded.
+        """
+        self._ensure_device_opened()
+        self._lib.eye_gaze_dwell_enable(self._obj, enabled)
+
+    def dwell_wait(self, timeout=1):
+        """ Blocks until a dwell is detected, or for at most timeout seconds,
+            without polling. Returns the dwell as a numpy record of dtype
+            eyetracker_structdef.DWELL_EVENT_DTYPE (mirroring dwell_event_t),
+            or None on timeout. The GIL is released while blocked.
+
+            :param timeout: (float) The max seconds to wait.
+        """
+        self._ensure_device_opened()
+        dwell = np.zeros(1, dtype=DWELL_EVENT_DTYPE)
+
+        if not self._lib.eye_gaze_dwell_wait(
+                self._obj, dwell.ctypes.data, int(timeout * 1000)):
+            return None
+
+        return dwell[0]
+
+    def reload_models(self, ml_x_path=None, ml_y_path=None):
+        """ Loads the gaze coord acc-assist models (as native model files) at
+            the given paths, or at the paths given on init if not given, then
+            swaps them in for the current models between gaze samples. The
+            gaze stream is not interrupted. If either fails to load, the
+            current models are kept. Returns True iff the models were swapped.
+        """
+        self._ensure_device_opened()
+        ml_x_path = ml_x_path or self._ml_x_path
+        ml_y_path = ml_y_path or self._ml_y_path
+
+        if not ml_x_path or not ml_y_path:
+            raise ValueError('Both an x and y model path are required.')
+
+        swapped = self._lib.eye_gaze_reload_models(
+            self._obj,
+            bytes(str(ml_x_path), encoding="ascii"),
+            bytes(str(ml_y_path), encoding="ascii"))
+
+        if swapped:
+            self._ml_x_path, self._ml_y_path = ml_x_path, ml_y_path
+
+        return swapped
+
+    def start_model_watcher(self, interval=MODEL_WATCH_SECONDS):
+        """ Starts a thread that reloads the models whenever their files
+            change, checking every interval seconds. Has no effect if
+            interval <= 0 or no model paths were given on init.
+        """
+        self._ensure_device_opened()
+
+        if interval <= 0 or not self._ml_x_path or not self._ml_y_path:
+            return
+
+        if self._model_watcher is not None and self._model_watcher.is_alive():
+            warn('Model watcher start attempted but already running.')
+            return
+
+        self._model_watcher_stop.clear()
+        self._model_watcher = Thread(
+            target=self._async_model_watcher, args=(interval,), daemon=True)
+        self._model_watcher.start()
+
+    def stop_model_watcher(self):
+        """ Stops the model file watcher, if running.
+        """
+        if self._model_watcher is None:
+            return
+
+        self._model_watcher_stop.set()
+        self._model_watcher.join()
+        self._model_watcher = None
+
+    def _model_mtimes(self):
+        """ Returns a tuple of the x and y model files' modified times, in ns,
+            with None denoting a file that does not exist.
+        """
+        mtimes = []
+
+        for path in (self._ml_x_path, self._ml_y_path):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+
+        return tuple(mtimes)
+
+    def _async_model_watcher(self, interval):
+        """ Reloads the models each time their files change, once both have
+            been unchanged for an interval (i.e. once retraining has written
+            them both). Intended to be run as a thread.
+        """
+        loaded = self._model_mtimes()
+        pending = None
+
+        while not self._model_watcher_stop.wait(interval):
+            mtimes = self._model_mtimes()
+
+            if mtimes == loaded:
+                pending = None
+                continue
+
+            # Wait an interval for the files to settle
+            if mtimes != pending:
+                pending = mtimes
+                continue
+
+            if None not in mtimes:
+                self.reload_models()
+
+            loaded, pending = mtimes, None
+
     def user_position(self):
         """ Returns a tuple representing the user position guide, as (x, y, z).
         """
@@ -222,11 +549,14 @@ class EyeTrackerGaze(object):
     def gaze_coords(self):
         """ Returns the current gaze point in display coords.
         """
+        cdef gaze_point_t *gp
+        cdef int n, x, y
+
         self._ensure_device_opened()
         
-        # Instantiate a gaze_point ptr from the c obj's address
-        ptr = self._lib.eye_gaze_point(self._obj)
-        gp = gaze_point.from_address(ptr)
+        # Get a gaze_point from the c obj, called directly for speed
+        gp = (<gaze_point_fn_t><size_t>self._gaze_point_fn)(
+            <void*><size_t>self._obj)
 
         # Denote the gaze_point contexts
         n = gp.n_samples
@@ -234,7 +564,7 @@ class EyeTrackerGaze(object):
         y = gp.y
 
         # Free the ptr mem on the c side
-        self._lib.eye_gaze_point_free(ptr)
+        (<gaze_point_free_fn_t><size_t>self._gaze_point_free_fn)(gp)
 
         if n <= 0:
             warn('Gaze point received from zero samples')
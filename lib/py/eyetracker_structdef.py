@@ -0,0 +1,79 @@
+""" Numpy representations of the structs in lib/cpp/eyetracker_structdef.h.
+"""
+
+__author__ = 'Dustin Fast <dustin.fast@outlook.com>'
+
+import numpy as np
+from numpy.lib import recfunctions
+
+
+# The gaze_data_t members used as gaze-coord model features, in model order
+GAZE_FEATURE_NAMES = [
+    'left_pupildiameter_mm',
+    'right_pupildiameter_mm',
+
+    'left_eyeposition_normed_x',
+    'left_eyeposition_normed_y',
+    'left_eyeposition_normed_z',
+    'right_eyeposition_normed_x',
+    'right_eyeposition_normed_y',
+    'right_eyeposition_normed_z',
+
+    'left_eyecenter_mm_x',
+    'left_eyecenter_mm_y',
+    'left_eyecenter_mm_z',
+    'right_eyecenter_mm_x',
+    'right_eyecenter_mm_y',
+    'right_eyecenter_mm_z',
+
+    'left_gazeorigin_mm_x',
+    'left_gazeorigin_mm_y',
+    'left_gazeorigin_mm_z',
+    'right_gazeorigin_mm_x',
+    'right_gazeorigin_mm_y',
+    'right_gazeorigin_mm_z',
+
+    'left_gazepoint_mm_x',
+    'left_gazepoint_mm_y',
+    'left_gazepoint_mm_z',
+    'right_gazepoint_mm_x',
+    'right_gazepoint_mm_y',
+    'right_gazepoint_mm_z',
+
+    'left_gazepoint_normed_x',
+    'left_gazepoint_normed_y',
+    'right_gazepoint_normed_x',
+    'right_gazepoint_normed_y']
+
+# Mirrors gaze_data_t, including its C alignment
+GAZE_DATA_DTYPE = np.dtype(
+    [('unixtime_us', np.int64)] +
+    [(name, np.float32) for name in GAZE_FEATURE_NAMES] +
+    [('combined_gazepoint_x', np.int32),
+     ('combined_gazepoint_y', np.int32)],
+    align=True)
+
+# Mirrors dwell_event_t, including its C alignment
+DWELL_EVENT_DTYPE = np.dtype(
+    [('start_us', np.int64),
+     ('end_us', np.int64),
+     ('n_samples', np.int32),
+     ('x_coord', np.int32),
+     ('y_coord', np.int32)],
+    align=True)
+
+
+def gaze_features(records):
+    """ Returns the model features of the given gaze records as an [N, 30]
+        array. If records is a structured array having the feature fields
+        (e.g. of dtype GAZE_DATA_DTYPE), the result is a view of it rather
+        than a copy. Otherwise, records is assumed to already be of shape
+        [N, 30] (or [30]) and is returned as a 2d array.
+    """
+    records = np.asarray(records)
+
+    if records.dtype.names is None:
+        return np.atleast_2d(records)
+
+    return recfunctions.structured_to_unstructured(
+        records[GAZE_FEATURE_NAMES], copy=False)
@@ -0,0 +1,170 @@
+""" A module for reading and writing binary gaze logs -- append-only files of
+    fixed-size gaze_data_t records preceded by a header describing the schema
+    version and field layout. See lib/cpp/eyetracker_gazelog.h for the writer
+    used during data collection.
+"""
+
+__author__ = 'Dustin Fast <dustin.fast@outlook.com>'
+
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from lib.py.app import info, lazy_import
+from lib.py.eyetracker_structdef import GAZE_DATA_DTYPE
+
+pd = lazy_import('pandas')  # Only needed for csv conversion
+
+
+# Binary gaze log file attributes -- see lib/cpp/eyetracker_gazelog.h
+GAZE_LOG_EXT = 'glog'
+GAZE_LOG_MAGIC = b'AEYEGAZE'
+GAZE_LOG_VERSION = 1
+GAZE_LOG_FIELD_NAME_SZ = 32
+GAZE_LOG_FIELD_TYPE_SZ = 4
+
+# Header prefix (magic, version, header_sz, record_sz, n_fields) and field
+# descriptor (name, offset, type) layouts
+_HEADER_FMT = '<8sIIII'
+_FIELD_FMT = f'<{GAZE_LOG_FIELD_NAME_SZ}sI{GAZE_LOG_FIELD_TYPE_SZ}s'
+
+# Rows per chunk when converting csv logs
+CSV_CONVERT_CHUNK_ROWS = 250000
+
+
+def gaze_log_header(dtype=GAZE_DATA_DTYPE):
+    """ Returns the binary gaze log header, as bytes, for records of the given
+        structured dtype.
+    """
+    fields = [(name, dtype.fields[name][1], dtype.fields[name][0].str)
+              for name in dtype.names]
+
+    header_sz = struct.calcsize(_HEADER_FMT) + \
+        len(fields) * struct.calcsize(_FIELD_FMT)
+
+    header = struct.pack(_HEADER_FMT,
+                         GAZE_LOG_MAGIC,
+                         GAZE_LOG_VERSION,
+                         header_sz,
+                         dtype.itemsize,
+                         len(fields))
+
+    for name, offset, type_code in fields:
+        header += struct.pack(
+            _FIELD_FMT, name.encode('ascii'), offset, type_code.encode('ascii'))
+
+    return header
+
+
+def read_gaze_log_header(file_path):
+    """ Reads and validates the header of the binary gaze log at the given
+        path. Returns a tuple of the header size, in bytes, and the structured
+        dtype of the log's records, as described by the header.
+    """
+    with open(file_path, 'rb') as f:
+        prefix = f.read(struct.calcsize(_HEADER_FMT))
+
+        if len(prefix) < struct.calcsize(_HEADER_FMT):
+            raise ValueError(f'Gaze log has no header: {file_path}')
+
+        magic, version, header_sz, record_sz, n_fields = struct.unpack(
+            _HEADER_FMT, prefix)
+
+        if magic != GAZE_LOG_MAGIC:
+            raise ValueError(f'Not a gaze log: {file_path}')
+        if version != GAZE_LOG_VERSION:
+            raise ValueError(f'Unsupported gaze log version {version}.')
+
+        names, offsets, formats = [], [], []
+
+        for _ in range(n_fields):
+            name, offset, type_code = struct.unpack(
+                _FIELD_FMT, f.read(struct.calcsize(_FIELD_FMT)))
+            names.append(name.rstrip(b'\0').decode('ascii'))
+            offsets.append(offset)
+            formats.append(type_code.rstrip(b'\0').decode('ascii'))
+
+    dtype = np.dtype({'names': names,
+                      'formats': formats,
+                      'offsets': offsets,
+                      'itemsize': record_sz})
+
+    # Ensure the log has (at least) the fields of the current gaze_data_t
+    missing = [n for n in GAZE_DATA_DTYPE.names if n not in dtype.names]
+    if missing:
+        raise ValueError(f'Gaze log is missing fields: {missing}')
+
+    return header_sz, dtype
+
+
+def read_gaze_log(file_path, mmap=True):
+    """ Returns the records of the binary gaze log at the given path as a
+        structured array, of the dtype described by the log's header. Any
+        trailing partial record (e.g. from an interrupted write) is ignored.
+
+        :param mmap: (bool) If True, the records are memory-mapped (read-only)
+            rather than read into memory.
+    """
+    header_sz, dtype = read_gaze_log_header(file_path)
+    n_records = (os.path.getsize(file_path) - header_sz) // dtype.itemsize
+
+    if n_records <= 0:
+        return np.empty(0, dtype=dtype)
+
+    if mmap:
+        return np.memmap(file_path,
+                         dtype=dtype,
+                         mode='r',
+                         offset=header_sz,
+                         shape=(n_records,))
+
+    with open(file_path, 'rb') as f:
+        f.seek(header_sz)
+        return np.fromfile(f, dtype=dtype, count=n_records)
+
+
+def write_gaze_log(file_path, records):
+    """ Appends the given records, of dtype GAZE_DATA_DTYPE, to the binary gaze
+        log at the given path, creating it if not exists.
+    """
+    records = np.ascontiguousarray(records, dtype=GAZE_DATA_DTYPE)
+
+    with open(file_path, 'ab') as f:
+        if f.tell() == 0:
+            f.write(gaze_log_header())
+
+        records.tofile(f)
+
+
+def gaze_csv_to_log(csv_path, log_path, verbose=True):
+    """ Converts the csv gaze log at csv_path (as written by
+        EyeTrackerGaze.to_csv) to a binary gaze log at log_path, appending to
+        it if exists. Returns the number of records converted.
+    """
+    names = list(GAZE_DATA_DTYPE.names)
+    n_records = 0
+
+    # Note: Rows may have a trailing label col, which is ignored
+    chunks = pd.read_csv(csv_path,
+                         header=None,
+                         index_col=False,
+                         usecols=range(len(names)),
+                         names=names,
+                         chunksize=CSV_CONVERT_CHUNK_ROWS)
+
+    for df in chunks:
+        records = np.zeros(len(df), dtype=GAZE_DATA_DTYPE)
+
+        for name in names:
+            records[name] = df[name].values
+
+        write_gaze_log(log_path, records)
+        n_records += len(records)
+
+    if verbose:
+        info(f'Converted {n_records} gaze samples from {csv_path} to ' +
+             f'{Path(log_path).name}.')
+
+    return n_records
@@ -3,28 +3,33 @@
 
 __author__ = 'Dustin Fast <dustin.fast@outlook.com>'
 
+import ast
+import ctypes
+import select
 from time import sleep
-from threading import Thread
+from threading import Thread, Event
 import multiprocessing as mp
-from subprocess import Popen, PIPE
 
+import Xlib.error
 import Xlib.display
 import Xlib.threaded
 import tkinter as tk
 from tkinter import ttk, FLAT, DISABLED, SUNKEN, ACTIVE
 from pynput import mouse as Mouse
-from pynput import keyboard as Keyboard
 
 import gi
 gi.require_version('Wnck', '3.0')
 from gi.repository import Wnck
 
-import pyximport; pyximport.install()  # Required for EyeTrackerGaze
-
-from lib.py.app import app_config, warn
+from lib.py.app import app_config, warn, startup_profile_report, pyx_install
+pyx_install()  # Required for EyeTrackerGaze
 from lib.py.eyetracker_gaze import EyeTrackerGaze
 from lib.py.hud_panel import HUDKeyboardPanel, HUDStatusPanel
 from lib.py.hud_learn import HUDLearn
+from lib.py.hud_latency import HUDLatencyStats
+from lib.py.hud_keystroke import HUDKeystrokeDispatcher
+from lib.py.hud_cmd import HUDCmdRunner
+from lib.py.hud_hittest import HUDButtonIndex
 
 
 # App config elements
@@ -37,6 +42,7 @@ HUD_DISP_DIV_X = app_config('HUD_DISP_COORD_DIVISOR_X')
 HUD_DISP_DIV_Y = app_config('HUD_DISP_COORD_DIVISOR_Y')
 HUD_DISP_TITLE = app_config('HUD_DISP_TITLE')
 HUD_KEYB_JSON =  app_config('HUD_KEYB_JSON')
+GAZE_REFINE_ONLINE = app_config('GAZE_REFINE_ONLINE')
 
 # HUD styles
 HUD_STYLE = 'HUD.TFrame'
@@ -53,12 +59,23 @@ VK_NUMLOCK = 65407
 VK_SCROLLLOCK = 65300
 VK_MODLOCK = 65515
 
+# Modifier VKey codes, by the modifier they denote (e.g. l/r shift -> shift)
+VK_MODIFIERS = {65505: 'shift', 65506: 'shift',
+                65507: 'ctrl', 65508: 'ctrl',
+                65513: 'alt', 65514: 'alt',
+                65027: 'alt_gr'}
+
 # Multiproccessing attribites
-SIGNAL_STOP = -1
-SIGNAL_REQUEST_ACTIVE_WINDOW = 0
-SIGNAL_REQUEST_PREV_ACTIVE_WINDOW = 1
-ASYNC_WIN_DELAY = .005
+ASYNC_WIN_TIMEOUT = .25     # Max secs the win state watcher blocks per wait
 ASYNC_POS_DELAY = .1
+ASYNC_DWELL_TIMEOUT = .25   # Max secs the dwell watcher blocks per wait
+
+# Shared win state indices -- see _HUDState._async_winstate_watcher
+WIN_STATE_SEQ = 0           # Seqlock sequence number. Odd while writing
+WIN_STATE_ACTIVE = 1        # The currently active window's ID
+WIN_STATE_PREV = 2          # The previously active window's ID
+WIN_STATE_USER = 3          # The most recently active non-HUD window's ID
+WIN_STATE_SZ = 4
 
 
 class HUD(tk.Tk):
@@ -106,12 +123,22 @@ class HUD(tk.Tk):
         # Setup child frame for hosting the panel frames
         self._host_frame = ttk.Frame(
             self, width=frame_width, height=HUD_DISP_HEIGHT)
+
+        # Init the btn payload latency stats, iff enabled by config
+        self.latency_stats = HUDLatencyStats()
+
+        # Init the btn hit-test index, built once the layout is done and
+        # rebuilt on each HUD geometry change
+        self.btn_index = HUDButtonIndex()
+        self._btn_index_geometry = None
+        self._btn_index_pending = False
         
         # Init the HUD state mgr
         self.state = _HUDState(self, mode)
         
         # Setup the HUD's panel
         self._init_panels()
+        self.bind('<Configure>', self._on_configure)
  
     def _quit(self, **kwargs):
         """ Quits the hud window by exiting tk.mainloop.
@@ -131,7 +158,9 @@ class HUD(tk.Tk):
         # Set sticky attribute so hud appears on all workspaces
         self.update_idletasks()
         self.update()
+        self._rebuild_btn_index()
         self.state.set_hud_sticky()
+        startup_profile_report()
 
         # Start the blocking main loop
         self.mainloop()
@@ -153,6 +182,32 @@ class HUD(tk.Tk):
                                            hud=self,
                                            grid_col=1)
 
+    def _on_configure(self, event):
+        """ Schedules a rebuild of the btn hit-test index iff the HUD's
+            geometry changed. Configure events of the HUD's child widgets
+            are ignored.
+        """
+        if event.widget is not self:
+            return
+
+        geometry = (event.x, event.y, event.width, event.height)
+
+        if geometry == self._btn_index_geometry:
+            return
+
+        self._btn_index_geometry = geometry
+
+        if not self._btn_index_pending:
+            self._btn_index_pending = True
+            self.after_idle(self._rebuild_btn_index)
+
+    def _rebuild_btn_index(self):
+        """ Rebuilds the btn hit-test index from the panels' current btns.
+        """
+        self._btn_index_pending = False
+        self.btn_index.rebuild(
+            self.keyb_panel.panel_btns + self.status_panel.panel_btns)
+
     def set_btn_viz_toggle(self, btn, toggle_on=False):
         """ Sets a btn as toggled on, visually.
         """
@@ -167,7 +222,8 @@ class HUD(tk.Tk):
 
             :param btn: (hud_panel.HUDButton)
         """
-        self.state._payload_handler(btn, payload, payload_type)
+        with self.latency_stats.stage(f'payload.{payload_type}'):
+            self.state._payload_handler(btn, payload, payload_type)
 
 class _HUDState(object):
     def __init__(self, parent_hud, mode):
@@ -180,6 +236,7 @@ class _HUDState(object):
             :param mode: (str) Either 'collect', 'train', or 'infer'.
         """
         self.hud = parent_hud
+        self._mode = mode
 
         # Init XLib root/disp
         self._disp = Xlib.display.Display()
@@ -187,107 +244,182 @@ class _HUDState(object):
         self._root.change_attributes(event_mask=Xlib.X.FocusChangeMask)
         self._net_wm_name = self._disp.intern_atom('_NET_WM_NAME')
 
-        # Init keyboard/mouse/ml controllers
+        # Init mouse/ml controllers
         self._learn = HUDLearn(self)
         self._mouse = Mouse.Controller()
-        self._keyboard = Keyboard.Controller()
 
-        # Init gazetracking module
+        # Init the keystroke dispatcher, which sends keys to the user's window
+        self._keystrokes = HUDKeystrokeDispatcher(self.hud.latency_stats)
+
+        # Init the external cmd runner, for run_external payloads
+        self._cmds = HUDCmdRunner(self.hud)
+
+        # Init gazetracking module. Iff inferring, its models are the native
+        # exports of the trained models -- exported now if trained before
+        # native models were exported by training
         self._cursor_captured = False
+
+        if mode == 'infer':
+            self._learn.export_native_models()
+
         self._gazetracker = EyeTrackerGaze(
-            self._learn.model_x_path if mode == 'infer' else None,
-            self._learn.model_y_path if mode == 'infer' else None)
+            self._learn.model_x_native_path if mode == 'infer' else None,
+            self._learn.model_y_native_path if mode == 'infer' else None)
+
+        # Iff inferring, each btn click refines the gaze coords online
+        self._refine_online = mode == 'infer' and GAZE_REFINE_ONLINE
 
         # Keyboard modifer state containers
         self._keyboard_active_modifier_btns = []
+        self._keyboard_modifiers = {}   # Active modifier vks, by VK_MODIFIERS
         self._keyboard_hold_modifiers = False
+        self._keyboard_caps_lock = False
 
-        # Async (via multi-processing) win state watcher attributes
+        # Async (via multi-processing) win state watcher attributes. The
+        # watcher publishes the win state to shared mem, as WIN_STATE_*
+        ctx = mp.get_context('fork')
         self._async_proc_win = None
-        self._async_signal_q_win = None
-        self._async_output_q_win = None
+        self._async_stop_win = ctx.Event()
+        self._win_state = ctx.RawArray(ctypes.c_uint64, WIN_STATE_SZ)
 
         # Async (via threading) user pos watcher attributes
         self._async_proc_pos = None
 
-    @property
-    def active_window(self):
-        """ Returns an Xlib.Window obj for the currently active window.
+        # Async (via threading) dwell watcher attributes, for gaze clicking
+        self._async_proc_dwell = None
+        self._async_stop_dwell = Event()
+
+        # The btn last clicked by the dwell watcher, iff its click is not yet
+        # handled. Dwell clicks target the gaze itself, so aren't refined on
+        self._dwell_click_btn = None
+
+    def _win_state_id(self, idx):
+        """ Returns the window ID at the given WIN_STATE_* index of the shared
+            win state, as last published by the win state watcher. The read
+            is lock-free -- it's retried iff it overlapped a write.
         """
-        # Request currently active window ID from async queue
-        try:
-            self._async_signal_q_win.put_nowait(SIGNAL_REQUEST_ACTIVE_WINDOW)
-        except AttributeError:
+        state = self._win_state
+
+        while True:
+            seq = state[WIN_STATE_SEQ]
+            window_id = state[idx]
+
+            if seq % 2 == 0 and state[WIN_STATE_SEQ] == seq:
+                return window_id
+
+    def _win_state_window(self, idx):
+        """ Returns an Xlib.Window obj for the window ID at the given
+            WIN_STATE_* index of the shared win state, or None if no such
+            window has been seen.
+        """
+        if self._async_proc_win is None:
             warn('Requested win state but Win State Watcher not yet started.')
 
-        # Receive ID from asyc queue and return its derived window obj
-        window_id = self._async_output_q_win.get()
+        window_id = self._win_state_id(idx)
+
+        if not window_id:
+            return None
+
         return self._disp.create_resource_object('window', window_id)
 
+    @property
+    def active_window(self):
+        """ Returns an Xlib.Window obj for the currently active window.
+        """
+        return self._win_state_window(WIN_STATE_ACTIVE)
+
     @property
     def prev_active_window(self):
         """ Returns an Xlib.Window obj for the previously active window.
         """
-        # Request prev active window ID from async queue
-        try:
-            self._async_signal_q_win.put_nowait(SIGNAL_REQUEST_PREV_ACTIVE_WINDOW)
-        except AttributeError:
-            warn('Requested win state but Win State Watcher not yet started.')
+        return self._win_state_window(WIN_STATE_PREV)
 
-        # Receive ID from asyc queue and return its derived window obj
-        window_id = self._async_output_q_win.get()
-        return self._disp.create_resource_object('window', window_id)
+    @property
+    def user_window(self):
+        """ Returns an Xlib.Window obj for the most recently active window
+            other than the HUD, i.e. the window the user is working in.
+        """
+        return self._win_state_window(WIN_STATE_USER)
 
-    def _async_winstate_watcher(self, signal_queue, output_queue):
+    def _async_winstate_watcher(self, stop_event, state):
         """ The asynchronous window state watcher. Intended to be run as a
-            multiprocessing.Process.
+            multiprocessing.Process. Blocks on the X server's PropertyNotify
+            events, waking (at least every ASYNC_WIN_TIMEOUT secs, to check
+            the stop event) only to publish the active window's changes to
+            the given shared win state.
         """
         # Init local XLib root/disp, for thread safety
         disp = Xlib.display.Display()
         root = disp.screen().root
-        root.change_attributes(event_mask=Xlib.X.FocusChangeMask)
+        root.change_attributes(event_mask=Xlib.X.PropertyChangeMask)
         prop_atom = disp.intern_atom('_NET_ACTIVE_WINDOW')
+        name_atom = disp.intern_atom('_NET_WM_NAME')
+        hud_title = HUD_DISP_TITLE.encode()
+
+        def _is_hud(window_id):
+            """ Returns True iff the given window is the HUD's.
+            """
+            window = disp.create_resource_object('window', window_id)
+
+            try:
+                name = window.get_full_property(
+                    name_atom, Xlib.X.AnyPropertyType)
+                name = name.value if name else window.get_wm_name()
+            except Xlib.error.XError:
+                return False
+
+            if isinstance(name, str):
+                name = name.encode()
+
+            return name == hud_title
+
+        def _publish(active_id, prev_id, user_id):
+            """ Writes the given window IDs to the shared win state, bracketed
+                by seqlock sequence increments for lock-free readers.
+            """
+            state[WIN_STATE_SEQ] += 1
+            state[WIN_STATE_ACTIVE] = active_id
+            state[WIN_STATE_PREV] = prev_id
+            state[WIN_STATE_USER] = user_id
+            state[WIN_STATE_SEQ] += 1
 
         # Window states we'll track
-        active_window_id = None
-        prev_active_window_id = None
+        active_window_id = 0
+        prev_active_window_id = 0
+        user_window_id = 0
+        changed = True  # Read the initial state
         
-        while True:
-            # Watch for window state changes to track the curr/prev focus
-            window_id = root.get_full_property(
-                prop_atom, Xlib.X.AnyPropertyType).value[0]
-            
-            if window_id:
-                window = disp.create_resource_object('window', window_id)
-                window.change_attributes(event_mask=Xlib.X.PropertyChangeMask)
-                
-                # Denote the currently/previously active windows
-                if not active_window_id:
-                    active_window_id = window_id
-                elif window_id != active_window_id:
+        while not stop_event.is_set():
+            # Denote the active window iff changed, then publish its state
+            if changed:
+                prop = root.get_full_property(
+                    prop_atom, Xlib.X.AnyPropertyType)
+                window_id = prop.value[0] if prop else 0
+
+                if window_id and window_id != active_window_id:
                     prev_active_window_id = active_window_id
                     active_window_id = window_id
 
-            # Check the signal queue for any signals to process. It is assumed
-            # that for a signal other than STOP to be enqued a state change
-            # has occured and is ready to be read via next_event()
-            try:
-                signal = signal_queue.get_nowait()
-            except mp.queues.Empty:
-                sleep(ASYNC_WIN_DELAY)
-            else:
-                # Process stop signal, iff received
-                if signal == SIGNAL_STOP:
-                    break
+                    if not _is_hud(window_id):
+                        user_window_id = window_id
 
-                # Process any "get" requests received (note above assumption)
-                disp.next_event()
+                    _publish(active_window_id,
+                             prev_active_window_id,
+                             user_window_id)
 
-                if signal == SIGNAL_REQUEST_ACTIVE_WINDOW:
-                    output_queue.put_nowait(active_window_id)
+                changed = False
 
-                elif signal == SIGNAL_REQUEST_PREV_ACTIVE_WINDOW:
-                    output_queue.put_nowait(prev_active_window_id)
+            # Block until there are events to process, or timeout
+            if not disp.pending_events():
+                select.select([disp], [], [], ASYNC_WIN_TIMEOUT)
+
+            # Process any events, noting any active window change
+            while disp.pending_events():
+                event = disp.next_event()
+
+                if (event.type == Xlib.X.PropertyNotify and
+                        event.atom == prop_atom):
+                    changed = True
 
     def _async_userpos_watcher(self, gazetracker, hud_status_panel):
         """ Update the user position guide every ASYNC_TIME seconds. Intended
@@ -297,14 +429,46 @@ class _HUDState(object):
             hud_status_panel.set_user_posguide(gazetracker.user_position())
             sleep(ASYNC_POS_DELAY)
 
+    def _async_dwell_watcher(self, gazetracker, stop_event):
+        """ Clicks the mouse at each dwell (i.e. held fixation) detected by
+            the gazetracker. Intended to be run as a thread. Blocks until a
+            dwell is detected, waking (at least every ASYNC_DWELL_TIMEOUT
+            secs) only to check the stop event.
+        """
+        while not stop_event.is_set():
+            dwell = gazetracker.dwell_wait(timeout=ASYNC_DWELL_TIMEOUT)
+
+            if dwell is None or stop_event.is_set():
+                continue
+
+            # Iff the dwell's on a HUD btn, click that btn's center
+            x, y = int(dwell['x_coord']), int(dwell['y_coord'])
+            btn = self.hud.btn_index.lookup(x, y)
+
+            self._dwell_click_btn = btn
+            self._mouse.position = btn.centroid if btn else (x, y)
+            self.do_mouse_press()
+            self.do_mouse_release()
+
+    def _stop_dwell_watcher(self):
+        """ Stops the dwell watcher, iff running, and disables dwell
+            detection.
+        """
+        if self._async_proc_dwell is None:
+            return
+
+        self._async_stop_dwell.set()
+        self._async_proc_dwell.join()
+        self._async_proc_dwell = None
+        self._gazetracker.dwell_enable(False)
+
     def _focus_prev_active_win(self):
-        """ Sets the previously active window to be the active window.
-            Intended to be used when the HUD takes focus via a HUD btn click
-            and we want to return focus to the window the HUD stole focus from.
+        """ Queues a focus change to the user's window (i.e. the last active
+            non-HUD window). Intended to be used when the HUD takes focus via
+            a HUD btn click and we want to return focus to the window the HUD
+            stole focus from.
         """
-        # Get prev focused window, then give it focus
-        w = self.prev_active_window
-        self.set_active_window(w)
+        self._keystrokes.focus(self._win_state_id(WIN_STATE_USER))
 
     def _reset_keyb_modifers(self, toggle_btnviz=True):
         """ Resets all active keyboard modifiers, such as alt, shift, etc.,
@@ -314,9 +478,10 @@ class _HUDState(object):
             states are also reset.
         """
         # Clear all modifiers
-        with self._keyboard.modifiers as modifiers:
-            for m in modifiers:
-                self._keyboard.release(m)
+        if self._keyboard_modifiers:
+            self._keystrokes.release(self._win_state_id(WIN_STATE_USER),
+                                     *self._keyboard_modifiers.values())
+            self._keyboard_modifiers = {}
 
         # Toggle-off all active modifier btns and alternate btn texts 
         if toggle_btnviz:
@@ -333,7 +498,8 @@ class _HUDState(object):
         """
         # Infer the correct handler to call
         payload_type_handler = {
-            # TODO: 'mouse_click_toggle': 
+            # Toggle gaze (i.e. dwell) clicking on/off
+            'mouse_click_toggle': self.payload_mouse_click_toggle,
 
             # TODO: 'data_collect_toggle': 
 
@@ -356,6 +522,16 @@ class _HUDState(object):
         if not payload_type_handler:
             raise NotImplementedError(f'Payload type: {payload_type}')
 
+        # Denote whether the click was the dwell watcher's. Clicks are handled
+        # in order, so any later click is not
+        dwell_click_btn, self._dwell_click_btn = self._dwell_click_btn, None
+
+        # The user was looking at the btn they clicked, so learn from it --
+        # unless it was a dwell click, whose btn was picked from the gaze
+        if self._refine_online and btn is not dwell_click_btn:
+            with self.hud.latency_stats.stage('refine'):
+                self._gazetracker.refine(*btn.centroid)
+
         # Handle the btns payload
         payload_type_handler(btn=btn, 
                              payload=payload,
@@ -372,19 +548,27 @@ class _HUDState(object):
         else:
             # Start the state watcher
             ctx = mp.get_context('fork')
-            self._async_signal_q_win = ctx.Queue(maxsize=1)
-            self._async_output_q_win = ctx.Queue(maxsize=1)
+            self._async_stop_win.clear()
             self._async_proc_win = ctx.Process(
                 target=self._async_winstate_watcher, 
-                args=(self._async_signal_q_win, self._async_output_q_win))
+                args=(self._async_stop_win, self._win_state))
             self._async_proc_win.start()
 
+            # Start the keystroke dispatcher and external cmd runner
+            self._keystrokes.start()
+            self._cmds.start()
+
             # Start the eyetracker
             self._gazetracker.open()
             self._gazetracker.start()
+
+            # Iff inferring, pick up retrained models as they're written
+            if self._mode == 'infer':
+                self._gazetracker.start_model_watcher()
             
             # Give time to spin up
-            sleep(1)
+            if not self._gazetracker.wait_for_data(timeout=1):
+                warn('No gaze data received from the eyetracker yet.')
 
             # Start the user pos guide updater
             self._async_proc_pos = Thread(
@@ -401,13 +585,13 @@ class _HUDState(object):
         self._reset_keyb_modifers(toggle_btnviz=False)
 
         # Send kill signal to the asynch procs
-        try:
-            self._async_signal_q_win.put_nowait(SIGNAL_STOP)
-        except AttributeError:
+        if self._async_proc_win is None:
             warn('Received STOP but HUD State Manager not yet started.')
-        except mp.queues.Full:
-            pass
         else:
+            self._async_stop_win.set()
+            self._stop_dwell_watcher()
+            self._keystrokes.stop()
+            self._cmds.stop()
             self._gazetracker.stop()
             self._gazetracker.close()
 
@@ -450,30 +634,21 @@ class _HUDState(object):
 
         del screen
 
-    def set_active_window(self, window):
-        """ Gives focus to the given window.
-        """
-        window.set_input_focus(Xlib.X.RevertToParent, Xlib.X.CurrentTime)
-        window.configure(stack_mode=Xlib.X.Above)
-        self._disp.sync()
-
     def payload_keystroke_to_active_win(self, **kwargs):
         """ Sends the given payload to the previously active (very recently
             the actually-active, but we just stole its focus by clicking a HUD
             button) window. In the process, focus is restored to that window
-            and any keyboard modifiers are unset.
+            and any keyboard modifiers are unset. The keystroke is queued for
+            the keystroke dispatcher, so this returns without waiting on X.
 
             :param kwargs: Arg 'payload' is expected.
         """
-        self._focus_prev_active_win()
-        
         # Extract kwarg
-        payload = kwargs['payload']     # (str)
+        payload = kwargs['payload']     # (int) Key vk code
 
-        # Convert the payload to a KeyCode obj, then do keypress
-        payload = self._keyboard._KeyCode.from_vk(payload)
-        self._keyboard.press(payload)
-        self._keyboard.release(payload)
+        # Queue the keypress to the user's window, refocusing it first
+        self._keystrokes.keystroke(
+            self._win_state_id(WIN_STATE_USER), payload, refocus=True)
 
         # Clear any modifers (ex: alt, shift, etc.) iff not hold set
         if not self._keyboard_hold_modifiers:
@@ -491,6 +666,7 @@ class _HUDState(object):
         # Extract kwargs
         payload = kwargs['payload']     # (int) Key vk code
         sender = kwargs['btn']          # (HUDPanel.HUDButton) Payload sender
+        window_id = self._win_state_id(WIN_STATE_USER)
         
         # Ensure modifier is supported
         if payload == VK_NUMLOCK:
@@ -498,15 +674,12 @@ class _HUDState(object):
         elif payload == VK_SCROLLLOCK:
             raise NotImplementedError('ScrollLock')
 
-        # Convert payload to KeyCode and denote capslock status
-        keycode = self._keyboard._KeyCode.from_vk(payload)
-        
         # If payload is for capslock, handle as a single-click modifier
         if payload == VK_CAPSLOCK:
-            self._keyboard.press(keycode)
-            self._keyboard.release(keycode)
+            self._keystrokes.keystroke(window_id, payload)
+            self._keyboard_caps_lock = not self._keyboard_caps_lock
             self.hud.set_btn_viz_toggle(
-                sender, toggle_on=self._keyboard._caps_lock)
+                sender, toggle_on=self._keyboard_caps_lock)
 
         # Else, if payload is the hold-modifer btn
         elif payload == VK_MODLOCK:
@@ -517,34 +690,35 @@ class _HUDState(object):
             
         # Else, handle press/releases modifier (ex: alt, shift, etc.)
         else:
-            with self._keyboard.modifiers as modifiers:
-                modifier = self._keyboard._as_modifier(keycode)
+            modifier = VK_MODIFIERS.get(payload)
 
-                if not modifier:
-                    raise ValueError(f'Unsupported modifier: {keycode}')
+            if not modifier:
+                raise ValueError(f'Unsupported modifier: {payload}')
 
-                # If btn not previously in the down state, send keypress
-                if modifier not in [m for m in modifiers]:
-                    toggle_down = True
-                    self._keyboard.press(keycode)
-                    self._keyboard_active_modifier_btns.append(sender)
+            # If btn not previously in the down state, send keypress
+            if modifier not in self._keyboard_modifiers:
+                toggle_down = True
+                self._keystrokes.press(window_id, payload)
+                self._keyboard_modifiers[modifier] = payload
+                self._keyboard_active_modifier_btns.append(sender)
 
-                # else, send key release
+            # else, send key release
+            else:
+                toggle_down = False
+                try:
+                    self._keyboard_active_modifier_btns.remove(sender)
+                except ValueError:
+                    # Will occur if, say, l_shift set but r_shift clicked
+                    warn('Attempted to unset a modifier that was not set.')
+                    return
                 else:
-                    toggle_down = False
-                    try:
-                        self._keyboard_active_modifier_btns.remove(sender)
-                    except ValueError:
-                        # Will occur if, say, l_shift set but r_shift clicked
-                        warn('Attempted to unset a modifier that was not set.')
-                        return
-                    else:
-                        self._keyboard.release(keycode)
-
-                # Update btn state according to new toggle state
-                self.hud.set_btn_viz_toggle(sender, toggle_on=toggle_down)
-                if modifier == self._keyboard._Key.shift:
-                    self.hud.keyb_panel.set_btn_text(use_alt_text=toggle_down)
+                    self._keystrokes.release(window_id, payload)
+                    del self._keyboard_modifiers[modifier]
+
+            # Update btn state according to new toggle state
+            self.hud.set_btn_viz_toggle(sender, toggle_on=toggle_down)
+            if modifier == 'shift':
+                self.hud.keyb_panel.set_btn_text(use_alt_text=toggle_down)
 
     def payload_cursor_cap_toggle(self, **kwargs):
         """ Toggles cursor capture on/off.
@@ -557,8 +731,32 @@ class _HUDState(object):
         self.hud.set_btn_viz_toggle(sender, toggle_on=self._cursor_captured)
         self._gazetracker.set_cursor_cap(self._cursor_captured)
 
+    def payload_mouse_click_toggle(self, **kwargs):
+        """ Toggles gaze clicking on/off -- While on, the mouse is clicked at
+            each dwell (i.e. held fixation) of the user's gaze.
+
+            :param kwargs: Arg 'btn' is expected.
+        """
+        sender = kwargs['btn']          # (HUDPanel.HUDButton) Payload sender
+
+        toggle_on = self._async_proc_dwell is None
+        self.hud.set_btn_viz_toggle(sender, toggle_on=toggle_on)
+
+        if not toggle_on:
+            self._stop_dwell_watcher()
+            return
+
+        self._gazetracker.dwell_enable(True)
+        self._async_stop_dwell.clear()
+        self._async_proc_dwell = Thread(
+            target=self._async_dwell_watcher,
+            args=(self._gazetracker, self._async_stop_dwell))
+        self._async_proc_dwell.start()
+
     def payload_run_external(self, **kwargs):
-        """ Runs the external cmd given by the payload.
+        """ Runs the external cmd given by the payload. The cmd is queued for
+            the cmd runner, so this returns without waiting on it -- its
+            result is handled by _run_external_done.
 
             :param kwargs: Arg 'payload' is expected.
         """
@@ -567,16 +765,32 @@ class _HUDState(object):
         # Extract kwarg
         payload = kwargs['payload']     # (str) Well-formatted python list
 
-        # Ensure cmd given as a list of the cmd and its args
-        cmd = eval(payload)
-        if not cmd or not isinstance(cmd, list):
+        # Parse the cmd, as a list of the cmd and its args, as a literal only
+        try:
+            cmd = ast.literal_eval(payload)
+        except (ValueError, SyntaxError):
+            cmd = None
+
+        if not cmd or not isinstance(cmd, list) or \
+                not all(isinstance(arg, str) for arg in cmd):
             raise ValueError(f'Invalid cmd format: {payload}')
 
-        # Run the cmd
-        proc = Popen(cmd, stderr=PIPE)
-        stderr = proc.communicate()[1]
-        proc.wait()
+        # Queue the cmd to be run
+        self._cmds.run(cmd, self._run_external_done)
 
-        # If there were build errors, quit
-        if stderr and not stderr.decode().startswith('Created symlink'):
-            warn(f'Cmd "{cmd}" stderr output: \n{stderr}')
+    def _run_external_done(self, result):
+        """ Warns of the given external cmd result's failure or stderr output,
+            if any. Called on the Tk main loop.
+
+            :param result: (hud_cmd.HUDCmdResult)
+        """
+        if result.cancelled:
+            return
+
+        if result.timed_out:
+            warn(f'Cmd "{result.cmd}" timed out.')
+        elif not result.ok:
+            warn(f'Cmd "{result.cmd}" failed ({result.returncode}): \n'
+                 f'{result.stderr}')
+        elif result.stderr and not result.stderr.startswith('Created symlink'):
+            warn(f'Cmd "{result.cmd}" stderr output: \n{result.stderr}')
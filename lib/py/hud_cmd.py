@@ -0,0 +1,253 @@
+""" The HUD's external command runner. Runs the cmds of the HUD's
+    run_external btns on a bounded worker pool, so that long-running cmds
+    don't block the HUD, and reports their results back on the Tk main loop.
+"""
+
+__author__ = 'Dustin Fast <dustin.fast@outlook.com>'
+
+import queue
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import Popen, PIPE, TimeoutExpired
+
+from lib.py.app import app_config, warn
+
+
+CMD_WORKERS = app_config('HUD_CMD_WORKERS')
+CMD_MAX_PENDING = app_config('HUD_CMD_MAX_PENDING')
+CMD_TIMEOUT = app_config('HUD_CMD_TIMEOUT_SECONDS')
+CMD_LOG_PATH = app_config('HUD_CMD_LOG_PATH')
+
+CMD_POLL_MS = 50            # Results poll interval, on the Tk main loop
+CMD_KILL_TIMEOUT = 1        # Max secs to await a killed cmd's exit
+
+
+class HUDCmdResult(object):
+    def __init__(self, cmd, returncode, stdout, stderr, timed_out=False,
+                 cancelled=False):
+        """ The result of an external cmd run.
+
+            :param cmd: (list) The cmd and its args.
+            :param returncode: (int) The cmd's exit code, or None if it never
+            ran.
+            :param stdout: (str) The cmd's stdout output.
+            :param stderr: (str) The cmd's stderr output.
+            :param timed_out: (bool) Denotes the cmd was killed on timeout.
+            :param cancelled: (bool) Denotes the cmd was cancelled.
+        """
+        self.cmd = cmd
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+
+    @property
+    def ok(self):
+        """ Returns True iff the cmd ran to completion and exited cleanly.
+        """
+        return self.returncode == 0 and not self.timed_out
+
+
+class HUDCmdRunner(object):
+    def __init__(self, hud, workers=CMD_WORKERS, max_pending=CMD_MAX_PENDING,
+                 timeout=CMD_TIMEOUT, log_path=CMD_LOG_PATH):
+        """ An abstraction of the external cmd runner. Cmds are run by a pool
+            of worker threads, each cmd's output is appended to the cmd log,
+            and its result is handed to its callback on the Tk main loop.
+
+            :param hud: (HUD) The HUD, on whose main loop results are handled.
+            :param workers: (int) Max cmds run at once.
+            :param max_pending: (int) Max cmds awaiting a worker -- cmds given
+            beyond that are rejected.
+            :param timeout: (float) Secs after which a cmd is killed, or 0 for
+            no timeout.
+            :param log_path: (str) The file cmd output is appended to.
+        """
+        self.hud = hud
+        self._timeout = timeout or None
+        self._log_path = log_path
+        self._log_lock = threading.Lock()
+
+        self._pool = None
+        self._workers = workers
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._results = queue.Queue()   # (callback, HUDCmdResult) tuples
+        self._handles = set()           # Handles of pending/running cmds
+        self._handles_lock = threading.Lock()
+        self._poll_id = None
+
+    def _log(self, result):
+        """ Appends the given cmd result, and its output, to the cmd log.
+        """
+        status = 'timed out' if result.timed_out else \
+            'cancelled' if result.cancelled else \
+            'failed to start' if result.returncode is None else \
+            f'exited {result.returncode}'
+
+        with self._log_lock:
+            try:
+                with open(self._log_path, 'a') as f:
+                    f.write(f'[{datetime.now().isoformat()}] {result.cmd} '
+                            f'{status}\n')
+                    if result.stdout:
+                        f.write(f'stdout:\n{result.stdout}\n')
+                    if result.stderr:
+                        f.write(f'stderr:\n{result.stderr}\n')
+            except OSError as e:
+                warn(f'Failed to write cmd log {self._log_path}: {e}')
+
+    def _run(self, handle):
+        """ Runs the given cmd to completion, timeout, or cancellation.
+            Intended to be run by a pool worker.
+        """
+        cmd = handle.cmd
+
+        try:
+            # Run the cmd, denoting its proc for cancellation
+            with self._handles_lock:
+                if handle.cancel_requested:
+                    return HUDCmdResult(cmd, None, '', '', cancelled=True)
+
+                try:
+                    handle.proc = Popen(cmd, stdout=PIPE, stderr=PIPE,
+                                        universal_newlines=True)
+                except OSError as e:
+                    return HUDCmdResult(cmd, None, '', str(e))
+
+            # Await its exit, killing it on timeout
+            proc = handle.proc
+
+            try:
+                stdout, stderr = proc.communicate(timeout=self._timeout)
+                timed_out = False
+            except TimeoutExpired:
+                proc.kill()
+                stdout, stderr = proc.communicate()
+                timed_out = True
+
+            return HUDCmdResult(cmd, proc.returncode, stdout, stderr,
+                                timed_out=timed_out,
+                                cancelled=handle.cancel_requested)
+
+        finally:
+            with self._handles_lock:
+                self._handles.discard(handle)
+
+            self._slots.release()
+
+    def _worker(self, handle, callback):
+        """ Runs the given cmd, then logs its result and queues it for its
+            callback. Intended to be run by a pool worker.
+        """
+        result = self._run(handle)
+        self._log(result)
+        self._results.put((callback, result))
+
+    def _poll_results(self):
+        """ Hands each finished cmd's result to its callback. Intended to be
+            run on the Tk main loop, which it reschedules itself on.
+        """
+        while True:
+            try:
+                callback, result = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            if callback:
+                callback(result)
+
+        self._poll_id = self.hud.after(CMD_POLL_MS, self._poll_results)
+
+    def run(self, cmd, callback=None):
+        """ Queues the given cmd to be run. Returns a handle to it, for use
+            with cancel(), or None if the cmd was rejected because the runner
+            is at capacity.
+
+            :param cmd: (list) The cmd and its args.
+            :param callback: (callable) Called with the cmd's HUDCmdResult,
+            on the Tk main loop, once it's finished.
+        """
+        if self._pool is None:
+            warn('Cmd given but Cmd Runner not yet started.')
+            return None
+
+        if not self._slots.acquire(blocking=False):
+            warn(f'Cmd runner at capacity -- dropped cmd "{cmd}".')
+            return None
+
+        handle = _CmdHandle(cmd)
+
+        with self._handles_lock:
+            self._handles.add(handle)
+
+        self._pool.submit(self._worker, handle, callback)
+
+        return handle
+
+    def cancel(self, handle):
+        """ Cancels the given cmd, killing it iff already running.
+
+            :param handle: (_CmdHandle) The handle returned by run().
+        """
+        with self._handles_lock:
+            handle.cancel_requested = True
+            proc = handle.proc
+
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    def start(self):
+        """ Starts the worker pool and the results poll.
+        """
+        if self._pool is not None:
+            warn('Cmd Runner already running.')
+            return
+
+        self._pool = ThreadPoolExecutor(max_workers=self._workers,
+                                        thread_name_prefix='hud_cmd')
+        self._poll_id = self.hud.after(CMD_POLL_MS, self._poll_results)
+
+    def stop(self):
+        """ Stops the runner, cancelling pending cmds and killing running ones.
+        """
+        if self._pool is None:
+            warn('Received STOP but Cmd Runner not yet started.')
+            return
+
+        if self._poll_id is not None:
+            self.hud.after_cancel(self._poll_id)
+            self._poll_id = None
+
+        # Cancel each pending/running cmd. Pending cmds are then discarded
+        # by the workers, as they reach them
+        with self._handles_lock:
+            handles = list(self._handles)
+
+        for handle in handles:
+            self.cancel(handle)
+
+        self._pool.shutdown(wait=False)
+        self._pool = None
+
+        # Await the killed cmds' exit
+        for handle in handles:
+            if handle.proc is None:
+                continue
+
+            try:
+                handle.proc.wait(CMD_KILL_TIMEOUT)
+            except TimeoutExpired:
+                warn(f'Cmd "{handle.cmd}" did not exit on kill.')
+
+
+class _CmdHandle(object):
+    def __init__(self, cmd):
+        """ A handle to a cmd given to HUDCmdRunner.run().
+
+            :param cmd: (list) The cmd and its args.
+        """
+        self.cmd = cmd
+        self.proc = None
+        self.cancel_requested = False
@@ -0,0 +1,93 @@
+""" A spatial index over the HUD's buttons, for mapping on-screen coords (e.g.
+    a gaze point) to the button there without any Tk calls.
+"""
+
+__author__ = 'Dustin Fast <dustin.fast@outlook.com>'
+
+
+HIT_CELL_PX = 8     # Grid cell size. Each cell is overlapped by few btns
+
+
+class HUDButtonIndex(object):
+    def __init__(self, cell_px=HIT_CELL_PX):
+        """ A grid-bucket index of the HUD's button rects, in on-screen
+            coords. Each grid cell lists the (few) btns whose rects overlap
+            it, so lookup() is O(1). The index is built by rebuild(), which
+            queries Tk for each btn's geometry, and is intended to be rebuilt
+            only when the HUD's geometry changes.
+
+            :param cell_px: (int) The grid's cell size, in pixels.
+        """
+        self._cell_px = cell_px
+
+        # The index, as (x0, y0, n_cols, n_rows, cells, rects, btns). It's
+        # swapped in whole by rebuild(), so lookup() may be called from any
+        # thread.
+        self._index = (0, 0, 0, 0, [], [], [])
+
+    def __len__(self):
+        """ Returns the number of btns indexed.
+        """
+        return len(self._index[-1])
+
+    def rebuild(self, btns):
+        """ Rebuilds the index from the given btns' current on-screen
+            geometry. Each btn's cached centroid is also updated. Must be
+            called from the Tk main loop, once the HUD's layout is done.
+
+            :param btns: (list) Of hud_panel.HUDPanelButton.
+        """
+        cell_px = self._cell_px
+        rects = []
+
+        # Get each btn's rect, as (left, top, right, bottom)
+        for btn in btns:
+            widget = btn.widget
+            left, top = widget.winfo_rootx(), widget.winfo_rooty()
+            width, height = widget.winfo_width(), widget.winfo_height()
+
+            rects.append((left, top, left + width, top + height))
+            btn._centroid = (left + int(width / 2), top + int(height / 2))
+
+        if not rects:
+            self._index = (0, 0, 0, 0, [], [], [])
+            return
+
+        # Size the grid to the btns' bounding box
+        x0 = min(r[0] for r in rects)
+        y0 = min(r[1] for r in rects)
+        n_cols = (max(r[2] for r in rects) - x0) // cell_px + 1
+        n_rows = (max(r[3] for r in rects) - y0) // cell_px + 1
+
+        # Denote each btn in each cell its rect overlaps
+        cells = [[] for _ in range(n_cols * n_rows)]
+
+        for i, (left, top, right, bottom) in enumerate(rects):
+            for row in range((top - y0) // cell_px,
+                             (bottom - 1 - y0) // cell_px + 1):
+                for col in range((left - x0) // cell_px,
+                                 (right - 1 - x0) // cell_px + 1):
+                    cells[row * n_cols + col].append(i)
+
+        self._index = (x0, y0, n_cols, n_rows,
+                       [tuple(c) for c in cells], rects, list(btns))
+
+    def lookup(self, x, y):
+        """ Returns the btn at the given on-screen coords, or None if there's
+            no btn there.
+        """
+        x0, y0, n_cols, n_rows, cells, rects, btns = self._index
+
+        col = (x - x0) // self._cell_px
+        row = (y - y0) // self._cell_px
+
+        if not (0 <= col < n_cols and 0 <= row < n_rows):
+            return None
+
+        for i in cells[row * n_cols + col]:
+            left, top, right, bottom = rects[i]
+
+            if left <= x < right and top <= y < bottom:
+                return btns[i]
+
+        return None
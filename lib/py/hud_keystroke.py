@@ -0,0 +1,188 @@
+""" The HUD's keystroke dispatcher. Sends the HUD's virtual keystrokes and
+    modifier press/releases to the user's window, via XTest, from its own
+    thread -- keeping X round trips off the Tk main loop.
+"""
+
+__author__ = 'Dustin Fast <dustin.fast@outlook.com>'
+
+import queue
+from time import perf_counter
+from threading import Thread
+
+import Xlib.X
+import Xlib.display
+import Xlib.ext.xtest
+
+from lib.py.app import warn
+
+
+DISPATCH_JOIN_TIMEOUT = 1   # Max secs stop() waits for queued keys to send
+
+
+class HUDKeystrokeDispatcher(object):
+    def __init__(self, latency_stats):
+        """ An abstraction of the keystroke dispatcher. Keystrokes and key
+            press/releases are queued, with the ID of the window they're
+            intended for, and sent in order by the dispatcher thread. Each
+            burst of queued keys is sent with a single X round trip. The
+            target window is re-focused before any keys queued with refocus
+            (i.e. those of a HUD btn click, which steals focus from it), and
+            whenever it changed.
+
+            :param latency_stats: (HUDLatencyStats) The stats keys' queue and
+            send latencies are added to.
+        """
+        self._latency_stats = latency_stats
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def _focus(self, disp, window_id):
+        """ Gives focus to, and raises, the given window. Not synced -- the X
+            server handles requests in order, so the focus change precedes
+            any keys sent after it.
+        """
+        window = disp.create_resource_object('window', window_id)
+
+        def _onerror(*args):
+            warn(f'Failed to focus window {window_id:#x}: {args[0]}')
+
+        window.set_input_focus(
+            Xlib.X.RevertToParent, Xlib.X.CurrentTime, onerror=_onerror)
+        window.configure(stack_mode=Xlib.X.Above, onerror=_onerror)
+
+    def _async_dispatcher(self, disp):
+        """ The asynchronous keystroke dispatcher. Intended to be run as a
+            thread. Blocks until keys are queued, then sends all those queued
+            as a single burst.
+
+            :param disp: (Xlib.display.Display) The thread's own XLib disp,
+            for thread safety.
+        """
+        keycodes = {}           # Keycode lookup cache, by keysym
+        target_window_id = 0    # The window we last gave focus to
+        stopping = False
+
+        while not stopping:
+            # Block until keys are queued, then drain the queue as a burst
+            burst = [self._queue.get()]
+
+            while True:
+                try:
+                    burst.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            t_start = perf_counter()
+
+            for job in burst:
+                # A None job is the stop signal -- send those before it, then
+                # stop
+                if job is None:
+                    stopping = True
+                    break
+
+                window_id, keys, refocus, t_queued = job
+
+                # Focus the target window iff changed, or focus was stolen
+                # (i.e. by the HUD itself, on btn click)
+                if window_id and (refocus or window_id != target_window_id):
+                    self._focus(disp, window_id)
+                    target_window_id = window_id
+
+                if not keys:
+                    continue
+
+                # Send the job's key press/releases, by keycode
+                for event_type, keysym in keys:
+                    try:
+                        keycode = keycodes[keysym]
+                    except KeyError:
+                        keycode = keycodes[keysym] = \
+                            disp.keysym_to_keycode(keysym)
+
+                    if not keycode:
+                        warn(f'No keycode for keysym: {keysym}')
+                        continue
+
+                    Xlib.ext.xtest.fake_input(disp, event_type, keycode)
+
+                self._latency_stats.add(
+                    'keystroke.queued', perf_counter() - t_queued)
+
+            # Send the burst, with a single round trip
+            disp.sync()
+            self._latency_stats.add('keystroke.burst', perf_counter() - t_start)
+
+        disp.close()
+
+    def _put(self, window_id, keys, refocus):
+        """ Queues the given key press/releases for sending to the given
+            window.
+
+            :param window_id: (int) The target window's ID, or 0 to send the
+            keys to the currently focused window.
+            :param keys: (list) Of (event_type, keysym) tuples, where
+            event_type is Xlib.X.KeyPress or Xlib.X.KeyRelease.
+            :param refocus: (bool) Denotes the target window is to be
+            re-focused first, even if it was the last given focus.
+        """
+        if self._thread is None:
+            warn('Keystroke queued but Keystroke Dispatcher not yet started.')
+
+        self._queue.put((window_id, keys, refocus, perf_counter()))
+
+    def focus(self, window_id):
+        """ Queues a focus change to the given window. E.g. to return focus to
+            it after a HUD btn click.
+        """
+        self._put(window_id, [], True)
+
+    def keystroke(self, window_id, keysym, refocus=False):
+        """ Queues a keystroke (i.e. a key press and release) of the given
+            keysym to the given window, re-focusing it first iff refocus.
+        """
+        self._put(window_id, [(Xlib.X.KeyPress, keysym),
+                              (Xlib.X.KeyRelease, keysym)], refocus)
+
+    def press(self, window_id, keysym, refocus=False):
+        """ Queues a key press of the given keysym to the given window,
+            re-focusing it first iff refocus.
+        """
+        self._put(window_id, [(Xlib.X.KeyPress, keysym)], refocus)
+
+    def release(self, window_id, *keysyms, refocus=False):
+        """ Queues a key release of each given keysym to the given window,
+            re-focusing it first iff refocus.
+        """
+        self._put(
+            window_id, [(Xlib.X.KeyRelease, k) for k in keysyms], refocus)
+
+    def start(self):
+        """ Starts the dispatcher thread. Raises RuntimeError if the X server
+            lacks the XTest extension, as no keys could be sent.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            warn('Keystroke Dispatcher already running.')
+            return
+
+        disp = Xlib.display.Display()
+
+        if not disp.has_extension('XTEST'):
+            disp.close()
+            raise RuntimeError(
+                'XTest extension unavailable -- required to send keystrokes.')
+
+        self._thread = Thread(
+            target=self._async_dispatcher, args=(disp,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stops the dispatcher thread, after sending any keys still queued.
+        """
+        if self._thread is None:
+            warn('Received STOP but Keystroke Dispatcher not yet started.')
+            return
+
+        self._queue.put(None)
+        self._thread.join(DISPATCH_JOIN_TIMEOUT)
+        self._thread = None
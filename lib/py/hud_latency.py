@@ -0,0 +1,172 @@
+""" Per-stage latency timers and histograms for the HUD's btn payload handling,
+    e.g. of a virtual keypress from btn click to keystroke. Enabled by
+    HUD_LATENCY_STATS, in which case stats are written to
+    HUD_LATENCY_STATS_PATH (as JSON) at exit and on SIGUSR1.
+"""
+
+__author__ = 'Dustin Fast <dustin.fast@outlook.com>'
+
+import os
+import json
+import atexit
+import signal
+import threading
+from time import perf_counter
+from contextlib import contextmanager
+
+from lib.py.app import app_config, info, warn
+
+
+LATENCY_STATS = app_config('HUD_LATENCY_STATS')
+LATENCY_STATS_PATH = app_config('HUD_LATENCY_STATS_PATH')
+
+# Histogram buckets, in us, as powers of two -- bucket i holds latencies in
+# [2^(i-1), 2^i) us, and the last holds all those greater
+N_BUCKETS = 25
+PERCENTILES = (50, 90, 99)
+
+
+class _StageStats(object):
+    def __init__(self):
+        """ A single stage's latency stats.
+        """
+        self.n = 0
+        self.total_us = 0.0
+        self.min_us = float('inf')
+        self.max_us = 0.0
+        self.hist = [0] * N_BUCKETS
+
+    def add(self, us):
+        """ Adds the given latency, in us, to the stats.
+        """
+        self.n += 1
+        self.total_us += us
+        self.min_us = min(self.min_us, us)
+        self.max_us = max(self.max_us, us)
+        self.hist[min(int(us).bit_length(), N_BUCKETS - 1)] += 1
+
+    def percentile_us(self, p):
+        """ Returns the given percentile's latency, in us, as the upper bound
+            of the histogram bucket containing it.
+        """
+        rank = p / 100 * self.n
+        count = 0
+
+        for i, n in enumerate(self.hist):
+            count += n
+            if count >= rank:
+                return min(float(2 ** i), self.max_us)
+
+        return self.max_us
+
+    def to_dict(self):
+        """ Returns the stats as a JSON-serializable dict.
+        """
+        stats = {'n': self.n,
+                 'mean_us': self.total_us / self.n,
+                 'min_us': self.min_us,
+                 'max_us': self.max_us}
+
+        for p in PERCENTILES:
+            stats[f'p{p}_us'] = self.percentile_us(p)
+
+        # Histogram, as {bucket upper bound (us): count}, less empty buckets
+        stats['hist'] = {
+            (f'<{2 ** i}' if i < N_BUCKETS - 1 else f'>={2 ** (i - 1)}'): n
+            for i, n in enumerate(self.hist) if n}
+
+        return stats
+
+
+class _NullStage(object):
+    """ A no-op stage context, for when stats are not enabled. (Note:
+        contextlib.nullcontext requires python 3.7).
+    """
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+class HUDLatencyStats(object):
+    def __init__(self, enabled=LATENCY_STATS, path=LATENCY_STATS_PATH):
+        """ A collection of named stages' latency stats. If not enabled,
+            timing is a no-op.
+
+            :param enabled: (bool) Denotes stats are to be collected.
+            :param path: (str) The JSON file stats are written to by dump().
+        """
+        self.enabled = enabled
+        self._path = path
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._null_stage = _NullStage()
+
+        if not enabled:
+            return
+
+        # Dump at exit and on SIGUSR1 (handler must be set from main thread)
+        atexit.register(self.dump)
+
+        try:
+            signal.signal(signal.SIGUSR1, self._on_dump_signal)
+        except ValueError:
+            warn('HUD latency stats not dumpable by signal from this thread.')
+
+        info(f'HUD latency stats enabled (kill -USR1 {os.getpid()} to dump).')
+
+    def _on_dump_signal(self, signum, frame):
+        """ The SIGUSR1 handler. Dumps from a new thread, as the signal may
+            interrupt the main thread while it holds the stats lock (e.g. in
+            add()), which the dump would otherwise deadlock on.
+        """
+        threading.Thread(target=self.dump, daemon=True).start()
+
+    def add(self, stage, seconds):
+        """ Adds the given latency, in seconds, to the given stage's stats.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            try:
+                stats = self._stages[stage]
+            except KeyError:
+                stats = self._stages[stage] = _StageStats()
+
+            stats.add(seconds * 1e6)
+
+    def stage(self, stage):
+        """ Returns a context manager adding the time spent in its context to
+            the given stage's stats, or a no-op context iff not enabled.
+        """
+        if not self.enabled:
+            return self._null_stage
+
+        return self._timed(stage)
+
+    @contextmanager
+    def _timed(self, stage):
+        """ A context manager timing its context as the given stage.
+        """
+        t_start = perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add(stage, perf_counter() - t_start)
+
+    def dump(self):
+        """ Writes each stage's stats to file, as JSON.
+        """
+        with self._lock:
+            stats = {stage: s.to_dict() for stage, s in self._stages.items()}
+
+        if not stats:
+            return
+
+        with open(self._path, 'w') as f:
+            json.dump(stats, f, indent=2)
+
+        info(f'HUD latency stats written to {self._path}.')
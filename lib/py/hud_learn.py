@@ -4,32 +4,75 @@
 __author__ = 'Dustin Fast <dustin.fast@outlook.com>'
 
 import os
+import json
 import pickle
-from time import sleep
+import hashlib
+import itertools
+import multiprocessing as mp
+from time import sleep, perf_counter
 from pathlib import Path
 
-import pandas as pd
-from matplotlib import pyplot as plt
-from sklearn.svm import SVR
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.metrics import mean_absolute_error
-from sklearn.model_selection import train_test_split
+import numpy as np
 
-from lib.py.app import key_to_id, app_config, info, warn
-from lib.py.event_logger import AsyncGazeEventLogger, AsyncMouseClkEventLogger
+from lib.py.app import key_to_id, app_config, info, warn, lazy_import, \
+    pyx_install
+from lib.py.eyetracker_structdef import GAZE_DATA_DTYPE
+from lib.py.gaze_log import GAZE_LOG_EXT, read_gaze_log, gaze_csv_to_log
+
+# Heavy modules are imported on first use, rather than by every mode (e.g. the
+# HUD, which needs only HUDLearn's model paths). Note: sklearn and matplotlib
+# are imported by the functions using them
+pd = lazy_import('pandas')
 
 
 # App config elements
 LOG_RAW_ROOTDIR = app_config('EVENTLOG_RAW_ROOTDIR')
+GAZE_LOG_FORMAT = app_config('EVENTLOG_GAZE_FORMAT')
 WRITE_BACK = app_config('EYETRACKER_WRITEBACK_SECONDS')
 WRITE_AFTER = app_config('EYETRACKER_WRITEAFTER_SECONDS')
-GAZE_TIME_IPLIER = app_config('GAZE_TIME_CONVERT_IPLIER')
-MOUSE_TIME_IPLIER = app_config('MOUSE_TIME_CONVERT_IPLIER')
+GAZE_LABEL_TOL_US = app_config('GAZE_LABEL_TOLERANCE_US')
+MODEL_TYPE = app_config('GAZE_ACC_MODEL_TYPE')
+SVR_C = app_config('GAZE_ACC_SVR_C')
+SVR_EPSILON = app_config('GAZE_ACC_SVR_EPSILON')
+NYSTROEM_COMPONENTS = app_config('GAZE_ACC_NYSTROEM_COMPONENTS')
+RIDGE_ALPHA = app_config('GAZE_ACC_RIDGE_ALPHA')
+SEARCH_FOLDS = app_config('GAZE_ACC_SEARCH_FOLDS')
 
 # Training data/session attributes
 DATA_SESSION_NAME = 'lg_scr_newmnt'
 RAND_SEED = 1234
 
+# Flat model file attributes -- see lib/cpp/eyetracker_coord_predict.h
+NATIVE_MODEL_EXT = 'rbf'
+NATIVE_MODEL_MAGIC = b'AEYERBF\0'
+NATIVE_MODEL_VERSION = 1
+
+# Number of test rows over which single-row inference latency is measured
+LATENCY_SAMPLES = 200
+
+# Max log rows read into memory at once, per log, when labeling
+LABEL_CHUNK_ROWS = 250000
+
+# Preprocessed training data cache attributes
+TRAIN_CACHE_EXT = 'npz'
+TRAIN_CACHE_VERSION = 2
+TRAIN_CACHE_HASH_BYTES = 65536
+
+# Hyperparameter search space, by model type, and filter param search space.
+# See HUDTrainGazeAccAssist._new_model and _train_gaze_acc, respectively.
+SEARCH_MODEL_GRIDS = {
+    'svr': {
+        'C': [100, 750, 2000],
+        'epsilon': [.01, 1.0, 5.0]},
+    'nystroem': {
+        'n_components': [200, 400, 800],
+        'alpha': [1e-4, 1e-3, 1e-2]}}
+
+SEARCH_FILTER_GRID = {
+    'dist_filter': [0, 100, 145, 200],
+    'pos_dev': [0.0, 0.1, 0.2],
+    'click_bounds': [[]]}
+
 # Data col names, w/ prefixes X_ and y_ denoting item as either feature or label 
 MOUSELOG_COL_NAMES = [
     'timestamp',
@@ -92,8 +135,32 @@ class HUDLearn(object):
         self._logpath = self._log_path()
         self.model_x_path = self._model_path('x')
         self.model_y_path = self._model_path('y')
+        self.model_x_native_path = self._model_path('x', NATIVE_MODEL_EXT)
+        self.model_y_native_path = self._model_path('y', NATIVE_MODEL_EXT)
+
+    def export_native_models(self):
+        """ Exports each pickled model lacking a native (flat) model file to
+            one, as is the case for models trained before native models were
+            exported by training. Models that fail to export are warned of.
+        """
+        for path, native_path in (
+                (self.model_x_path, self.model_x_native_path),
+                (self.model_y_path, self.model_y_native_path)):
+            if Path(native_path).exists() or not Path(path).exists():
+                continue
 
-    def _log_path(self, suffix=None):
+            try:
+                with open(path, 'rb') as f:
+                    model = pickle.load(f)
+
+                HUDTrainGazeAccAssist._export_native_model(
+                    model, model.scaler, native_path)
+            except Exception as e:
+                warn(f'Failed to export {path} to {native_path}: {repr(e)}')
+            else:
+                info(f'Exported {path} to native model {native_path}.')
+
+    def _log_path(self, suffix=None, ext='csv'):
         """ Returns the log file path after ensuring it exists.
         """
         logdir =  Path(LOG_RAW_ROOTDIR)
@@ -101,18 +168,26 @@ class HUDLearn(object):
             os.makedirs(logdir)
 
         if suffix:
-            return str(Path(logdir, f'{DATA_SESSION_NAME}_{suffix}.csv'))
+            return str(Path(logdir, f'{DATA_SESSION_NAME}_{suffix}.{ext}'))
         else:
-            return str(Path(logdir, f'{DATA_SESSION_NAME}.csv'))
+            return str(Path(logdir, f'{DATA_SESSION_NAME}.{ext}'))
+
+    def _gaze_log_path(self):
+        """ Returns the gaze log file path, for the configured log format.
+        """
+        if GAZE_LOG_FORMAT == 'bin':
+            return self._log_path('gaze', GAZE_LOG_EXT)
+
+        return self._log_path('gaze')
 
-    def _model_path(self, suffix):
+    def _model_path(self, suffix, ext='pkl'):
         """ Rreturns the ml model file path after ensuring it exists.
         """
         logdir =  Path(LOG_RAW_ROOTDIR)
         if not logdir.exists():
             os.makedirs(logdir)
 
-        return str(Path(logdir, f'{DATA_SESSION_NAME}_{suffix}.pkl'))
+        return str(Path(logdir, f'{DATA_SESSION_NAME}_{suffix}.{ext}'))
 
 
 class HUDDataGazeAccAssist(HUDLearn):
@@ -127,8 +202,12 @@ class HUDDataGazeAccAssist(HUDLearn):
     def collect(self):
         """ Starts data collection. Blocks until terminated.
         """
+        pyx_install()  # Required for event_logger
+        from lib.py.event_logger import AsyncGazeEventLogger, \
+            AsyncMouseClkEventLogger
+
         gaze_logger = AsyncGazeEventLogger(
-            self._log_path('gaze'), self._verbose)
+            self._gaze_log_path(), self._verbose)
         
         mouse_logger = AsyncMouseClkEventLogger(
             self._log_path('mouse'), [gaze_logger.event], self._verbose)
@@ -153,50 +232,519 @@ class HUDTrainGazeAccAssist(HUDLearn):
         super().__init__()
 
     def run(self):
-        self._train_gaze_acc()
+        self._train_gaze_acc(model_type=MODEL_TYPE)
 
-    def _get_training_df(self):
-        """ Returns the training data in pd.DataFrame form.
+    def search(self):
+        self._search_gaze_acc(model_type=MODEL_TYPE)
+
+    def _get_training_data(self,
+                           click_bounds,
+                           pos_dev,
+                           dist_filter,
+                           tolerance_us=GAZE_LABEL_TOL_US,
+                           use_cache=True,
+                           with_gazepoints=False):
+        """ Returns the labeled and filtered training data, as a tuple of
+            features (np.ndarray, [N, 30]) and labels (np.ndarray, [N, 2]),
+            and iff with_gazepoints, the samples' device-given gaze points
+            (np.ndarray, [N, 2]).
+            Iff use_cache, the data is read from the training data cache when
+            the labeling/filter params and the logs are unchanged since it was
+            written. If the logs have only been appended to since, only the
+            gaze log's tail (from the first row a later click may relabel) is
+            processed. The cache is (re)written afterwards, either way. Each
+            set of labeling/filter params has its own cache file. See
+            _train_gaze_acc for param descriptions.
         """
+        gaze_log = self._prep_gaze_log()
         mouse_log = self._log_path('mouse')
-        gaze_log = self._log_path('gaze')
 
-        # Load log files
-        df_m = pd.read_csv(mouse_log, 
-                           header=None,
-                           index_col=False,
-                           names=MOUSELOG_COL_NAMES)
+        params = {'version': TRAIN_CACHE_VERSION,
+                  'gaze_log_format': GAZE_LOG_FORMAT,
+                  'tolerance_us': tolerance_us,
+                  'click_bounds': list(click_bounds),
+                  'pos_dev': pos_dev,
+                  'dist_filter': dist_filter}
+
+        # Key the cache file by its params, so that switching between param
+        # sets (e.g. between --train_ml and --search_ml) keeps each one's cache
+        params_hash = hashlib.blake2b(
+            json.dumps(params, sort_keys=True).encode(), digest_size=6)
+        cache_path = self._log_path(
+            f'train_{params_hash.hexdigest()}', TRAIN_CACHE_EXT)
+
+        logs = {'gaze': self._log_fingerprint(gaze_log),
+                'mouse': self._log_fingerprint(mouse_log)}
+
+        t_parts, X_parts, y_parts, gp_parts = [], [], [], []
+        start_row = 0
+
+        cache = self._read_training_cache(cache_path) if use_cache else None
+
+        if cache is not None and cache['meta']['params'] == params:
+            meta = cache['meta']
+
+            if meta['logs'] == logs:
+                info(f'Using cached training data ({len(cache["X"])} rows).')
+
+                if with_gazepoints:
+                    return cache['X'], cache['y'], cache['gp']
+
+                return cache['X'], cache['y']
+
+            # Iff the logs were only appended to, keep the cached rows no
+            # later click may relabel and process the gaze log from there
+            if GAZE_LOG_FORMAT == 'bin' and all(self._is_log_extension(
+                    path, meta['logs'][name]) for name, path in (
+                        ('gaze', gaze_log), ('mouse', mouse_log))):
+                keep = cache['timestamp'] < meta['t_safe']
+                t_parts.append(cache['timestamp'][keep])
+                X_parts.append(cache['X'][keep])
+                y_parts.append(cache['y'][keep])
+                gp_parts.append(cache['gp'][keep])
+                start_row = meta['resume_row']
+
+                info(f'Extending cached training data ({keep.sum()} rows) ' +
+                     f'from gaze log row {start_row}.')
+
+        # Label and filter the (remaining) gaze log
+        n_labeled = 0
+        excluded = {}
+
+        for block in self._iter_labeled_blocks(tolerance_us, start_row):
+            n_labeled += len(block.index)
+
+            block, block_excluded = self._filter_training_df(
+                block, click_bounds, pos_dev, dist_filter)
+
+            for name, count in block_excluded.items():
+                excluded[name] = excluded.get(name, 0) + count
+
+            t_parts.append(block['timestamp'].values.astype(np.int64))
+            X_parts.append(
+                block[[c for c in block.columns if c.startswith('X_')]].values)
+            y_parts.append(
+                block[[c for c in block.columns if c.startswith('y_')]].values)
+            gp_parts.append(
+                block[['_combined_gazepoint_x', '_combined_gazepoint_y']].values)
+
+        print(f'Labeled {n_labeled} gaze samples.')
+
+        for name, count in excluded.items():
+            pct_diff = int(count / n_labeled * 100)
+            print(f'Excluded {count} {name} rows out of {n_labeled} ' +
+                  f'({pct_diff}%)')
+
+        if not sum(len(t) for t in t_parts):
+            raise ValueError('No gaze samples could be labeled from the logs.')
+
+        t = np.concatenate(t_parts)
+        X = np.concatenate(X_parts)
+        y = np.concatenate(y_parts)
+        gp = np.concatenate(gp_parts)
+
+        # Denote the time before which no later click may relabel a sample and
+        # the gaze log row to resume from, for incremental extension
+        t_safe = self._last_click_time() - tolerance_us
+        resume_row = 0
+
+        if GAZE_LOG_FORMAT == 'bin':
+            resume_row = int(np.searchsorted(
+                read_gaze_log(gaze_log)['unixtime_us'], t_safe))
+
+        meta = {'params': params,
+                'logs': logs,
+                't_safe': int(t_safe),
+                'resume_row': resume_row}
+
+        self._write_training_cache(cache_path, t, X, y, gp, meta)
+
+        if with_gazepoints:
+            return X, y, gp
+
+        return X, y
+
+    @staticmethod
+    def _filter_training_df(df, click_bounds, pos_dev, dist_filter):
+        """ Returns the given labeled training data (pd.DataFrame) less rows
+            excluded by the given filters, along with a dict of the number of
+            rows excluded by each filter, by filter name. See _train_gaze_acc
+            for param descriptions.
+        """
+        keep = np.ones(len(df.index), dtype=bool)
+        excluded = {}
+
+        def _exclude(name, mask):
+            excluded[name] = int((keep & ~mask).sum())
+            return keep & mask
+
+        # Drop rows with clicks outside any given coord bounds
+        if click_bounds:
+            x = df['y_click_coord_x'].values
+            y = df['y_click_coord_y'].values
+
+            keep = _exclude('click', (
+                (x > click_bounds[0]) & (x < click_bounds[1]) &
+                (y > click_bounds[2]) & (y < click_bounds[3])))
+
+        # Drop rows with eyepos outside any given bounds
+        if abs(pos_dev) > 0:
+            mask = np.ones(len(df.index), dtype=bool)
+
+            for axis in ('x', 'y', 'z'):
+                pos = (df[f'X_left_eyepos_normed_{axis}'].values +
+                       df[f'X_right_eyepos_normed_{axis}'].values) / 2
+                mask &= np.abs(pos - 0.5) < pos_dev
+
+            keep = _exclude('pos', mask)
+
+        # Drop rows w/unreasonably distant labels, iff dist filter given
+        if abs(dist_filter) > 0:
+            dist_x = df['_combined_gazepoint_x'].values - \
+                df['y_click_coord_x'].values
+            dist_y = df['_combined_gazepoint_y'].values - \
+                df['y_click_coord_y'].values
+
+            keep = _exclude('dist', (
+                (np.abs(dist_x) < dist_filter) &
+                (np.abs(dist_y) < dist_filter)))
+
+        return df[keep], excluded
+
+    @staticmethod
+    def _log_fingerprint(path, head_bytes=TRAIN_CACHE_HASH_BYTES):
+        """ Returns a dict fingerprinting the log at the given path by its
+            size, mtime, and a hash of its first head_bytes bytes.
+        """
+        stat = os.stat(path)
+        head_bytes = min(head_bytes, stat.st_size)
+
+        with open(path, 'rb') as f:
+            head_hash = hashlib.blake2b(f.read(head_bytes)).hexdigest()
+
+        return {'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'head_bytes': head_bytes,
+                'head_hash': head_hash}
+
+    @classmethod
+    def _is_log_extension(cls, path, fingerprint):
+        """ Returns True iff the log at the given path is (apparently) the log
+            of the given fingerprint, appended to (or unchanged).
+        """
+        curr = cls._log_fingerprint(path, fingerprint['head_bytes'])
+
+        return curr['size'] >= fingerprint['size'] and \
+            curr['head_hash'] == fingerprint['head_hash']
 
-        df_g = pd.read_csv(gaze_log, 
-                           header=None,
-                           index_col=False,
-                           names=GAZELOG_COL_NAMES)
+    @staticmethod
+    def _read_training_cache(path):
+        """ Returns the training data cache at the given path as a dict of its
+            arrays and its (decoded) meta, or None if not exists or unreadable.
+        """
+        try:
+            with np.load(path, allow_pickle=False) as cache:
+                meta = json.loads(str(cache['meta']))
+
+                # Caches of other versions may not have the same arrays
+                if meta['params']['version'] != TRAIN_CACHE_VERSION:
+                    return None
+
+                return {'timestamp': cache['timestamp'],
+                        'X': cache['X'],
+                        'y': cache['y'],
+                        'gp': cache['gp'],
+                        'meta': meta}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            warn(f'Ignoring unreadable training data cache {path}: {e}')
+            return None
 
-        # Filter gaze rows with invalid gaze-points
-        df_g = df_g[df_g['X_left_pupildiameter_mm'] != -1]
-        df_g = df_g[df_g['X_right_pupildiameter_mm'] != -1]
+    @staticmethod
+    def _write_training_cache(path, t, X, y, gp, meta):
+        """ Writes the given training data and meta to the training data cache
+            at the given path, replacing it atomically.
+        """
+        tmp_path = f'{path}.tmp'
+
+        with open(tmp_path, 'wb') as f:
+            np.savez(f,
+                     timestamp=t,
+                     X=X,
+                     y=y,
+                     gp=gp,
+                     meta=np.array(json.dumps(meta)))
 
-        # Homogenize mouse/gaze timestamp scales and precision
-        df_m['timestamp'] = df_m['timestamp'] * MOUSE_TIME_IPLIER
-        df_m['timestamp'] = df_m['timestamp'].astype(int)
+        os.replace(tmp_path, path)
 
-        df_g['timestamp'] = df_g['timestamp'] * GAZE_TIME_IPLIER
-        df_g['timestamp'] = df_g['timestamp'].astype(int)
+    def _last_click_time(self):
+        """ Returns the timestamp, in us, of the mouse log's latest click.
+        """
+        t_last = np.iinfo(np.int64).min
 
-        # Join the mouse log to the gaze log by timestamp, effectively
-        # labeling gaze information with the x/y coord of an actual click.
-        # Note that this operation leaves some rows (from df_g) with no labels;
-        # in those cases, the label columns contain NaN's.
-        df = df_g.join(
-            df_m.set_index('timestamp'), on='timestamp', rsuffix='_')
+        for t, _ in self._iter_click_chunks():
+            if len(t):
+                t_last = max(t_last, t[-1])
 
-        return df
+        return t_last
+
+    def _iter_labeled_blocks(self, tolerance_us=GAZE_LABEL_TOL_US, start_row=0):
+        """ Yields the gaze log's labeled samples, a block (pd.DataFrame) at a
+            time, by a sorted merge of the gaze and mouse logs, each of which
+            are read a chunk at a time. Each valid gaze sample is labeled with
+            the click nearest to it in time (the earlier, on ties), iff within
+            tolerance_us of it. Unlabeled samples are dropped. Memory use is
+            therefore bounded by LABEL_CHUNK_ROWS rather than the log sizes.
+            ASSUMES: Both logs are in ascending time order, as written.
+
+            :param tolerance_us: (int) Max gaze/click time delta, in us.
+            :param start_row: (int) The gaze log row to start from.
+        """
+        click_chunks = self._iter_click_chunks()
+        click_t = np.empty(0, dtype=np.int64)
+        click_lbl = np.empty((0, 3), dtype=np.int64)
+        clicks_done = False
+
+        for df_g in self._iter_gaze_chunks(start_row):
+            # Filter gaze rows with invalid gaze-points
+            df_g = df_g[(df_g['X_left_pupildiameter_mm'] != -1) &
+                        (df_g['X_right_pupildiameter_mm'] != -1)]
+
+            if df_g.empty:
+                continue
+
+            t = df_g['timestamp'].values.astype(np.int64)
+            t_lo, t_hi = t.min() - tolerance_us, t.max() + tolerance_us
+
+            # Drop the clicks too early to label this or any later chunk
+            keep = click_t >= t_lo
+            click_t, click_lbl = click_t[keep], click_lbl[keep]
+
+            # Read clicks until past the latest this chunk may be labeled with
+            while not clicks_done and (
+                    not len(click_t) or click_t[-1] <= t_hi):
+                try:
+                    chunk_t, chunk_lbl = next(click_chunks)
+                except StopIteration:
+                    clicks_done = True
+                    break
+
+                keep = chunk_t >= t_lo
+                click_t = np.concatenate((click_t, chunk_t[keep]))
+                click_lbl = np.concatenate((click_lbl, chunk_lbl[keep]))
+
+            if not len(click_t):
+                continue
+
+            # Find each sample's nearest click, from its neighbors either side
+            idx = np.searchsorted(click_t, t)
+            prev_idx = np.maximum(idx - 1, 0)
+            next_idx = np.minimum(idx, len(click_t) - 1)
+            prev_dt = np.abs(t - click_t[prev_idx])
+            next_dt = np.abs(click_t[next_idx] - t)
+
+            nearest = np.where(next_dt < prev_dt, next_idx, prev_idx)
+            labeled = np.minimum(prev_dt, next_dt) <= tolerance_us
+
+            if not labeled.any():
+                continue
+
+            block = df_g[labeled].reset_index(drop=True)
+            block_lbl = click_lbl[nearest[labeled]]
+
+            for i, col in enumerate(MOUSELOG_COL_NAMES[1:]):
+                block[col] = block_lbl[:, i]
+
+            yield block
+
+    def _prep_gaze_log(self):
+        """ Returns the gaze log path, for training. If using binary gaze logs
+            and only a csv gaze log exists, it is first converted to binary.
+        """
+        gaze_log = self._gaze_log_path()
+        csv_log = self._log_path('gaze')
+
+        if GAZE_LOG_FORMAT != 'bin':
+            return gaze_log
+
+        if not Path(gaze_log).exists() and Path(csv_log).exists():
+            gaze_csv_to_log(csv_log, gaze_log)
+        elif Path(csv_log).exists():
+            warn(f'Ignoring csv gaze log {csv_log} in favor of {gaze_log}.')
+
+        return gaze_log
+
+    def _iter_gaze_chunks(self, start_row=0):
+        """ Yields the gaze log from the given row, LABEL_CHUNK_ROWS rows at a
+            time, as pd.DataFrames having GAZELOG_COL_NAMES cols.
+        """
+        gaze_log = self._gaze_log_path()
+
+        if GAZE_LOG_FORMAT != 'bin':
+            yield from pd.read_csv(gaze_log, 
+                                   header=None,
+                                   index_col=False,
+                                   names=GAZELOG_COL_NAMES,
+                                   skiprows=start_row,
+                                   chunksize=LABEL_CHUNK_ROWS)
+            return
+
+        # Note: Only the current chunk is paged in from the memory-mapped log
+        records = read_gaze_log(gaze_log)
+
+        for i in range(start_row, len(records), LABEL_CHUNK_ROWS):
+            chunk = records[i:i + LABEL_CHUNK_ROWS]
+
+            yield pd.DataFrame(
+                {col: chunk[name] for col, name in zip(
+                    GAZELOG_COL_NAMES, GAZE_DATA_DTYPE.names)})
+
+    def _iter_click_chunks(self):
+        """ Yields the mouse log, LABEL_CHUNK_ROWS rows at a time, as tuples of
+            click timestamps (np.int64, in us) and their labels (np.int64, as
+            [[btn_id, click_coord_x, click_coord_y], ...]).
+        """
+        chunks = pd.read_csv(self._log_path('mouse'), 
+                             header=None,
+                             index_col=False,
+                             names=MOUSELOG_COL_NAMES,
+                             chunksize=LABEL_CHUNK_ROWS)
+
+        for df_m in chunks:
+            # Homogenize mouse timestamps (seconds) with gaze timestamps (us)
+            t = np.rint(df_m['timestamp'].values * 1e6).astype(np.int64)
+
+            yield t, df_m[MOUSELOG_COL_NAMES[1:]].values.astype(np.int64)
+
+    @staticmethod
+    def _new_model(model_type,
+                   n_features,
+                   X_var,
+                   C=SVR_C,
+                   epsilon=SVR_EPSILON,
+                   n_components=NYSTROEM_COMPONENTS,
+                   alpha=RIDGE_ALPHA):
+        """ Returns a new, unfit, gaze-coord model of the given type --
+            'svr': An rbf SVR. Accurate, but its inference cost grows linearly
+                with its support vector count, and so with the training set.
+            'nystroem': A ridge regression over a fixed-size Nystroem
+                approximation of the same rbf kernel. Inference cost is fixed
+                by n_components, regardless of training set size.
+
+            :param n_features: (int) Feature count.
+            :param X_var: (float) Variance of the (scaled) training features.
+            :param C: (float) The svr model's regularization param.
+            :param epsilon: (float) The svr model's epsilon-tube width.
+            :param n_components: (int) The nystroem model's kernel vectors.
+            :param alpha: (float) The nystroem model's ridge penalty.
+        """
+        from sklearn.svm import SVR
+        from sklearn.linear_model import Ridge
+        from sklearn.pipeline import make_pipeline
+        from sklearn.kernel_approximation import Nystroem
+
+        # Use the rbf gamma SVR would choose by default, for either type
+        gamma = 1.0 / (n_features * X_var) if X_var > 0 else 1.0
+
+        if model_type == 'svr':
+            return SVR(kernel='rbf', gamma=gamma, C=C, epsilon=epsilon)
+
+        if model_type == 'nystroem':
+            return make_pipeline(
+                Nystroem(kernel='rbf',
+                         gamma=gamma,
+                         n_components=n_components,
+                         random_state=RAND_SEED),
+                Ridge(alpha=alpha))
+
+        raise ValueError(f'Unsupported gaze acc model type: {model_type}')
+
+    @staticmethod
+    def _rbf_expansion(model):
+        """ Returns the given model's decision function as an rbf kernel
+            expansion, i.e. as (vectors, coefs, gamma, intercept) such that
+            f(x) = intercept + sum_i(coefs_i * exp(-gamma * ||vectors_i - x||^2))
+
+            :param model: A model as given by _new_model, after fitting.
+        """
+        from sklearn.svm import SVR
+
+        if isinstance(model, SVR):
+            return (model.support_vectors_,
+                    model.dual_coef_.ravel(),
+                    model._gamma,
+                    model.intercept_[0])
+
+        # Else, the model is a nystroem pipeline. Its features are the kernel
+        # values to each component, times normalization_.T, so the ridge
+        # weights fold into a single coef per component
+        nystroem, ridge = model.steps[0][1], model.steps[1][1]
+
+        return (nystroem.components_,
+                nystroem.normalization_.T @ ridge.coef_,
+                nystroem.gamma,
+                ridge.intercept_)
+
+    @staticmethod
+    def _inference_latency_us(model, X):
+        """ Returns the given model's median single-row inference latency
+            (as used at the eyetracker's sample rate) and its amortized
+            per-row latency when predicting X as a batch, in microseconds.
+        """
+        rows = X[:LATENCY_SAMPLES]
+        times = []
+
+        for row in rows:
+            t_start = perf_counter()
+            model.predict(row.reshape(1, -1))
+            times.append(perf_counter() - t_start)
+
+        t_start = perf_counter()
+        model.predict(X)
+        t_batch = (perf_counter() - t_start) / len(X)
+
+        return np.median(times) * 1e6, t_batch * 1e6
+
+    @classmethod
+    def _export_native_model(cls, model, scaler, path):
+        """ Writes the given model (as given by _new_model, after fitting) and
+            its feature scaler to the given path as a flat binary file of its
+            rbf kernel expansion, for evaluation by the native gaze-coord
+            predictor. All values are little-endian, laid out as --
+                magic (8 bytes), version, n_features, n_vectors (int32),
+                gamma, intercept (float64),
+                scaler_min[n_features], scaler_scale[n_features] (float64),
+                coefs[n_vectors] (float64),
+                vectors[n_vectors, n_features] (float64, row-major)
+        """
+        vectors, coefs, gamma, intercept = cls._rbf_expansion(model)
+        vectors = np.asarray(vectors, dtype='<f8')
+        coefs = np.asarray(coefs, dtype='<f8').ravel()
+        n_vectors, n_features = vectors.shape
+
+        # Write to a tmp file then replace, as the file may be hot-reloaded
+        tmp_path = f'{path}.tmp'
+
+        with open(tmp_path, 'wb') as f:
+            f.write(NATIVE_MODEL_MAGIC)
+            np.array([NATIVE_MODEL_VERSION, n_features, n_vectors],
+                     dtype='<i4').tofile(f)
+            np.array([gamma, intercept], dtype='<f8').tofile(f)
+            np.asarray(scaler.min_, dtype='<f8').tofile(f)
+            np.asarray(scaler.scale_, dtype='<f8').tofile(f)
+            coefs.tofile(f)
+            np.ascontiguousarray(vectors).tofile(f)
+
+        os.replace(tmp_path, path)
 
     def _train_gaze_acc(self, 
                         split=0.80,
                         dist_filter=145,  # 145
                         click_bounds=[],  # [1500, 2200, 0, 1250]
-                        pos_dev=0.0): 
+                        pos_dev=0.0,
+                        model_type='svr',
+                        use_cache=True): 
         """ Gaze accuracy training handler.
 
             :param split: (float) train/test split ratio.
@@ -210,8 +758,16 @@ class HUDTrainGazeAccAssist(HUDLearn):
             training.
             :param pos_dev: An optional eyepos metric, by which rows having an
             eyepos deviating by +/- that amount are dropped prior to training.
+            :param model_type: (str) The model family to train. See _new_model.
+            :param use_cache: (bool) Use (and extend) the training data cache,
+            rather than re-processing the logs from scratch.
         """
-        print('Training...')
+        from matplotlib import pyplot as plt
+        from sklearn.preprocessing import MinMaxScaler
+        from sklearn.metrics import mean_absolute_error
+        from sklearn.model_selection import train_test_split
+
+        print(f'Training ({model_type})...')
         
         # TODO: If model files already exist, prompt for overwrite
 
@@ -221,76 +777,11 @@ class HUDTrainGazeAccAssist(HUDLearn):
         # TODO: AutoML?
         # TODO: Test smaller/larger ipliers
 
-        # Read in training data
-        df = self._get_training_df()
-        
-        # Drop all rows that don't have labels
-        df = df.dropna().reset_index(drop=True)
-
-        # Drop rows with clicks outside any given coord bounds
-        if click_bounds:
-            pre_len = len(df.index)
-            df = df[(
-                (
-                    (df['y_click_coord_x'] > click_bounds[0]) &
-                    (df['y_click_coord_x'] < click_bounds[1])
-                ) & (
-                    (df['y_click_coord_y'] > click_bounds[2]) &
-                    (df['y_click_coord_y'] < click_bounds[3])
-                )
-            )]
-
-            diff = pre_len - len(df.index)
-            pct_diff = int(diff / pre_len * 100)
-            print(f'Excluded {diff} clicks out of {pre_len} rows ({pct_diff}%)')
-
-        # Drop rows with eyepos outside any given bounds
-        if abs(pos_dev) > 0:
-            def avg_cols(df, l, r):
-                return (df[l] + df[r]) / 2
-
-            px = avg_cols(
-                df, 'X_left_eyepos_normed_x', 'X_right_eyepos_normed_x')
-            py = avg_cols(
-                df, 'X_left_eyepos_normed_y', 'X_right_eyepos_normed_y')
-            pz = avg_cols(
-                df, 'X_left_eyepos_normed_z', 'X_right_eyepos_normed_z')
-                
-            pre_len = len(df.index)
-            df = df[(
-                ((px - 0.5).abs() < pos_dev) &
-                ((py - 0.5).abs() < pos_dev) &
-                ((pz - 0.5).abs() < pos_dev)
-            )]
-
-            diff = pre_len - len(df.index)
-            pct_diff = int(diff / pre_len * 100)
-            print(f'Excluded {diff} pos rows out of {pre_len} ({pct_diff}%)')
-
-        # Drop rows w/unreasonably distant labels, iff dist filter given
-        if abs(dist_filter) > 0:
-            pre_len = len(df.index)
-            df = df[(
-                ((df['_combined_gazepoint_x'] - df['y_click_coord_x']).abs(
-                    ) < dist_filter) &
-                ((df['_combined_gazepoint_y'] - df['y_click_coord_y']).abs(
-                    ) < dist_filter)
-            )]
-
-            diff = pre_len - len(df.index)
-            pct_diff = int(diff / pre_len * 100)
-            print(f'Excluded {diff} dist pts out of {pre_len} ({pct_diff}%)')
-
-        # Build report, for dev conveience
-        # import pandas_profiling as pp
-        # pf = pp.ProfileReport(df, minimal=True)
-        # pf.to_file('temp_.html')
-
-        # Extract X, as [[feature_1, feature_2, ...], ...]
-        _X = df[[c for c in df.columns if c.startswith('X_')]].values
-
-        # Extract y, as [[gazepoint_x_coord, gazepoint_y_coord], ... ]
-        _y = df[[c for c in df.columns if c.startswith('y_')]].values
+        # Read in the labeled, filtered training data, as
+        # X = [[feature_1, feature_2, ...], ...] and
+        # y = [[gazepoint_x_coord, gazepoint_y_coord], ... ]
+        _X, _y = self._get_training_data(
+            click_bounds, pos_dev, dist_filter, use_cache=use_cache)
 
         # Do traintest split
         X_train, X_test, y_train, y_test = train_test_split(
@@ -313,12 +804,13 @@ class HUDTrainGazeAccAssist(HUDLearn):
         # ros = RandomOverSampler(random_state=RAND_SEED)
         # X_train_ros, y_train_x_coord = ros.fit_resample(X_train, y_train_x_coord)
         
-        # Train two seperate models; one for the x coord, and one for the y
-        model_x = SVR(kernel='rbf', C=750, epsilon=.01).fit(
-            X_train, y_train_x_coord)
+        # Train two seperate models, concurrently; one for the x coord, and
+        # one for the y
+        with mp.get_context('fork').Pool(processes=2) as pool:
+            fits = [pool.apply_async(_fit_model, (model_type, X_train, y_coord))
+                    for y_coord in (y_train_x_coord, y_train_y_coord)]
 
-        model_y = SVR(kernel='rbf', C=750, epsilon=.01).fit(
-            X_train, y_train_y_coord)
+            model_x, model_y = [f.get() for f in fits]
 
         # Validate both models
         print('Done.\nValidating...')
@@ -330,6 +822,13 @@ class HUDTrainGazeAccAssist(HUDLearn):
         print('Done:\n\tmae_x = %.4f\n\tmae_y = %.4f' % 
             (model_x_score, model_y_score))
 
+        # Report inference cost alongside the scores
+        for coord, model in (('x', model_x), ('y', model_y)):
+            t_row, t_batch = self._inference_latency_us(model, X_test)
+            n_vectors = len(self._rbf_expansion(model)[1])
+            print('\tlatency_%s = %.1fus/sample (%.1fus batched), %d vectors' %
+                (coord, t_row, t_batch, n_vectors))
+
         # Set scaler as a member of the model instance, so it's saved with it
         model_x.scaler = scaler
         model_y.scaler = scaler
@@ -340,6 +839,10 @@ class HUDTrainGazeAccAssist(HUDLearn):
         with open(self.model_y_path, 'wb') as f:
             pickle.dump(model_y, f)
 
+        # Export flat model files, for use by the native (C++) predictor
+        self._export_native_model(model_x, scaler, self.model_x_native_path)
+        self._export_native_model(model_y, scaler, self.model_y_native_path)
+
         # # Plot x/y coord actual vs x/y coord pred, for testing convenience
         plt.figure()
         plt.scatter(
@@ -352,4 +855,185 @@ class HUDTrainGazeAccAssist(HUDLearn):
         plt.ylabel("gaze_y")
         plt.title("Perf")
         plt.legend()
-        plt.savefig(f'test_SVR_acc.png')
+        plt.savefig(f'test_{model_type}_acc.png')
+
+    def _search_gaze_acc(self,
+                         model_type='svr',
+                         n_folds=SEARCH_FOLDS,
+                         workers=None):
+        """ Gaze accuracy hyperparameter search handler. Every combination of
+            the model's hyperparams (SEARCH_MODEL_GRIDS) and the training
+            filter params (SEARCH_FILTER_GRID) is scored by n_folds-fold cross
+            validation, with each fold's x and y models fit as independent
+            jobs on a pool of worker processes. The folds are split from the
+            unfiltered rows, once, and the filters are applied to each fold's
+            training rows only -- so every combination is scored on the same
+            test rows. A report ranking each
+            combination by MAE, alongside its inference cost, is printed and
+            written to the log dir as csv.
+
+            :param model_type: (str) The model family to search. See _new_model.
+            :param n_folds: (int) Cross validation fold count.
+            :param workers: (int) Worker process count. If None, one per core.
+        """
+        from sklearn.model_selection import KFold
+
+        workers = workers or os.cpu_count()
+        model_grid = SEARCH_MODEL_GRIDS[model_type]
+
+        # Read in the labeled, unfiltered, training data. Each filter param
+        # combination then selects its rows from it
+        X, y, gp = self._get_training_data(
+            [], 0.0, 0, with_gazepoints=True)
+
+        df = pd.DataFrame(
+            X, columns=[c for c in GAZELOG_COL_NAMES if c.startswith('X_')])
+        df['_combined_gazepoint_x'], df['_combined_gazepoint_y'] = gp.T
+        df['y_click_coord_x'], df['y_click_coord_y'] = y.T
+
+        filter_combos = [dict(zip(SEARCH_FILTER_GRID, v)) for v in
+                         itertools.product(*SEARCH_FILTER_GRID.values())]
+        model_combos = [dict(zip(model_grid, v)) for v in
+                        itertools.product(*model_grid.values())]
+
+        # Build the fit/score jobs, as (combo idx, fold, coord, job args)
+        jobs = []
+        combos = []
+        kfold = KFold(n_splits=n_folds, shuffle=True, random_state=RAND_SEED)
+        folds = list(kfold.split(df.index.values))
+
+        for filter_params in filter_combos:
+            keep = np.zeros(len(df.index), dtype=bool)
+            keep[self._filter_training_df(df, **filter_params)[0].index] = True
+            rows = int(keep.sum())
+
+            # Filter each fold's training rows, keeping its test rows as is
+            filtered_folds = [(train[keep[train]], test)
+                              for train, test in folds]
+
+            if min(len(train) for train, _ in filtered_folds) < 2:
+                warn(f'Skipping filters {filter_params}: Too few rows.')
+                continue
+
+            for hyperparams in model_combos:
+                combos.append((filter_params, hyperparams, rows))
+
+                for fold, (train_rows, test_rows) in enumerate(
+                        filtered_folds):
+                    for coord in (0, 1):
+                        jobs.append((len(combos) - 1, fold, coord, (
+                            model_type, hyperparams, train_rows, test_rows,
+                                coord)))
+
+        print(f'Searching ({model_type}): {len(combos)} combinations, ' +
+              f'{len(jobs)} fits on {workers} workers...')
+
+        # Run the jobs. Workers inherit the training data on fork
+        results = {}
+
+        with mp.get_context('fork').Pool(processes=workers,
+                                         initializer=_init_search_worker,
+                                         initargs=(X, y)) as pool:
+            fits = pool.imap_unordered(
+                _search_job, [(i, args) for i, (_, _, _, args) in
+                              enumerate(jobs)])
+
+            for i, (job_idx, result) in enumerate(fits):
+                combo, _, coord, _ = jobs[job_idx]
+                results.setdefault((combo, coord), []).append(result)
+
+                if (i + 1) % max(1, len(jobs) // 10) == 0:
+                    print(f'\t{i + 1}/{len(jobs)} fits done.')
+
+        # Build the report, ranked by mean x/y MAE
+        report = []
+
+        for combo_idx, (filter_params, hyperparams, n_rows) in enumerate(combos):
+            res_x = np.array(results[(combo_idx, 0)])
+            res_y = np.array(results[(combo_idx, 1)])
+
+            report.append({
+                **{f'filter_{k}': str(v) for k, v in filter_params.items()},
+                **{f'model_{k}': v for k, v in hyperparams.items()},
+                'rows': n_rows,
+                'mae_x': res_x[:, 0].mean(),
+                'mae_y': res_y[:, 0].mean(),
+                'mae': (res_x[:, 0].mean() + res_y[:, 0].mean()) / 2,
+                'latency_us': res_x[:, 1].mean() + res_y[:, 1].mean(),
+                'vectors': int(res_x[:, 2].mean() + res_y[:, 2].mean())})
+
+        df_report = pd.DataFrame(report).sort_values('mae', ignore_index=True)
+
+        # Denote the combinations for which no other has both a lower MAE and
+        # a lower inference latency
+        df_report['pareto'] = [
+            not ((df_report['mae'] < r.mae) &
+                 (df_report['latency_us'] < r.latency_us)).any()
+            for r in df_report.itertuples()]
+
+        report_path = self._log_path(f'search_{model_type}')
+        df_report.to_csv(report_path, index=False)
+
+        with pd.option_context('display.max_rows', None,
+                               'display.width', None):
+            print(df_report.to_string(float_format='%.4g'))
+
+        info(f'Search report written to {report_path}.')
+        print('Note: Latency is measured under load, so is relative only.')
+
+        return df_report
+
+
+# Training data shared by search workers, as set on worker init
+_SEARCH_DATA = None
+
+
+def _init_search_worker(X, y):
+    """ Search worker process initializer. Sets the shared training data.
+    """
+    global _SEARCH_DATA
+    _SEARCH_DATA = (X, y)
+
+
+def _fit_model(model_type, X_train, y_train, **hyperparams):
+    """ Returns a new gaze-coord model of the given type and hyperparams, fit
+        to the given (scaled) training data. For use by worker processes.
+    """
+    return HUDTrainGazeAccAssist._new_model(
+        model_type, X_train.shape[1], X_train.var(), **hyperparams).fit(
+            X_train, y_train)
+
+
+def _search_job(job):
+    """ Runs the given search job, as (job idx, _search_fit_score args).
+        Returns a tuple of the job idx and its _search_fit_score result.
+    """
+    job_idx, args = job
+
+    return job_idx, _search_fit_score(*args)
+
+
+def _search_fit_score(model_type, hyperparams, train_rows, test_rows, coord):
+    """ Fits a gaze-coord model of the given type and hyperparams to the given
+        rows of the shared training data, for the given coord (0 = x, 1 = y),
+        then scores it on the given test rows. Returns a tuple of its MAE,
+        single-row inference latency (us), and rbf kernel vector count. For
+        use by search worker processes.
+    """
+    from sklearn.preprocessing import MinMaxScaler
+    from sklearn.metrics import mean_absolute_error
+
+    X, y = _SEARCH_DATA
+
+    scaler = MinMaxScaler()
+    X_train = scaler.fit_transform(X[train_rows])
+    X_test = scaler.transform(X[test_rows])
+
+    model = _fit_model(
+        model_type, X_train, y[train_rows, coord], **hyperparams)
+
+    mae = mean_absolute_error(y[test_rows, coord], model.predict(X_test))
+    latency_us, _ = HUDTrainGazeAccAssist._inference_latency_us(model, X_test)
+    n_vectors = len(HUDTrainGazeAccAssist._rbf_expansion(model)[1])
+
+    return mae, latency_us, n_vectors
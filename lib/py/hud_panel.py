@@ -35,6 +35,14 @@ class HUDPanel(ttk.Frame):
         self.hud = hud
         self.grid(row=0, column=grid_col, sticky=tk.NW)
 
+        self._panel_btns = []   # The panel's HUDPanelButtons, incl spacers
+
+    @property
+    def panel_btns(self):
+        """ Returns a list of the panel's clickable (i.e. non-spacer) btns.
+        """
+        return [b for b in self._panel_btns if b.payload_type is not None]
+
     def btn_payload_handler(self, btn):
         self.hud.payload_handler(btn, btn.payload, btn.payload_type)
 
@@ -49,7 +57,6 @@ class HUDKeyboardPanel(HUDPanel):
         super().__init__(parent_frame, hud, grid_col)
 
         self._btn_row_frames = []
-        self._panel_btns = []
 
         # Init the panel's buttons, etc, from the given panel layout file
         with open(json_path, 'r') as f:
@@ -147,6 +154,7 @@ class HUDStatusPanel(HUDPanel):
         btn.widget.configure(
             command=lambda btn=btn: self.btn_payload_handler(btn))
         btn.widget.grid(row=0, column=0, ipady=4)
+        self._panel_btns.append(btn)
 
         ttk.Button(host_frame,
                    style=BTN_STYLE_SPACER,
@@ -192,6 +200,7 @@ class HUDStatusPanel(HUDPanel):
         btn.widget.grid(row=6, column=0, ipady=4)
         btn.widget.configure(
             command=lambda btn=btn: self.btn_payload_handler(btn))
+        self._panel_btns.append(btn)
 
         btn = HUDPanelButton(
             text='Data Collect',
@@ -204,6 +213,20 @@ class HUDStatusPanel(HUDPanel):
         btn.widget.grid(row=7, column=0, ipady=4)
         btn.widget.configure(
             command=lambda btn=btn: self.btn_payload_handler(btn))
+        self._panel_btns.append(btn)
+
+        btn = HUDPanelButton(
+            text='Gaze Click',
+            payload_type='mouse_click_toggle')
+        btn.widget = ttk.Button(
+            host_frame,
+            style=BTN_STYLE_TOGGLE,
+            width=7*HUD_BTN_WIDTH,
+            text=btn.text)
+        btn.widget.grid(row=8, column=0, ipady=4)
+        btn.widget.configure(
+            command=lambda btn=btn: self.btn_payload_handler(btn))
+        self._panel_btns.append(btn)
 
         self.set_user_posguide()
 
@@ -243,7 +266,8 @@ class HUDPanelButton(object):
     @property
     def centroid(self):
         """ The center of the button, in on-screen coords. Result is cached
-            after first call.
+            after first call, and updated by hud_hittest.HUDButtonIndex on
+            each rebuild (i.e. HUD geometry change).
         """
         try:
             return self._centroid
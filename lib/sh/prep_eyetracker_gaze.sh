@@ -1,33 +1,89 @@
 #! /usr/bin/env bash
 
-# Builds the eyetracker_gaze shared object file and starts the eyetracker
-# service iff needed.
+# Builds the eyetracker_gaze shared object file iff its sources or build flags
+# have changed since it was last built, and starts the eyetracker service iff
+# needed (checked once per boot). If the first arg is "replay", instead
+# prepares the replay backend's shared object file, which needs no eyetracker
+# device or service.
+#
+# Exits non-zero, with the build's output on stderr, iff the build failed.
 
+SRC_DIR=/opt/app/src/lib/cpp
+SO_DIR=/opt/app/src/lib/so
+TOBII_DIR=/usr/lib/tobii
+SERVICE=tobii-runtime-IS4LARGE107
+SERVICE_INSTALL=/opt/app/dependencies/tobii_pdk_install/platform_runtime/platform_runtime_IS4LARGE107_install.sh
+SERVICE_MARKER=${SO_DIR}/.${SERVICE}.boot_id
 
-# Build the .so file
-LD_LIBRARY_PATH=/usr/lib/tobii/:$LD_LIBRARY_PATH
+CXX_STD="-std=gnu++14"  # Explicit, rather than the compiler's default
+LIBS="-lstdc++ -lm -lX11 -lyaml-cpp -lboost_chrono -lboost_system -lboost_thread -pthread"
 
-gcc  -c -fPIC /opt/app/src/lib/cpp/eyetracker_gaze.cpp  \
-    -o eyetracker_gaze.o        \
-    -I/usr/include/python3.6m   \
-    -lpython3.6m
+# Set the build for the requested backend
+if [ "$1" == "replay" ]; then
+    NAME=eyetracker_gaze_replay
+    CFLAGS="${CXX_STD} -fPIC -DEYETRACKER_REPLAY"
+    LDFLAGS="${LIBS}"
+else
+    NAME=eyetracker_gaze
+    CFLAGS="${CXX_STD} -fPIC"
+    LDFLAGS="${LIBS} ${TOBII_DIR}/libtobii_stream_engine.so -Wl,-rpath=${TOBII_DIR}/"
+    LD_LIBRARY_PATH=${TOBII_DIR}/:$LD_LIBRARY_PATH
+fi
+
+SO_PATH=${SO_DIR}/${NAME}.so
+HASH_PATH=${SO_DIR}/${NAME}.hash
+
+# Key the build by its sources, flags, and compiler
+HASH="$( (cat ${SRC_DIR}/eyetracker_gaze.cpp ${SRC_DIR}/*.h;  \
+          echo "${CFLAGS} ${LDFLAGS}";                      \
+          gcc --version) | sha256sum | cut -d ' ' -f 1)"
+
+# Build the .so file iff not already built from the same key. Builds are
+# serialized, and the .so file replaced atomically, so that concurrent
+# launches never load a partially written file.
+mkdir -p ${SO_DIR}
+exec 9> ${SO_DIR}/.${NAME}.lock
+flock 9
+
+if [ ! -f ${SO_PATH} ] || [ "$(cat ${HASH_PATH} 2>/dev/null)" != "${HASH}" ]; then
+    echo "Building ${NAME}.so..."
+
+    BUILD_DIR="$(mktemp -d)"
+    BUILD_LOG=${BUILD_DIR}/build.log
 
-gcc -shared  \
-    -o /opt/app/src/lib/so/eyetracker_gaze.so eyetracker_gaze.o  \
-    -lstdc++        \
-    -lX11           \
-    -lyaml-cpp      \
-    -lboost_chrono  \
-    -lboost_system  \
-    -lboost_thread  \
-    -pthread /usr/lib/tobii/libtobii_stream_engine.so  \
-    -Wl,-rpath=/usr/lib/tobii/  \
+    if ! { gcc -c ${CFLAGS} ${SRC_DIR}/eyetracker_gaze.cpp     \
+               -o ${BUILD_DIR}/${NAME}.o &&                     \
+           gcc -shared -o ${BUILD_DIR}/${NAME}.so               \
+               ${BUILD_DIR}/${NAME}.o ${LDFLAGS}; } > ${BUILD_LOG} 2>&1; then
+        echo "Build of ${NAME}.so failed:" >&2
+        cat ${BUILD_LOG} >&2
+        rm -rf ${BUILD_DIR}
+        exit 1
+    fi
 
-rm eyetracker_gaze.o
+    mv -f ${BUILD_DIR}/${NAME}.so ${SO_PATH}
+    echo "${HASH}" > ${HASH_PATH}
+    rm -rf ${BUILD_DIR}
+fi
+
+flock -u 9
+
+# The replay backend needs no eyetracker service, so quit
+if [ "$1" == "replay" ]; then
+    exit 0
+fi
+
+# Start the eyetracker runtime service iff not already running, checking only
+# once per boot
+BOOT_ID="$(cat /proc/sys/kernel/random/boot_id)"
 
-# Start the eyetracker runtime service iff not already running
-STATUS="$(systemctl is-active tobii-runtime-IS4LARGE107)"
+if [ "$(cat ${SERVICE_MARKER} 2>/dev/null)" != "${BOOT_ID}" ]; then
+    if [ "$(systemctl is-active ${SERVICE})" != "active" ]; then
+        echo "Starting the eyetracker service..."
+        ${SERVICE_INSTALL} --install > /dev/null || exit 1
+    fi
 
-if [ "${STATUS}" != "active" ]; then
-    /opt/app/dependencies/tobii_pdk_install/platform_runtime/platform_runtime_IS4LARGE107_install.sh --install
+    echo "${BOOT_ID}" > ${SERVICE_MARKER}
 fi
+
+exit 0
@@ -0,0 +1,24 @@
+#! /usr/bin/env python
+""" Builds the application's Cython modules ahead of time, as compiled
+    extension modules alongside their sources, so that they needn't be
+    compiled (by pyximport) at launch.
+
+    Usage: python setup.py build_ext --inplace
+"""
+
+__author__ = 'Dustin Fast <dustin.fast@outlook.com>'
+
+from setuptools import setup, Extension
+from Cython.Build import cythonize
+
+from lib.py.app import PYX_MODULES
+
+
+setup(
+    name='aeye_typer',
+    ext_modules=cythonize(
+        [Extension(name, [name.replace('.', '/') + '.pyx'],
+                   extra_compile_args=['-O3'])
+         for name in PYX_MODULES],
+        compiler_directives={'language_level': 3})
+)
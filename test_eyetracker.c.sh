@@ -15,13 +15,12 @@ fi
 # Compile the eyetracker gazemark binary
 LD_LIBRARY_PATH=/usr/lib/tobii/:$LD_LIBRARY_PATH
 
-gcc lib/cpp/eyetracker_gaze.cpp  \
+gcc -std=gnu++14 lib/cpp/eyetracker_gaze.cpp  \
     -o eye_tracker_gazemark.out \
-    -I/usr/include/python3.6m   \
     -lstdc++                    \
+    -lm                         \
     -lX11                       \
     -lyaml-cpp                  \
-    -lpython3.6m                \
     -lboost_system              \
     -lboost_thread              \
     -lpthread                   \
@@ -6,8 +6,8 @@ __author__ = 'Dustin Fast <dustin.fast@outlook.com>'
 
 import time
 
-import pyximport; pyximport.install()
-
+from lib.py.app import pyx_install
+pyx_install()  # Required for EyeTrackerGaze
 from lib.py.eyetracker_gaze import EyeTrackerGaze
 
 DURATION_S = 3
@@ -0,0 +1,139 @@
+""" Tests for the HUD's button hit-test index, of lib.py.hud_hittest.
+"""
+
+__author__ = 'Dustin Fast <dustin.fast@outlook.com>'
+
+import unittest
+
+from lib.py.hud_hittest import HUDButtonIndex
+
+
+CELL_PX = 8
+
+
+class _FakeWidget(object):
+    def __init__(self, left, top, width, height):
+        """ A stand-in for a btn's Tk widget, having the given geometry.
+        """
+        self.geometry = (left, top, width, height)
+
+    def winfo_rootx(self):
+        return self.geometry[0]
+
+    def winfo_rooty(self):
+        return self.geometry[1]
+
+    def winfo_width(self):
+        return self.geometry[2]
+
+    def winfo_height(self):
+        return self.geometry[3]
+
+
+class _FakeBtn(object):
+    def __init__(self, name, *geometry):
+        """ A stand-in for a hud_panel.HUDPanelButton.
+        """
+        self.name = name
+        self.widget = _FakeWidget(*geometry)
+
+    def __repr__(self):
+        return self.name
+
+
+class TestHUDButtonIndex(unittest.TestCase):
+    def setUp(self):
+        # Two btns sharing an edge, the left one not cell-aligned, and a third
+        # on the row below, after a gap
+        self.btn_a = _FakeBtn('a', 100, 50, 21, 16)
+        self.btn_b = _FakeBtn('b', 121, 50, 19, 16)
+        self.btn_c = _FakeBtn('c', 100, 70, 40, 10)
+
+        self.index = HUDButtonIndex(cell_px=CELL_PX)
+        self.index.rebuild([self.btn_a, self.btn_b, self.btn_c])
+
+    def test_btn_edges(self):
+        """ Tests that each btn's rect includes its left/top edges but not its
+            right/bottom edges.
+        """
+        lookup = self.index.lookup
+
+        self.assertIs(lookup(100, 50), self.btn_a)
+        self.assertIs(lookup(120, 65), self.btn_a)
+        self.assertIs(lookup(121, 50), self.btn_b)
+        self.assertIs(lookup(139, 65), self.btn_b)
+        self.assertIsNone(lookup(140, 50))
+        self.assertIsNone(lookup(100, 66))
+        self.assertIs(lookup(100, 70), self.btn_c)
+        self.assertIsNone(lookup(100, 80))
+
+    def test_cell_edges(self):
+        """ Tests lookups either side of each grid cell boundary.
+        """
+        lookup = self.index.lookup
+
+        for x in (100 + CELL_PX * i for i in range(1, 5)):
+            for dx in (-1, 0):
+                expected = self.btn_a if x + dx < 121 else self.btn_b
+
+                self.assertIs(lookup(x + dx, 50 + CELL_PX), expected)
+                self.assertIs(lookup(x + dx, 50 + CELL_PX - 1), expected)
+
+        self.assertIsNone(lookup(100, 50 + CELL_PX * 2))
+        self.assertIs(lookup(100, 50 + CELL_PX * 2 + 4), self.btn_c)
+
+    def test_outside_grid(self):
+        """ Tests lookups outside the btns' bounding box.
+        """
+        lookup = self.index.lookup
+
+        for x, y in ((99, 50), (100, 49), (140, 79), (139, 80), (-1, -1),
+                     (10 ** 6, 10 ** 6)):
+            self.assertIsNone(lookup(x, y))
+
+    def test_matches_brute_force(self):
+        """ Tests that every lookup in and around the btns matches a linear
+            scan of their rects.
+        """
+        btns = (self.btn_a, self.btn_b, self.btn_c)
+
+        for x in range(90, 150):
+            for y in range(40, 90):
+                expected = None
+
+                for btn in btns:
+                    left, top, width, height = btn.widget.geometry
+
+                    if left <= x < left + width and top <= y < top + height:
+                        expected = btn
+
+                self.assertIs(self.index.lookup(x, y), expected, (x, y))
+
+    def test_rebuild(self):
+        """ Tests that lookups reflect the btns' geometry as of the latest
+            rebuild, and that each btn's centroid is updated.
+        """
+        self.assertEqual(self.btn_a._centroid, (110, 58))
+
+        self.btn_a.widget.geometry = (300, 200, 20, 20)
+        self.assertIs(self.index.lookup(100, 50), self.btn_a)
+
+        self.index.rebuild([self.btn_a, self.btn_b])
+
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.btn_a._centroid, (310, 210))
+        self.assertIsNone(self.index.lookup(100, 50))
+        self.assertIsNone(self.index.lookup(100, 70))
+        self.assertIs(self.index.lookup(300, 200), self.btn_a)
+        self.assertIs(self.index.lookup(319, 219), self.btn_a)
+        self.assertIsNone(self.index.lookup(320, 219))
+        self.assertIs(self.index.lookup(121, 50), self.btn_b)
+
+        self.index.rebuild([])
+
+        self.assertEqual(len(self.index), 0)
+        self.assertIsNone(self.index.lookup(300, 200))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+""" Tests for the gaze accuracy training data cache, of lib.py.hud_learn.
+"""
+
+__author__ = 'Dustin Fast <dustin.fast@outlook.com>'
+
+import glob
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from lib.py import hud_learn
+from lib.py.gaze_log import write_gaze_log
+from lib.py.eyetracker_structdef import GAZE_DATA_DTYPE, GAZE_FEATURE_NAMES
+
+
+SAMPLE_US = 8333        # Gaze sample interval, as at 120hz
+CLICK_EVERY = 40        # Gaze samples per click
+TOLERANCE_US = 20000    # Gaze/click labeling tolerance
+CHUNK_ROWS = 64         # Log chunk size, small enough to span many chunks
+
+
+def _gaze_records(rng, start_row, n_rows):
+    """ Returns n_rows synthetic gaze records, from the given row on, with
+        every 10th record invalid (i.e. having no pupil diameters).
+    """
+    records = np.zeros(n_rows, dtype=GAZE_DATA_DTYPE)
+    rows = np.arange(start_row, start_row + n_rows)
+
+    records['unixtime_us'] = 1600000000000000 + rows * SAMPLE_US
+
+    for name in GAZE_FEATURE_NAMES:
+        records[name] = rng.uniform(0.1, 0.9, n_rows)
+
+    records['left_pupildiameter_mm'][rows % 10 == 0] = -1
+    records['combined_gazepoint_x'] = rng.randint(0, 1920, n_rows)
+    records['combined_gazepoint_y'] = rng.randint(0, 1080, n_rows)
+
+    return records
+
+
+def _click_rows(rng, records):
+    """ Returns mouse log rows for clicks at every CLICK_EVERY'th of the given
+        gaze records' times, near (but not at) each.
+    """
+    rows = []
+
+    for t in records['unixtime_us'][::CLICK_EVERY]:
+        t_click = t + int(rng.randint(-SAMPLE_US, SAMPLE_US))
+        rows.append('%.6f,%d,%d,%d\n' % (
+            t_click / 1e6, 1, rng.randint(0, 1920), rng.randint(0, 1080)))
+
+    return rows
+
+
+class TestTrainingDataCache(unittest.TestCase):
+    def setUp(self):
+        self.logdir = tempfile.mkdtemp()
+        self.rng = np.random.RandomState(1234)
+
+        patches = [
+            mock.patch.object(hud_learn, 'LOG_RAW_ROOTDIR', self.logdir),
+            mock.patch.object(hud_learn, 'GAZE_LOG_FORMAT', 'bin'),
+            mock.patch.object(hud_learn, 'LABEL_CHUNK_ROWS', CHUNK_ROWS)]
+
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.addCleanup(shutil.rmtree, self.logdir)
+
+        self.assist = hud_learn.HUDTrainGazeAccAssist()
+        self.n_rows = 0
+
+    def _append_logs(self, n_rows):
+        """ Appends n_rows synthetic gaze samples, and their clicks, to the
+            gaze and mouse logs.
+        """
+        records = _gaze_records(self.rng, self.n_rows, n_rows)
+        self.n_rows += n_rows
+
+        write_gaze_log(self.assist._gaze_log_path(), records)
+
+        with open(self.assist._log_path('mouse'), 'a') as f:
+            f.writelines(_click_rows(self.rng, records))
+
+    def _get_training_data(self, use_cache=True, dist_filter=0):
+        """ Returns the training data, along with the gaze log row it was
+            labeled from (i.e. 0 unless extended from the cache).
+        """
+        iter_blocks = self.assist._iter_labeled_blocks
+
+        with mock.patch.object(self.assist, '_iter_labeled_blocks',
+                               side_effect=iter_blocks) as spy:
+            data = self.assist._get_training_data(
+                [], 0.0, dist_filter, tolerance_us=TOLERANCE_US,
+                use_cache=use_cache, with_gazepoints=True)
+
+        return data, spy.call_args[0][1]
+
+    def test_extended_equals_rebuilt(self):
+        """ Tests that extending the cache from appended logs gives the same
+            training data as rebuilding it from scratch.
+        """
+        self._append_logs(1000)
+        self._get_training_data()
+
+        self._append_logs(700)
+        extended, start_row = self._get_training_data()
+        rebuilt, _ = self._get_training_data(use_cache=False)
+
+        self.assertGreater(start_row, 0)
+
+        for arr_extended, arr_rebuilt in zip(extended, rebuilt):
+            np.testing.assert_array_equal(arr_extended, arr_rebuilt)
+
+    def test_unchanged_logs_use_cache(self):
+        """ Tests that the cache is used as is while the logs are unchanged.
+        """
+        self._append_logs(500)
+        built, _ = self._get_training_data()
+
+        with mock.patch.object(self.assist, '_iter_labeled_blocks') as spy:
+            cached = self.assist._get_training_data(
+                [], 0.0, 0, tolerance_us=TOLERANCE_US, with_gazepoints=True)
+
+        spy.assert_not_called()
+
+        for arr_cached, arr_built in zip(cached, built):
+            np.testing.assert_array_equal(arr_cached, arr_built)
+
+    def test_cache_per_params(self):
+        """ Tests that each filter param set keeps its own cache.
+        """
+        self._append_logs(500)
+        self._get_training_data(dist_filter=0)
+        self._get_training_data(dist_filter=500)
+
+        self.assertEqual(len(glob.glob(f'{self.logdir}/*_train_*.npz')), 2)
+
+        with mock.patch.object(self.assist, '_iter_labeled_blocks') as spy:
+            for dist_filter in (0, 500):
+                self.assist._get_training_data(
+                    [], 0.0, dist_filter, tolerance_us=TOLERANCE_US)
+
+        spy.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()